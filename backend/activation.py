@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+from atomic_write import write_json_atomic
+from system_identity import SystemIdentity, SystemIdentityError
+
+logger = logging.getLogger(__name__)
+
+ACTIVATION_APP_NAME = "Email Storm"
+ACTIVATION_TIMEOUT = 10 # seconds for one request to the activation server
+ACTIVATION_CACHE_TTL = 15 * 60 # seconds an 'active' answer is served without asking the server again
+ACTIVATION_OFFLINE_GRACE = float(os.environ.get("ACTIVATION_OFFLINE_GRACE_HOURS", 72)) * 60 * 60 # how long an 'active' answer the server gave during this run stays valid while it cannot be reached
+
+class ActivationServerError(RuntimeError):
+    """Raised when the activation server cannot be reached or gives no usable answer."""
+
+def _status_message(activation_status: str) -> str:
+    if activation_status == "active":
+        return ""
+    if activation_status == "inactive":
+        return "Please activate the device on the website."
+    return "Please register the device on the website."
+
+class ActivationChecker:
+    """
+    Activation status of this device, checked against the activation server
+    without blocking the event loop.
+
+    Requests go through one pooled requests.Session in a worker thread;
+    requests itself is imported there on first use, off the startup path. An
+    'active' answer is served from memory for ttl seconds; after that it is
+    still served, for up to grace seconds after the server last confirmed it,
+    while a background refresh asks the server again, so a slow or unreachable
+    server delays nobody. Any other answer is not cached, so activating the
+    device on the website takes effect on the next check.
+
+    The last 'active' answer is also kept in cache_path, so the app starts
+    activated without waiting for the server. Anyone who can write that file
+    can edit it, so it is only a hint: it is served while the first request to
+    the server is in flight and dropped once that request has finished, whether
+    it succeeded or not. The offline grace period only applies to answers the
+    server gave during this run.
+    """
+    def __init__(
+        self,
+        url: str,
+        system_identity: SystemIdentity,
+        cache_path: str,
+        ttl: float = ACTIVATION_CACHE_TTL,
+        grace: float = ACTIVATION_OFFLINE_GRACE,
+        timeout: float = ACTIVATION_TIMEOUT
+    ):
+        self.url = url
+        self.system_identity = system_identity
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.grace = max(grace, ttl)
+        self.timeout = timeout
+        self._session = None # requests.Session, created by the first check
+        self._session_lock = threading.Lock()
+        self._status: Optional[Dict] = None # last 'active' answer of the server: systemId, activationStatus, deviceActivation, checkedAt
+        self._hint: Optional[Dict] = None # 'active' answer of an earlier run, read from cache_path
+        self._cache_loaded = False
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def _read_cache(self, system_id: str) -> Optional[Dict]:
+        try:
+            with open(self.cache_path, "r") as f:
+                status = json.load(f)
+            if status["systemId"] == system_id and status["activationStatus"] == "active":
+                return {
+                    "systemId": system_id,
+                    "activationStatus": "active",
+                    "deviceActivation": bool(status["deviceActivation"]),
+                    "checkedAt": float(status["checkedAt"]),
+                }
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _write_cache(self, status: Optional[Dict]):
+        if status is None:
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
+            return
+        try:
+            write_json_atomic(self.cache_path, status)
+        except OSError as e:
+            logger.warning(f"Could not cache the activation status in {self.cache_path}: {e}")
+
+    def _post(self, system_id: str) -> Dict:
+        import requests
+        with self._session_lock:
+            if self._session is None:
+                self._session = requests.Session()
+        payload = {"systemId": system_id, "appName": ACTIVATION_APP_NAME}
+        logger.info(f"Sending activation check to {self.url} with payload: {payload}")
+        try:
+            response = self._session.post(self.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            raise ActivationServerError(f"Could not connect to activation server: {e}")
+        except ValueError as e: # not JSON
+            raise ActivationServerError(f"Unexpected answer from activation server: {e}")
+        return {
+            "systemId": system_id,
+            "activationStatus": str(data.get("activationStatus", "")).lower(),
+            "deviceActivation": bool(data.get("deviceActivation", False)),
+            "checkedAt": time.time(),
+        }
+
+    async def _refresh(self, system_id: str) -> Dict:
+        try:
+            status = await asyncio.to_thread(self._post, system_id)
+        finally:
+            self._hint = None # the server has answered or failed to; the hint has served its purpose
+        self._status = status if status["activationStatus"] == "active" else None
+        await asyncio.to_thread(self._write_cache, self._status)
+        return status
+
+    def _refresh_shared(self, system_id: str) -> asyncio.Future:
+        """
+        The running refresh, or a new one; concurrent checks share one request.
+        """
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh(system_id))
+            self._refreshing.add_done_callback(self._log_refresh_failure)
+        return asyncio.shield(self._refreshing)
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Activation check failed: {task.exception()}")
+
+    @staticmethod
+    def _response(status: Dict, system_id: Optional[str]) -> Dict:
+        activation_status = status["activationStatus"]
+        return {
+            "deviceActivation": status["deviceActivation"],
+            "activationStatus": activation_status,
+            "message": _status_message(activation_status),
+            "success": activation_status == "active",
+            "systemId": system_id,
+            "checkedAt": status["checkedAt"],
+        }
+
+    async def check(self) -> Dict:
+        """
+        The activation status in the shape /check-activation returns. Waits for
+        the server only if there is no 'active' answer young enough to serve,
+        or, before the first request has finished, no hint from the cache file.
+        """
+        try:
+            system_id = await self.system_identity.get()
+        except SystemIdentityError:
+            return {
+                "deviceActivation": False,
+                "activationStatus": "error",
+                "message": "Failed to retrieve complete system information.",
+                "success": False,
+                "systemId": None,
+            }
+
+        if not self._cache_loaded:
+            self._hint = await asyncio.to_thread(self._read_cache, system_id)
+            self._cache_loaded = True
+        status = self._status if self._status is not None and self._status["systemId"] == system_id else None
+        age = time.time() - status["checkedAt"] if status is not None else None
+        if age is not None and 0 <= age < self.grace:
+            if age >= self.ttl:
+                self._refresh_shared(system_id) # serve the server's last answer meanwhile
+            return self._response(status, system_id)
+
+        hint = self._hint if self._hint is not None and self._hint["systemId"] == system_id else None
+        if hint is not None and 0 <= time.time() - hint["checkedAt"] < self.grace:
+            self._refresh_shared(system_id) # drops the hint once it has finished
+            return self._response(hint, system_id)
+
+        try:
+            status = await self._refresh_shared(system_id)
+        except ActivationServerError as e:
+            logger.error(str(e))
+            return {
+                "deviceActivation": False,
+                "activationStatus": "error",
+                "message": str(e),
+                "success": False,
+                "systemId": system_id
+            }
+        return self._response(status, system_id)
+
+    def start(self):
+        """
+        Checks in the background, e.g. at app startup, so the first check the UI
+        makes is answered from memory.
+        """
+        task = asyncio.ensure_future(self.check())
+        task.add_done_callback(lambda task: task.cancelled() or task.exception()) # failures are reported by check() itself
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
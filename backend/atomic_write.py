@@ -0,0 +1,25 @@
+import os
+import json
+import uuid
+from typing import Optional
+
+def write_json_atomic(path: str, data, indent: Optional[int] = None):
+    """
+    Writes data as JSON to path through a temporary file next to it and
+    os.replace, so readers and a crash see either the old or the new file,
+    never a truncated one. Raises OSError if the file cannot be written; the
+    temporary file is removed then.
+    """
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
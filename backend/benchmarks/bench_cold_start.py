@@ -0,0 +1,112 @@
+"""
+Cold start of the backend: time from launching run_server.py to the first
+successful /health, and the modules that take longest to import with main.
+
+    python benchmarks/bench_cold_start.py --runs 5 --top 15
+    python benchmarks/bench_cold_start.py --json cold_start.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.01 # seconds between /health attempts
+START_TIMEOUT = 30 # seconds before a run counts as failed
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_health(data_dir: str) -> float:
+    port = free_port()
+    env = {**os.environ, "FASTAPI_PORT": str(port), "XDG_DATA_HOME": data_dir, "APPDATA": data_dir}
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "run_server.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < START_TIMEOUT:
+            if server.poll() is not None:
+                raise RuntimeError(f"run_server.py exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(POLL_INTERVAL)
+        raise RuntimeError(f"/health did not answer within {START_TIMEOUT} seconds")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def import_times(data_dir: str):
+    """
+    (module, cumulative seconds, self seconds) for every module `import main`
+    loads, from python -X importtime.
+    """
+    env = {**os.environ, "XDG_DATA_HOME": data_dir, "APPDATA": data_dir}
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    ).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue # the header line
+        modules.append((name.strip(), int(cumulative_us) / 1e6, int(self_us) / 1e6))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="top-level packages to list by import time")
+    parser.add_argument("--json", help="also write the results to this file, to compare across changes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        import_times(data_dir) # fill the bytecode and OS file caches outside the timing
+        timings = [time_to_health(data_dir) for _ in range(args.runs)]
+        modules = import_times(data_dir)
+
+    total = next((cumulative for name, cumulative, _ in modules if name == "main"), 0.0)
+    top_level = {}
+    for name, cumulative, self_time in modules:
+        package = name.split(".")[0]
+        top_level[package] = top_level.get(package, 0.0) + self_time
+    heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"time to first /health over {args.runs} runs: min {min(timings) * 1000:.0f} ms, median {statistics.median(timings) * 1000:.0f} ms")
+    print(f"import main: {total * 1000:.0f} ms, {len(modules)} modules")
+    for package, seconds in heaviest:
+        print(f"  {package:<24} {seconds * 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "health_seconds": timings,
+                "import_main_seconds": total,
+                "import_seconds_by_package": dict(heaviest),
+                "modules_imported": [name for name, _, _ in modules],
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
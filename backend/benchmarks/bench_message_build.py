@@ -0,0 +1,77 @@
+"""
+Per-message build cost: MIMEMultipart + flatten (the original path) versus
+MessageSkeleton.render.
+
+    python benchmarks/bench_message_build.py --messages 2000 --attachment-kb 512
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_sender import MessageSkeleton, build_email_message, load_attachment_part, serialize_message, logger
+from template_engine import compile_template
+
+SUBJECT = "Hello {name}, your {plan} plan renews soon"
+BODY = "<html><body>" + "<p>Dear {name}, thanks for being with us since {since}.</p>" * 40 + "</body></html>"
+VARIABLES = ["name", "plan", "since"]
+
+def recipients(count: int):
+    for i in range(count):
+        yield f"user{i}@example.com", [f"User {i}", "Pro", str(2000 + i % 25)]
+
+def bench_mime(count: int, subject, body, attachment_path):
+    start = time.perf_counter()
+    for receiver_email, values in recipients(count):
+        msg = build_email_message(
+            "sender@example.com", receiver_email, subject.render(values), body.render(values),
+            True, False, attachment_path=attachment_path
+        )
+        serialize_message(msg)
+    return time.perf_counter() - start
+
+def bench_skeleton(count: int, subject, body, attachment_path):
+    start = time.perf_counter()
+    skeleton = MessageSkeleton(True, load_attachment_part(attachment_path))
+    for receiver_email, values in recipients(count):
+        skeleton.render("sender@example.com", receiver_email, subject.render(values), body.render(values))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--attachment-kb", type=int, default=256, help="0 for no attachment")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING) # load_attachment_part logs every time it is called
+
+    subject = compile_template(SUBJECT, VARIABLES)
+    body = compile_template(BODY, VARIABLES)
+
+    attachment_path = None
+    if args.attachment_kb:
+        handle, attachment_path = tempfile.mkstemp(suffix=".bin")
+        with os.fdopen(handle, "wb") as f:
+            f.write(os.urandom(args.attachment_kb * 1024))
+
+    try:
+        results = {
+            "MIMEMultipart (per message)": bench_mime(args.messages, subject, body, attachment_path),
+            "MessageSkeleton.render": bench_skeleton(args.messages, subject, body, attachment_path),
+        }
+    finally:
+        if attachment_path:
+            os.remove(attachment_path)
+
+    print(f"{args.messages} messages, body {len(BODY)} chars, attachment {args.attachment_kb} KB")
+    baseline = results["MIMEMultipart (per message)"]
+    for name, elapsed in results.items():
+        per_message_us = elapsed / args.messages * 1e6
+        print(f"  {name:<30} {per_message_us:10.1f} us/message   x{baseline / elapsed:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Rendering throughput of one core (MessageSkeleton.render in the send engine)
+versus a RenderPool feeding MessageSkeleton.assemble.
+
+    python benchmarks/bench_render_pool.py --messages 50000 --processes 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_pool import RenderPool, RENDER_CHUNK_SIZE
+from template_engine import compile_template
+
+SUBJECT = "Hello {name}, your {plan} plan renews soon"
+BODY = "<html><body>" + "<p>Dear {name}, thanks for being with us since {since}.</p>" * 40 + "</body></html>"
+VARIABLES = ["name", "plan", "since"]
+
+def recipients(count: int):
+    for i in range(count):
+        yield f"user{i}@example.com", [f"User {i}", "Pro", str(2000 + i % 25)]
+
+def bench_single(count: int, skeleton):
+    subject = compile_template(SUBJECT, VARIABLES)
+    body = compile_template(BODY, VARIABLES)
+    start = time.perf_counter()
+    for receiver_email, values in recipients(count):
+        skeleton.render("sender@example.com", receiver_email, subject.render(values), body.render(values))
+    return time.perf_counter() - start
+
+def bench_pool(count: int, skeleton, processes: int):
+    pool = RenderPool(processes, SUBJECT, BODY, VARIABLES)
+    try:
+        pool.render([(None, [["warm", "up", "0"]])]).__next__() # start the workers outside the timing
+        start = time.perf_counter()
+        batch = list(recipients(count))
+        chunks = (
+            (batch[i:i + RENDER_CHUNK_SIZE], [values for _, values in batch[i:i + RENDER_CHUNK_SIZE]])
+            for i in range(0, count, RENDER_CHUNK_SIZE)
+        )
+        for chunk, rendered in pool.render(chunks):
+            for (receiver_email, _), message in zip(chunk, rendered):
+                skeleton.assemble("sender@example.com", receiver_email, message.subject_header, message.encoded_body)
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    from email_sender import MessageSkeleton
+    skeleton = MessageSkeleton(True)
+
+    results = {"one core": bench_single(args.messages, skeleton)}
+    results[f"RenderPool({args.processes})"] = bench_pool(args.messages, skeleton, args.processes)
+
+    print(f"{args.messages} messages, body {len(BODY)} chars, {os.cpu_count()} CPUs")
+    baseline = results["one core"]
+    for name, elapsed in results.items():
+        print(f"  {name:<16} {args.messages / elapsed:10.0f} messages/s   x{baseline / elapsed:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_JOB_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+MAX_RUNNING_CAMPAIGNS = 2 # campaigns sending at once; further submissions wait in the queue
+MAX_FINISHED_JOBS = 50 # finished jobs kept in memory, oldest are dropped first
+
+class CampaignJob:
+    """
+    One submitted campaign. progress is the CampaignProgress the send engine
+    updates; result holds the engine's return value once the job is finished.
+    """
+    def __init__(self, job_id: str, progress, info: Dict):
+        self.job_id = job_id
+        self.progress = progress
+        self.info = info
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATES
+
+    def to_dict(self, include_result: bool = False) -> Dict:
+        data = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "cancel_requested": self.progress.cancelled,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            **self.info,
+            **self.progress.snapshot(),
+        }
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+class CampaignJobManager:
+    """
+    Runs submitted campaigns as background tasks on the event loop, at most
+    max_running at a time; the rest wait in submission order. The send engines
+    keep their blocking work off the loop, so the API stays responsive while
+    campaigns run.
+    """
+    def __init__(self, max_running: int = MAX_RUNNING_CAMPAIGNS, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, CampaignJob]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max_running)
+        self.shutting_down = False
+
+    def submit(
+        self,
+        run: Callable[[object], Awaitable[Dict]],
+        progress,
+        cleanup: Optional[Callable[[CampaignJob], None]] = None,
+        **info
+    ) -> CampaignJob:
+        """
+        Queues run(progress) and returns its job right away. cleanup(job) is
+        called once the job has finished, whatever the outcome; started_at is
+        still None if run was never called, e.g. for a job cancelled while
+        queued. info is reported with the job's status.
+        """
+        job = CampaignJob(uuid.uuid4().hex, progress, info)
+        self._jobs[job.job_id] = job
+        job.task = asyncio.ensure_future(self._run(job, run, cleanup))
+        logger.info(f"Campaign job {job.job_id} queued.")
+        return job
+
+    async def _run(self, job: CampaignJob, run, cleanup):
+        try:
+            async with self._slots:
+                if job.progress.cancelled:
+                    job.status = JOB_CANCELLED
+                    return
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                logger.info(f"Campaign job {job.job_id} started.")
+                try:
+                    job.result = await run(job.progress)
+                    job.status = JOB_CANCELLED if job.progress.cancelled else JOB_COMPLETED
+                except Exception as e:
+                    logger.error(f"Campaign job {job.job_id} failed: {e}", exc_info=True)
+                    job.status = JOB_FAILED
+                    job.error = str(e)
+        finally:
+            if not job.finished: # task cancelled at shutdown
+                job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+            logger.info(f"Campaign job {job.job_id} {job.status}.")
+            if cleanup is not None:
+                cleanup(job)
+            self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[CampaignJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[CampaignJob]:
+        """
+        All known jobs, newest first.
+        """
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[CampaignJob]:
+        """
+        Asks the job to stop. A queued job never starts; a running one stops
+        reading recipients and reports its queued work as cancelled. Returns None
+        if the job is unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.finished:
+            job.progress.cancel()
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+            logger.info(f"Cancellation requested for campaign job {job_id}.")
+        return job
+
+    def cancel_all(self):
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.job_id)
+
+    async def shutdown(self, timeout: float):
+        """
+        Stops every job for an application shutdown and waits up to timeout
+        seconds for them to finish. shutting_down stays set, so runs can tell
+        this apart from a cancel requested by the user.
+        """
+        self.shutting_down = True
+        self.cancel_all()
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        if not tasks:
+            return
+        _, still_running = await asyncio.wait(tasks, timeout=timeout)
+        if still_running:
+            logger.warning(f"{len(still_running)} campaign jobs did not stop within {timeout} seconds.")
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import weakref
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Per-recipient states, stored as small integers.
+STATE_PENDING = 0
+STATE_SENT = 1
+STATE_FAILED = 2
+STATE_RETRYING = 3
+STATE_NAMES = {STATE_PENDING: "pending", STATE_SENT: "sent", STATE_FAILED: "failed", STATE_RETRYING: "retrying"}
+FINAL_STATES = (STATE_SENT, STATE_FAILED)
+
+# Campaign states.
+CAMPAIGN_RUNNING = "running" # still running when the process stopped, so it is resumed on the next start
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_INCOMPLETE = "incomplete" # finished with recipients left pending, e.g. every sender hit its daily quota
+CAMPAIGN_CANCELLED = "cancelled"
+CAMPAIGN_FAILED = "failed"
+
+OUTBOX_FLUSH_ROWS = 500 # buffered outcomes written per transaction
+OUTBOX_FLUSH_INTERVAL = 1.0 # seconds between background writes of buffered outcomes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    dataset_id TEXT,
+    total_rows INTEGER,
+    settings TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recipients (
+    campaign_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    email TEXT,
+    state INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sender TEXT,
+    smtp_code INTEGER,
+    latency_ms INTEGER,
+    error_class TEXT,
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (campaign_id, row_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sender_usage (
+    sender TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    sends INTEGER NOT NULL,
+    PRIMARY KEY (sender, minute)
+) WITHOUT ROWID;
+"""
+
+# Columns added to recipients after its first release, created on open if missing.
+ADDED_RECIPIENT_COLUMNS = {"latency_ms": "INTEGER", "error_class": "TEXT"}
+
+RESULT_COLUMNS = ("row_index", "email", "state", "attempts", "sender", "smtp_code", "latency_ms", "error_class", "error", "updated_at")
+RESULTS_PAGE_MAX = 1000
+MAX_ERROR_LENGTH = 300 # characters of a failure message kept per recipient
+SENDER_USAGE_KEPT = 24 * 60 # minutes of per-sender send counts kept, the window of the daily quotas
+
+class CampaignOutbox:
+    """
+    SQLite record of every campaign and the state of each of its recipients,
+    so a campaign interrupted by a crash or shutdown can be resumed without
+    mailing the recipients it already reached.
+
+    One connection is shared by all campaigns and guarded by a lock. The
+    database runs in WAL mode with synchronous=NORMAL, so a commit costs no
+    fsync of the main database file. A background thread writes what the
+    campaigns' writers have buffered every OUTBOX_FLUSH_INTERVAL seconds.
+
+    It also keeps how many messages each sender account sent per minute over
+    the last day, for the rate limiters' daily quotas (see RateLimiterRegistry).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        existing = {row[1] for row in self._connection.execute("PRAGMA table_info(recipients)")}
+        for column, column_type in ADDED_RECIPIENT_COLUMNS.items():
+            if column not in existing:
+                self._connection.execute(f"ALTER TABLE recipients ADD COLUMN {column} {column_type}")
+        self._connection.execute("DELETE FROM sender_usage WHERE minute <= ?", (int(time.time() // 60) - SENDER_USAGE_KEPT,))
+        self._writers: "weakref.WeakSet[OutboxWriter]" = weakref.WeakSet()
+        self._writers_lock = threading.Lock()
+        self._usage: Dict[Tuple[str, int], int] = {} # buffered sends by (sender, minute)
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def _execute(self, sql: str, parameters=()) -> List[tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _executemany(self, sql: str, rows: Iterable[tuple]):
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(sql, rows)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def create_campaign(self, dataset_id: str, total_rows: Optional[int], settings: Dict) -> str:
+        campaign_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO campaigns (campaign_id, status, dataset_id, total_rows, settings, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (campaign_id, CAMPAIGN_RUNNING, dataset_id, total_rows, json.dumps(settings), now, now)
+        )
+        return campaign_id
+
+    def set_status(self, campaign_id: str, status: str):
+        self._execute("UPDATE campaigns SET status = ?, updated_at = ? WHERE campaign_id = ?", (status, time.time(), campaign_id))
+
+    def set_settings(self, campaign_id: str, settings: Dict):
+        self._execute("UPDATE campaigns SET settings = ?, updated_at = ? WHERE campaign_id = ?", (json.dumps(settings), time.time(), campaign_id))
+
+    def get_campaign(self, campaign_id: str) -> Optional[Dict]:
+        rows = self._execute(
+            "SELECT campaign_id, status, dataset_id, total_rows, settings, created_at, updated_at FROM campaigns WHERE campaign_id = ?",
+            (campaign_id,)
+        )
+        return _campaign_dict(rows[0]) if rows else None
+
+    def list_campaigns(self, status: Optional[str] = None) -> List[Dict]:
+        sql = "SELECT campaign_id, status, dataset_id, total_rows, settings, created_at, updated_at FROM campaigns"
+        parameters: tuple = ()
+        if status is not None:
+            sql += " WHERE status = ?"
+            parameters = (status,)
+        return [_campaign_dict(row) for row in self._execute(sql + " ORDER BY created_at DESC", parameters)]
+
+    def state_counts(self, campaign_id: str) -> Dict[str, int]:
+        rows = self._execute("SELECT state, COUNT(*) FROM recipients WHERE campaign_id = ? GROUP BY state", (campaign_id,))
+        counts = {name: 0 for name in STATE_NAMES.values()}
+        for state, count in rows:
+            counts[STATE_NAMES[state]] = count
+        return counts
+
+    def finished_rows(self, campaign_id: str) -> pd.Index:
+        import pandas as pd
+        rows = self._execute(
+            f"SELECT row_index FROM recipients WHERE campaign_id = ? AND state IN ({', '.join('?' * len(FINAL_STATES))})",
+            (campaign_id, *FINAL_STATES)
+        )
+        return pd.Index([row_index for (row_index,) in rows], dtype="int64")
+
+    def _result_filter(self, campaign_id: str, state: Optional[int], sender: Optional[str], error_class: Optional[str]) -> Tuple[str, list]:
+        clauses, parameters = ["campaign_id = ?"], [campaign_id]
+        for column, value in (("state", state), ("sender", sender), ("error_class", error_class)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                parameters.append(value)
+        return " AND ".join(clauses), parameters
+
+    def results(
+        self,
+        campaign_id: str,
+        state: Optional[int] = None,
+        sender: Optional[str] = None,
+        error_class: Optional[str] = None,
+        after: int = -1,
+        limit: int = 100
+    ) -> List[Dict]:
+        """
+        One page of per-recipient results in row order, starting after row index
+        after. Pass the last row_index of a page to get the next one.
+        """
+        where, parameters = self._result_filter(campaign_id, state, sender, error_class)
+        rows = self._execute(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM recipients WHERE {where} AND row_index > ? ORDER BY row_index LIMIT ?",
+            (*parameters, after, min(limit, RESULTS_PAGE_MAX))
+        )
+        results = []
+        for row in rows:
+            result = dict(zip(RESULT_COLUMNS, row))
+            result["state"] = STATE_NAMES[result["state"]]
+            results.append(result)
+        return results
+
+    def count_results(self, campaign_id: str, state: Optional[int] = None, sender: Optional[str] = None, error_class: Optional[str] = None) -> int:
+        where, parameters = self._result_filter(campaign_id, state, sender, error_class)
+        return self._execute(f"SELECT COUNT(*) FROM recipients WHERE {where}", parameters)[0][0]
+
+    def failures(self, campaign_id: str) -> Dict[int, tuple]:
+        """
+        (email, smtp_code, error_class, error) of every failed recipient, by row index.
+        """
+        rows = self._execute(
+            "SELECT row_index, email, smtp_code, error_class, error FROM recipients WHERE campaign_id = ? AND state = ?",
+            (campaign_id, STATE_FAILED)
+        )
+        return {row_index: details for row_index, *details in rows}
+
+    def writer(self, campaign_id: str) -> "OutboxWriter":
+        writer = OutboxWriter(self, campaign_id)
+        with self._writers_lock:
+            self._writers.add(writer)
+            self._start_flusher()
+        return writer
+
+    def record_sender_usage(self, sender: str, count: int):
+        """
+        Buffers count messages sent through sender now, negative for messages
+        refunded; written with the outcomes.
+        """
+        key = (sender, int(time.time() // 60))
+        with self._writers_lock:
+            self._usage[key] = self._usage.get(key, 0) + count
+            self._start_flusher()
+
+    def sender_usage(self, since_minute: int) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        (minute, sends) per sender from since_minute on, minute being wall-clock time // 60.
+        """
+        usage: Dict[str, List[Tuple[int, int]]] = {}
+        for sender, minute, sends in self._execute(
+            "SELECT sender, minute, sends FROM sender_usage WHERE minute >= ? ORDER BY sender, minute", (since_minute,)
+        ):
+            usage.setdefault(sender, []).append((minute, sends))
+        return usage
+
+    def flush_sender_usage(self):
+        with self._writers_lock:
+            usage, self._usage = self._usage, {}
+        if usage:
+            self._executemany(
+                "INSERT INTO sender_usage (sender, minute, sends) VALUES (?, ?, ?) ON CONFLICT (sender, minute) DO UPDATE SET sends = sends + excluded.sends",
+                [(sender, minute, sends) for (sender, minute), sends in usage.items()]
+            )
+
+    def _start_flusher(self):
+        # Called with _writers_lock held.
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="outbox-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        """
+        Writes the buffered outcomes of every writer once per interval, so they do
+        not wait for the next record() while a campaign sleeps on a rate limit,
+        a quarantine or a retry backoff.
+        """
+        while not self._closed.wait(OUTBOX_FLUSH_INTERVAL):
+            with self._writers_lock:
+                writers = list(self._writers)
+            for writer in writers:
+                try:
+                    writer.flush()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write buffered outcomes of campaign {writer.campaign_id}: {e}")
+            try:
+                self.flush_sender_usage()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write sender usage: {e}")
+
+    def close(self):
+        self._closed.set()
+        with self._writers_lock:
+            writers = list(self._writers)
+        for writer in writers:
+            writer.flush()
+        self.flush_sender_usage()
+        with self._lock:
+            self._connection.close()
+
+class OutboxWriter:
+    """
+    Records the recipients of one campaign run. Pending rows are written per
+    input chunk, before any of them is handed to a sender; outcomes are buffered
+    and written in one transaction once OUTBOX_FLUSH_ROWS have piled up, and by
+    the outbox's background thread every OUTBOX_FLUSH_INTERVAL seconds,
+    whatever the campaign is doing meanwhile. Thread-safe.
+
+    Only outcomes still in the buffer are lost if the process dies, so at most
+    the last flush interval of sends can be repeated on resume. Stopping a
+    campaign normally (completion, cancel, shutdown) flushes everything.
+    """
+    def __init__(self, outbox: CampaignOutbox, campaign_id: str):
+        self.outbox = outbox
+        self.campaign_id = campaign_id
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def skip_finished(self, frames: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        Drops the rows this campaign already sent or failed in an earlier run.
+        """
+        finished = self.outbox.finished_rows(self.campaign_id)
+        if len(finished):
+            logger.info(f"Resuming campaign {self.campaign_id}: skipping {len(finished)} rows finished in an earlier run.")
+        for frame in frames:
+            yield frame[~frame.index.isin(finished)] if len(finished) else frame
+
+    def add_pending(self, rows: Iterable[Tuple[int, str]]):
+        """
+        Writes (row_index, email) rows as pending. Rows already known from an
+        earlier run keep their state.
+        """
+        self.flush()
+        self.outbox._executemany(
+            "INSERT OR IGNORE INTO recipients (campaign_id, row_index, email, state) VALUES (?, ?, ?, ?)",
+            [(self.campaign_id, row_index, email, STATE_PENDING) for row_index, email in rows]
+        )
+
+    def record(
+        self,
+        row_index: int,
+        email: Optional[str],
+        state: int,
+        sender: Optional[str] = None,
+        smtp_code: Optional[int] = None,
+        error: Optional[str] = None,
+        latency: Optional[float] = None,
+        error_class: Optional[str] = None
+    ):
+        """
+        Buffers the outcome of one recipient. latency is the send's duration in
+        seconds.
+        """
+        latency_ms = round(latency * 1000) if latency is not None else None
+        if error is not None:
+            error = error[:MAX_ERROR_LENGTH]
+        with self._lock:
+            self._buffer.append((self.campaign_id, row_index, email, state, sender, smtp_code, latency_ms, error_class, error, time.time()))
+            due = len(self._buffer) >= OUTBOX_FLUSH_ROWS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            self.outbox._executemany(
+                """
+                INSERT INTO recipients (campaign_id, row_index, email, state, attempts, sender, smtp_code, latency_ms, error_class, error, updated_at)
+                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (campaign_id, row_index) DO UPDATE SET
+                    state = excluded.state, attempts = recipients.attempts + 1, sender = excluded.sender,
+                    smtp_code = excluded.smtp_code, latency_ms = excluded.latency_ms, error_class = excluded.error_class,
+                    error = excluded.error, updated_at = excluded.updated_at
+                """,
+                rows
+            )
+
+def _campaign_dict(row: tuple) -> Dict:
+    campaign_id, status, dataset_id, total_rows, settings, created_at, updated_at = row
+    return {
+        "campaign_id": campaign_id,
+        "status": status,
+        "dataset_id": dataset_id,
+        "total_rows": total_rows,
+        "settings": json.loads(settings),
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
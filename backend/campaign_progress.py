@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+RATE_WINDOW_SECONDS = 10.0 # throughput and per-sender rates are averaged over this trailing window
+RECENT_FAILURES_KEPT = 20
+
+class CampaignProgress:
+    """
+    Running totals of a campaign, updated by the send engines from any thread and
+    read by the jobs API and the progress stream while the campaign runs.
+
+    Besides the sent/failed counts it keeps per-sender counts and health state,
+    the recent send rate overall and per sender, and the last few failures with
+    their reason.
+    version changes with every update, so readers can tell whether anything
+    happened since they last looked. cancel() stops the campaign: no further rows
+    are read and work items still queued are reported as cancelled.
+    """
+    def __init__(self, total_rows: Optional[int] = None, sent: int = 0, failed: int = 0):
+        self.total_rows = total_rows
+        self.sent = sent # a resumed campaign starts from the counts of its earlier runs
+        self.failed = failed
+        self.retries = 0
+        self.version = 0
+        self.started_at: Optional[float] = None # monotonic
+        self._senders: Dict[str, Dict[str, int]] = {}
+        self._window: deque = deque() # (monotonic time, sender, messages sent) of the last RATE_WINDOW_SECONDS
+        self._recent_failures: deque = deque(maxlen=RECENT_FAILURES_KEPT)
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+                self.version += 1
+
+    def record(
+        self,
+        sent: int = 0,
+        failed: int = 0,
+        sender: Optional[str] = None,
+        failures: Iterable[Tuple[str, Optional[str]]] = (),
+        retried: int = 0
+    ):
+        """
+        Adds sent and failed messages, attributed to sender if given. failures are
+        (recipient, reason) pairs for the failed ones; only the last few are kept.
+        retried counts recipients queued for another attempt.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.retries += retried
+            self.version += 1
+            if sender is not None:
+                stats = self._senders.setdefault(sender, {"sent": 0, "failed": 0})
+                stats["sent"] += sent
+                stats["failed"] += failed
+            if sent:
+                self._window.append((now, sender, sent))
+            for recipient, reason in failures:
+                self._recent_failures.append({"recipient": recipient, "sender": sender, "error": reason})
+
+    def set_sender_state(self, sender: str, state: str):
+        """
+        Marks sender healthy, quarantined or retired, see SenderHealth.
+        """
+        with self._lock:
+            self._senders.setdefault(sender, {"sent": 0, "failed": 0})["state"] = state
+            self.version += 1
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            self.version += 1
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0][0] > RATE_WINDOW_SECONDS:
+                self._window.popleft()
+            elapsed = now - self.started_at if self.started_at is not None else 0.0
+            span = max(min(RATE_WINDOW_SECONDS, elapsed), 1e-3)
+            recent_by_sender: Dict[Optional[str], int] = {}
+            for _, sender, count in self._window:
+                recent_by_sender[sender] = recent_by_sender.get(sender, 0) + count
+            return {
+                "total_rows": self.total_rows,
+                "sent": self.sent,
+                "failed": self.failed,
+                "processed": self.sent + self.failed,
+                "retries": self.retries,
+                "elapsed_seconds": round(elapsed, 1),
+                "messages_per_second": round(sum(recent_by_sender.values()) / span, 2) if elapsed else 0.0,
+                "senders": [
+                    {
+                        "sender": sender,
+                        "sent": stats["sent"],
+                        "failed": stats["failed"],
+                        "state": stats.get("state", "healthy"),
+                        "messages_per_second": round(recent_by_sender.get(sender, 0) / span, 2) if elapsed else 0.0,
+                    }
+                    for sender, stats in self._senders.items()
+                ],
+                "recent_failures": list(self._recent_failures),
+            }
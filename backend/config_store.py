@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from atomic_write import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+class ConfigStoreError(ValueError):
+    """Raised when the saved sender configurations cannot be read or written."""
+
+class SenderConfigStore:
+    """
+    The saved sender email configurations, kept in memory by lowercase
+    senderEmail and persisted to a JSON list at path.
+
+    The file is parsed and validated against model only when its mtime or size
+    changes, e.g. when another process wrote it, so reads cost a stat() call.
+    Every change rewrites it through a temporary file and os.replace, so a crash
+    leaves either the old or the new list, never a truncated one. A file that
+    cannot be parsed raises ConfigStoreError instead of reading as empty, so
+    nothing is saved over it by accident. Thread-safe.
+    """
+    def __init__(self, path: str, model: Type[BaseModel]):
+        self.path = path
+        self.model = model
+        self._configs: Dict[str, BaseModel] = {}
+        self._signature: Optional[Tuple[int, int]] = None # (mtime_ns, size) of the file the cache was read from
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sender_email: str) -> str:
+        return sender_email.strip().lower()
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        if signature is None:
+            self._configs = {}
+        else:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                if not isinstance(data, list):
+                    raise ValueError("expected a JSON list of configurations")
+                configs = [self.model(**config) for config in data]
+            except (OSError, ValueError) as e: # pydantic's ValidationError is a ValueError
+                logger.error(f"Cannot read the email configurations in {self.path}: {e}")
+                raise ConfigStoreError(f"The saved email configurations in {self.path} cannot be read: {e}")
+            self._configs = {self._key(config.senderEmail): config for config in configs}
+            logger.info(f"Loaded {len(configs)} email configuration(s) from {self.path}")
+        self._signature = signature
+
+    def _persist(self, configs: Dict[str, BaseModel]):
+        try:
+            write_json_atomic(self.path, [config.model_dump(by_alias=True) for config in configs.values()], indent=4)
+        except OSError as e:
+            raise ConfigStoreError(f"Failed to save email configurations to {self.path}: {e}")
+        self._configs = configs
+        self._signature = self._file_signature()
+
+    def list(self) -> List[BaseModel]:
+        with self._lock:
+            self._refresh()
+            return list(self._configs.values())
+
+    def get(self, sender_email: str) -> Optional[BaseModel]:
+        with self._lock:
+            self._refresh()
+            return self._configs.get(self._key(sender_email))
+
+    def upsert(self, config: BaseModel) -> List[BaseModel]:
+        """
+        Saves config, replacing the one with the same senderEmail in place.
+        Returns all configurations.
+        """
+        with self._lock:
+            self._refresh()
+            self._persist({**self._configs, self._key(config.senderEmail): config})
+            return list(self._configs.values())
+
+    def delete(self, sender_email: str) -> Optional[List[BaseModel]]:
+        """
+        Removes the configuration of sender_email. Returns the remaining ones,
+        or None if there was no such configuration.
+        """
+        key = self._key(sender_email)
+        with self._lock:
+            self._refresh()
+            if key not in self._configs:
+                return None
+            self._persist({k: config for k, config in self._configs.items() if k != key})
+            return list(self._configs.values())
+
+    def replace(self, configs: List[BaseModel]):
+        """
+        Saves configs instead of all current ones; the last one wins for a
+        repeated senderEmail. Overwrites a file that cannot be read.
+        """
+        with self._lock:
+            self._persist({self._key(config.senderEmail): config for config in configs})
+
+    def clear(self) -> bool:
+        """
+        Deletes the file. Returns False if there was none.
+        """
+        with self._lock:
+            try:
+                os.remove(self.path)
+                existed = True
+            except FileNotFoundError:
+                existed = False
+            except OSError as e:
+                raise ConfigStoreError(f"Error deleting file '{self.path}': {e.strerror}")
+            self._configs = {}
+            self._signature = None
+            return existed
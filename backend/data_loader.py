@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import os
+import json
+import codecs
+import logging
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from fastapi import UploadFile
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # bytes read from an upload per write to disk
+ENCODING_PROBE_CHUNK_SIZE = 1024 * 1024 # bytes decoded per step when checking a file is UTF-8
+ENCODING_SAMPLE_SIZE = 64 * 1024 # leading bytes checked when only a preview of the file is read
+CSV_CHUNK_ROWS = 5000 # rows per DataFrame chunk handed to the send engine
+ROW_COUNT_CHUNK_SIZE = 1024 * 1024 # bytes scanned per step when counting rows
+PREVIEW_ROWS = 10
+JSONL_COLUMN_SAMPLE_ROWS = 1000 # JSON Lines records scanned to find the columns
+
+# Contact list formats by file extension.
+CONTACT_LIST_FORMATS = {".csv": "csv", ".xlsx": "xlsx", ".parquet": "parquet", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+TEXT_FORMATS = ("csv", "jsonl")
+
+class ContactListError(ValueError):
+    """Raised when an uploaded contact list cannot be read."""
+
+async def save_upload(upload: UploadFile, path: str, chunk_size: int = UPLOAD_CHUNK_SIZE, digest=None) -> int:
+    """
+    Streams an upload to path in chunks instead of reading it into memory in one
+    go. If digest (a hashlib object) is given, it is updated with every chunk.
+    Returns the number of bytes written.
+    """
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            size += len(chunk)
+    return size
+
+def detect_csv_encoding(path: str) -> str:
+    """
+    Returns 'utf-8' if the whole file decodes as UTF-8, otherwise 'latin1'.
+    The file is decoded incrementally, so memory use does not depend on its size.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(ENCODING_PROBE_CHUNK_SIZE)
+                if not chunk:
+                    decoder.decode(b"", final=True)
+                    return "utf-8"
+                decoder.decode(chunk)
+    except UnicodeDecodeError:
+        logger.info(f"{path} is not valid UTF-8, reading it as latin1.")
+        return "latin1"
+
+def sniff_csv_encoding(path: str, sample_size: int = ENCODING_SAMPLE_SIZE) -> str:
+    """
+    Like detect_csv_encoding, but only decodes the first sample_size bytes. A
+    multi-byte character cut off at the end of the sample is not an error.
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        logger.info(f"{path} does not start as valid UTF-8, previewing it as latin1.")
+        return "latin1"
+
+def contact_list_format(filename: Optional[str]) -> Optional[str]:
+    """
+    Returns the contact list format for filename's extension, or None if it is not supported.
+    """
+    return CONTACT_LIST_FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+def count_lines(path: str) -> int:
+    """
+    Counts lines by counting line breaks in the raw bytes, without parsing. A
+    last line without a trailing line break is counted too.
+    """
+    lines = 0
+    last_byte = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(ROW_COUNT_CHUNK_SIZE)
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            last_byte = chunk[-1:]
+    if last_byte != b"\n":
+        lines += 1
+    return lines
+
+def count_csv_rows(path: str) -> int:
+    """
+    Counts data rows from the line count. Quoted values spanning several lines
+    and blank lines are counted as rows, so the result can be slightly higher
+    than what pandas reads.
+    """
+    return max(count_lines(path) - 1, 0) # minus the header
+
+def _parquet_file(path: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ContactListError("Reading Parquet files requires pyarrow to be installed.")
+    try:
+        return pq.ParquetFile(path)
+    except Exception as e:
+        raise ContactListError(f"Failed to read Parquet file: {e}")
+
+def _parquet_columns(parquet_file) -> List[str]:
+    # Skip the index columns pandas adds when writing a DataFrame with a non-default index.
+    return [name for name in parquet_file.schema_arrow.names if not name.startswith("__index_level_")]
+
+def _xlsx_row_count(path: str) -> int:
+    from openpyxl import load_workbook # pandas already needs it to read .xlsx
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.max_row
+        if rows is None: # sheet written without a dimension record
+            rows = sum(1 for _ in sheet.iter_rows(values_only=True))
+        return max(rows - 1, 0)
+    finally:
+        workbook.close()
+
+def inspect_contact_list(path: str, file_format: str) -> Dict:
+    """
+    Returns the encoding (None for binary formats), columns and total_rows of a
+    contact list without loading its rows. Raises ContactListError if the file
+    cannot be read.
+
+    The encoding is sniffed from the start of the file only; check it with
+    detect_csv_encoding before reading the whole file.
+    """
+    import pandas as pd
+    encoding = sniff_csv_encoding(path) if file_format in TEXT_FORMATS else None
+    try:
+        if file_format == "csv":
+            columns, total_rows = read_csv_columns(path, encoding), count_csv_rows(path)
+        elif file_format == "jsonl":
+            sample = pd.read_json(path, lines=True, nrows=JSONL_COLUMN_SAMPLE_ROWS, encoding=encoding, dtype=False)
+            columns, total_rows = [str(column) for column in sample.columns], count_lines(path)
+        elif file_format == "parquet":
+            parquet_file = _parquet_file(path)
+            columns, total_rows = _parquet_columns(parquet_file), parquet_file.metadata.num_rows
+        elif file_format == "xlsx":
+            columns = [str(column) for column in pd.read_excel(path, nrows=0).columns]
+            total_rows = _xlsx_row_count(path)
+        else:
+            raise ContactListError(f"Unsupported contact list format '{file_format}'.")
+    except ContactListError:
+        raise
+    except ImportError as e:
+        raise ContactListError(f"Reading {file_format} files requires an optional package: {e}")
+    except Exception as e:
+        raise ContactListError(f"Failed to parse {file_format.upper()} file: {e}")
+    return {"encoding": encoding, "columns": columns, "total_rows": total_rows}
+
+def read_head(path: str, file_format: str, encoding: Optional[str], nrows: int = PREVIEW_ROWS) -> pd.DataFrame:
+    """
+    Reads only the first nrows rows. Text that does not decode with encoding is
+    replaced, since it may have been sniffed from the start of the file only.
+    """
+    import pandas as pd
+    if file_format == "csv":
+        return read_csv_head(path, encoding, nrows)
+    try:
+        if file_format == "jsonl":
+            return pd.read_json(
+                path, lines=True, nrows=nrows, encoding=encoding, encoding_errors="replace", dtype=False, convert_dates=False
+            )
+        if file_format == "parquet":
+            parquet_file = _parquet_file(path)
+            batch = next(parquet_file.iter_batches(batch_size=nrows, columns=_parquet_columns(parquet_file)), None)
+            return batch.to_pandas() if batch is not None else pd.DataFrame(columns=_parquet_columns(parquet_file))
+        if file_format == "xlsx":
+            return pd.read_excel(path, nrows=nrows)
+    except ContactListError:
+        raise
+    except Exception as e:
+        raise ContactListError(f"Failed to parse {file_format.upper()} file: {e}")
+    raise ContactListError(f"Unsupported contact list format '{file_format}'.")
+
+def read_csv_head(path: str, encoding: str, nrows: int = PREVIEW_ROWS) -> pd.DataFrame:
+    """
+    Reads only the first nrows rows, replacing text that does not decode.
+    """
+    import pandas as pd
+    try:
+        return pd.read_csv(path, encoding=encoding, encoding_errors="replace", nrows=nrows, dtype=str, keep_default_na=False)
+    except Exception as e:
+        raise ContactListError(f"Failed to parse CSV: {e}")
+
+def read_csv_columns(path: str, encoding: str) -> List[str]:
+    """
+    Reads only the header row.
+    """
+    import pandas as pd
+    try:
+        return list(pd.read_csv(path, encoding=encoding, nrows=0).columns)
+    except Exception as e:
+        raise ContactListError(f"Failed to parse CSV: {e}")
+
+def iter_csv_chunks(path: str, encoding: str, chunksize: int = CSV_CHUNK_ROWS, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yields the CSV as DataFrames of at most chunksize rows. The row index keeps
+    counting across chunks, so it still identifies the row in the whole file.
+
+    Every cell is read as the text in the file and empty cells as "". Inferring
+    dtypes would happen per chunk, so the same value could render as "5" in one
+    chunk and "5.0" in another that has an empty cell in that column.
+
+    With columns, only those columns are parsed (usecols) and the rest of each
+    line is skipped by the tokenizer.
+    """
+    import pandas as pd
+    with pd.read_csv(
+        path, encoding=encoding, chunksize=chunksize, usecols=columns, dtype=str, keep_default_na=False
+    ) as reader:
+        for chunk in reader:
+            yield chunk
+
+def _jsonl_text(value) -> str:
+    return "" if value is None else str(value)
+
+def _jsonl_frame(records: List[Dict], columns: Optional[List[str]], start: int) -> pd.DataFrame:
+    import pandas as pd
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    return pd.DataFrame(
+        {column: [_jsonl_text(record.get(column)) for record in records] for column in columns},
+        index=pd.RangeIndex(start, start + len(records)),
+        columns=columns
+    )
+
+def iter_jsonl_chunks(path: str, encoding: str, chunksize: int = CSV_CHUNK_ROWS, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    iter_csv_chunks for JSON Lines. Values are converted to text record by
+    record, so a number renders the same whatever else is in its chunk; null
+    and a key missing from a record read as "". Without columns, every key of
+    the chunk's records becomes a column.
+    """
+    start = 0
+    records = []
+    with open(path, "r", encoding=encoding) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+            if len(records) == chunksize:
+                yield _jsonl_frame(records, columns, start)
+                start += len(records)
+                records = []
+    if records:
+        yield _jsonl_frame(records, columns, start)
+
+def iter_contact_list_chunks(
+    path: str,
+    file_format: str,
+    encoding: Optional[str] = None,
+    chunksize: int = CSV_CHUNK_ROWS,
+    columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    iter_csv_chunks for every supported format. Chunks are numbered from 0 across
+    the whole file and, with columns, hold just those columns:
+
+    - csv: usecols, unused fields are never converted
+    - parquet: column pushdown, other columns are never read from disk
+    - xlsx: usecols; openpyxl cannot stream, so the projected sheet is read once and sliced
+    - jsonl: records are parsed in chunks and projected; a key missing from a record reads as empty
+
+    CSV, XLSX and JSONL cells are read as text, see iter_csv_chunks; Parquet
+    columns keep the types of the file's schema.
+    """
+    import pandas as pd
+    if file_format == "csv":
+        yield from iter_csv_chunks(path, encoding, chunksize, columns)
+    elif file_format == "parquet":
+        parquet_file = _parquet_file(path)
+        start = 0
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns or _parquet_columns(parquet_file)):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+    elif file_format == "xlsx":
+        sheet = pd.read_excel(path, usecols=columns, dtype=str, keep_default_na=False)
+        for start in range(0, len(sheet), chunksize):
+            yield sheet.iloc[start:start + chunksize]
+    elif file_format == "jsonl":
+        yield from iter_jsonl_chunks(path, encoding, chunksize, columns)
+    else:
+        raise ContactListError(f"Unsupported contact list format '{file_format}'.")
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import os
+import re
+import asyncio
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import importlib.util
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from fastapi import UploadFile
+
+from atomic_write import write_json_atomic
+from data_loader import (
+    CSV_CHUNK_ROWS, PREVIEW_ROWS, save_upload, inspect_contact_list,
+    read_head, iter_contact_list_chunks, detect_csv_encoding
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATASET_CACHE_MAX_BYTES = 1024 * 1024 * 1024 # least recently used datasets are evicted above this total size
+DATASET_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$") # sha256 of the uploaded file
+
+SOURCE_FILE = "source.{format}" # the uploaded file, e.g. source.csv or source.xlsx
+META_FILE = "meta.json" # its mtime is the dataset's last use
+COLUMNAR_DIR = "columnar" # one parquet file per chunk of a CSV, XLSX or JSONL upload, written after upload
+
+# Parquet needs pyarrow. Without it datasets are still cached, but sends parse the stored CSV again.
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+class DatasetStore:
+    """
+    Contact lists stored once under the SHA-256 of their content, so uploading
+    the same file again, previewing it and sending to it any number of times
+    reuse one copy.
+
+    Every dataset keeps the uploaded file plus its format, header, encoding and
+    row count. The encoding of a text upload is sniffed from its first bytes
+    when it is registered and checked against the whole file the first time
+    the file is read in full. For formats other than Parquet, materialize() additionally writes
+    the parsed chunks as parquet files, which later campaigns read instead of
+    parsing the upload. The chunks keep the dtypes and row numbers
+    iter_contact_list_chunks would have produced, so a campaign sends the same
+    messages from either copy.
+
+    Datasets are evicted least recently used first once the store grows past
+    max_bytes. A dataset pinned by a queued or running campaign is never
+    evicted. The lock guards only metadata reads, renames and the pins; files
+    are parsed, scanned and deleted outside of it, so lookups stay fast while
+    a large upload is processed.
+    """
+    def __init__(self, root: str, max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock() # one eviction scan at a time
+        self._in_use: Dict[str, int] = {}
+        self._materializing = set()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, dataset_id: str, *parts: str) -> str:
+        return os.path.join(self.root, dataset_id, *parts)
+
+    async def ingest_upload(self, upload: UploadFile, file_format: str) -> Dict:
+        """
+        Streams an upload into the store and returns the dataset's metadata, with
+        "cached" set if the same content was already stored.
+        """
+        digest = hashlib.sha256()
+        upload_path = os.path.join(self.root, f"upload-{uuid.uuid4().hex}.tmp")
+        try:
+            await save_upload(upload, upload_path, digest=digest)
+            return await asyncio.to_thread(self.register, upload_path, digest.hexdigest(), file_format, upload.filename)
+        finally:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+
+    def register(self, upload_path: str, dataset_id: str, file_format: str, filename: Optional[str] = None) -> Dict:
+        """
+        Moves the file at upload_path into the store as dataset_id unless it is
+        already there. Raises ContactListError if the file cannot be read.
+
+        The dataset is put together in a staging directory and renamed into
+        place, so it appears complete or not at all.
+        """
+        meta = self.get(dataset_id)
+        if meta is not None:
+            logger.info(f"Dataset {dataset_id[:12]} already cached, skipping upload processing.")
+            return dict(meta, cached=True)
+
+        details = inspect_contact_list(upload_path, file_format)
+        staging_dir = os.path.join(self.root, f"{dataset_id}-{uuid.uuid4().hex}.tmp")
+        leftover_path = self._removal_path()
+        try:
+            os.makedirs(staging_dir)
+            source_path = os.path.join(staging_dir, SOURCE_FILE.format(format=file_format))
+            os.replace(upload_path, source_path)
+            meta = {
+                "dataset_id": dataset_id,
+                "filename": filename,
+                "format": file_format,
+                "encoding": details["encoding"],
+                "encoding_verified": details["encoding"] is None,
+                "columns": details["columns"],
+                "total_rows": details["total_rows"],
+                "size_bytes": os.path.getsize(source_path),
+                "created_at": time.time(),
+            }
+            write_json_atomic(os.path.join(staging_dir, META_FILE), meta)
+            with self._lock:
+                existing = self._read_meta(dataset_id) # the same content, registered meanwhile
+                if existing is None:
+                    if os.path.exists(self._path(dataset_id)):
+                        os.replace(self._path(dataset_id), leftover_path) # of an interrupted registration
+                    os.replace(staging_dir, self._path(dataset_id))
+                else:
+                    self._touch(dataset_id)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            shutil.rmtree(leftover_path, ignore_errors=True)
+        if existing is not None:
+            return dict(existing, cached=True)
+
+        logger.info(f"Cached dataset {dataset_id[:12]} ({meta['total_rows']} rows, {meta['size_bytes']} bytes).")
+        self._evict(keep=dataset_id)
+        return dict(meta, cached=False)
+
+    def get(self, dataset_id: str) -> Optional[Dict]:
+        """
+        Returns the dataset's metadata and marks it as recently used, or None if
+        it is not stored (never uploaded, or evicted).
+        """
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            return None
+        with self._lock:
+            meta = self._read_meta(dataset_id)
+            if meta is not None:
+                self._touch(dataset_id)
+            return meta
+
+    def pin(self, dataset_id: str) -> Optional[Dict]:
+        """
+        Keeps the dataset from being evicted until unpin() is called, e.g. while
+        the campaign that will read it waits in the queue. Returns its metadata,
+        or None if it is not stored.
+        """
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            return None
+        with self._lock:
+            meta = self._read_meta(dataset_id)
+            if meta is not None:
+                self._touch(dataset_id)
+                self._in_use[dataset_id] = self._in_use.get(dataset_id, 0) + 1
+            return meta
+
+    def unpin(self, dataset_id: str):
+        with self._lock:
+            self._release(dataset_id)
+
+    def source_path(self, meta: Dict) -> str:
+        return self._path(meta["dataset_id"], SOURCE_FILE.format(format=meta["format"]))
+
+    def preview(self, meta: Dict, nrows: int = PREVIEW_ROWS) -> pd.DataFrame:
+        return read_head(self.source_path(meta), meta["format"], meta["encoding"], nrows)
+
+    def materialize(self, dataset_id: str, chunksize: int = CSV_CHUNK_ROWS):
+        """
+        Writes the parsed chunks of the dataset as parquet files, so later
+        campaigns skip parsing the upload. Does nothing without pyarrow, for
+        Parquet uploads, if the dataset is already materialized or if another
+        thread is materializing it.
+        """
+        if not PARQUET_AVAILABLE:
+            return
+        with self._lock:
+            meta = self._read_meta(dataset_id)
+            if (
+                meta is None or meta["format"] == "parquet"
+                or dataset_id in self._materializing or os.path.isdir(self._path(dataset_id, COLUMNAR_DIR))
+            ):
+                return
+            self._materializing.add(dataset_id)
+            self._in_use[dataset_id] = self._in_use.get(dataset_id, 0) + 1
+
+        staging_dir = self._path(dataset_id, f"{COLUMNAR_DIR}-{uuid.uuid4().hex}.tmp")
+        try:
+            start = time.perf_counter()
+            os.makedirs(staging_dir)
+            chunks = iter_contact_list_chunks(
+                self.source_path(meta), meta["format"], self._verified_encoding(meta), chunksize, meta["columns"]
+            )
+            for number, chunk in enumerate(chunks):
+                chunk.to_parquet(os.path.join(staging_dir, f"part-{number:06d}.parquet"))
+            os.replace(staging_dir, self._path(dataset_id, COLUMNAR_DIR))
+            logger.info(f"Materialized dataset {dataset_id[:12]} as parquet in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            logger.error(f"Failed to materialize dataset {dataset_id[:12]}, campaigns will read the CSV: {e}", exc_info=True)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        finally:
+            with self._lock:
+                self._materializing.discard(dataset_id)
+                self._release(dataset_id)
+            self._evict(keep=dataset_id)
+
+    def iter_chunks(self, dataset_id: str, chunksize: int = CSV_CHUNK_ROWS, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yields the dataset as DataFrame chunks, from the parquet copy if it has
+        been materialized and from the stored upload otherwise. With columns,
+        only those columns are read. The dataset is not evicted while the
+        iterator is open.
+        """
+        import pandas as pd
+        meta = self.pin(dataset_id)
+        if meta is None:
+            raise KeyError(dataset_id)
+        try:
+            columnar_dir = self._path(dataset_id, COLUMNAR_DIR)
+            if os.path.isdir(columnar_dir):
+                for part in sorted(os.listdir(columnar_dir)):
+                    yield pd.read_parquet(os.path.join(columnar_dir, part), columns=columns)
+            else:
+                yield from iter_contact_list_chunks(
+                    self.source_path(meta), meta["format"], self._verified_encoding(meta), chunksize, columns
+                )
+        finally:
+            self.unpin(dataset_id)
+
+    def _verified_encoding(self, meta: Dict) -> Optional[str]:
+        """
+        The encoding of the whole stored upload. Decodes the file once if the
+        encoding was only sniffed and saves the result; the dataset must be pinned.
+        """
+        if meta.get("encoding_verified", True): # datasets registered before sniffing were checked in full
+            return meta["encoding"]
+        encoding = detect_csv_encoding(self.source_path(meta))
+        with self._lock:
+            current = self._read_meta(meta["dataset_id"])
+            if current is not None:
+                write_json_atomic(
+                    self._path(meta["dataset_id"], META_FILE), dict(current, encoding=encoding, encoding_verified=True)
+                )
+        return encoding
+
+    def _release(self, dataset_id: str):
+        self._in_use[dataset_id] -= 1
+        if not self._in_use[dataset_id]:
+            del self._in_use[dataset_id]
+
+    def _read_meta(self, dataset_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(dataset_id, META_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _touch(self, dataset_id: str):
+        try:
+            os.utime(self._path(dataset_id, META_FILE))
+        except OSError:
+            pass
+
+    def _removal_path(self) -> str:
+        # Datasets are renamed here under the lock and deleted after it is released.
+        return os.path.join(self.root, f"removed-{uuid.uuid4().hex}.tmp")
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        Removes least recently used datasets until the store fits in max_bytes.
+        The store is scanned without the lock; a dataset is only taken out if it
+        is not pinned at that moment.
+        """
+        with self._evict_lock:
+            datasets = []
+            for dataset_id in os.listdir(self.root):
+                if not DATASET_ID_PATTERN.match(dataset_id):
+                    continue
+                try:
+                    last_used = os.path.getmtime(self._path(dataset_id, META_FILE))
+                except OSError:
+                    last_used = 0.0 # incomplete dataset, evict first
+                datasets.append((last_used, dataset_id, _directory_size(self._path(dataset_id))))
+
+            total = sum(size for _, _, size in datasets)
+            for last_used, dataset_id, size in sorted(datasets):
+                if total <= self.max_bytes:
+                    break
+                if dataset_id == keep:
+                    continue
+                removal_path = self._removal_path()
+                with self._lock:
+                    if dataset_id in self._in_use:
+                        continue
+                    try:
+                        os.replace(self._path(dataset_id), removal_path)
+                    except OSError:
+                        continue
+                shutil.rmtree(removal_path, ignore_errors=True)
+                total -= size
+                logger.info(f"Evicted dataset {dataset_id[:12]} ({size} bytes) from the dataset cache.")
+
+def _directory_size(path: str) -> int:
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return size
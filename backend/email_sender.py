@@ -5,12 +5,31 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import List, Optional, Dict
+from email.generator import BytesGenerator
+from typing import List, Optional, Dict, Tuple, Callable, Any, NamedTuple, Iterable, Iterator, Union
 import sys
+import time
+import queue
+import asyncio
+import threading
+import io
+import random
+import itertools
+import functools
 import appdirs
 import logging
 from logging.handlers import RotatingFileHandler
 from collections import deque
+from contextlib import contextmanager
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from template_engine import compile_template
+from campaign_progress import CampaignProgress
+from campaign_outbox import OutboxWriter, STATE_SENT, STATE_FAILED, STATE_RETRYING
+from rate_limiter import SenderRateLimiter, RateLimiterRegistry, sender_key, is_throttling_reply
+from retry_queue import RetryQueue, is_transient_failure, is_transient_reply
+from sender_health import SenderHealth, is_sender_failure
+from render_pool import RenderPool, RenderedMessage, RENDER_CHUNK_SIZE, fold_header, encode_body
 
 APP_AUTHOR = "Obzentechnolabs"
 APP_NAME = "EmailStorm"
@@ -43,19 +62,247 @@ logger.addHandler(console_handler)
 def print(message):
     logger.info(message)
 
+SMTP_TIMEOUT = 30 # seconds for connect and each SMTP command
+SMTP_KEEPALIVE_INTERVAL = 30 # idle seconds after which a pooled session is probed with NOOP
+SMTP_MAX_MESSAGES_PER_SESSION = 100 # recycle a session after this many messages
+SMTP_VERIFY_TIMEOUT = 10 # seconds allowed for connecting, STARTTLS and login when verifying sender configs
+
+class PooledSMTPSession:
+    """
+    An authenticated SMTP connection together with the bookkeeping the pool needs.
+    """
+    def __init__(self, key: Tuple[str, int, str], smtp: smtplib.SMTP):
+        self.key = key
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions open for the duration of a campaign so that
+    the TCP handshake, STARTTLS and login happen once per sender instead of once
+    per recipient. Sessions are keyed by (smtpServer, smtpPort, senderEmail).
+
+    Idle sessions are probed with NOOP before reuse, sessions that hit
+    max_messages_per_session are recycled, and close_all() should be called at
+    the end of the campaign.
+    """
+    def __init__(
+        self,
+        max_messages_per_session: int = SMTP_MAX_MESSAGES_PER_SESSION,
+        keepalive_interval: float = SMTP_KEEPALIVE_INTERVAL,
+        timeout: float = SMTP_TIMEOUT
+    ):
+        self.max_messages_per_session = max_messages_per_session
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, int, str], List[PooledSMTPSession]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(smtp_server: str, smtp_port: int, sender_email: str) -> Tuple[str, int, str]:
+        return (smtp_server.strip().lower(), int(smtp_port), sender_email.strip().lower())
+
+    def _connect(self, key, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str, timeout: Optional[float] = None) -> PooledSMTPSession:
+        smtp = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout or self.timeout)
+        try:
+            smtp.starttls()
+            smtp.login(sender_email, sender_password)
+            if timeout and getattr(smtp, "sock", None) is not None:
+                smtp.sock.settimeout(self.timeout)
+        except Exception:
+            smtp.close()
+            raise
+        print(f"Opened SMTP session to {smtp_server}:{smtp_port} for {sender_email}")
+        return PooledSMTPSession(key, smtp)
+
+    def open(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str, timeout: Optional[float] = None) -> PooledSMTPSession:
+        """
+        Opens and authenticates a new session, allowing timeout seconds per step
+        of the handshake. release() puts it in the pool for the campaign to use.
+        """
+        return self._connect(self.make_key(smtp_server, smtp_port, sender_email), smtp_server, smtp_port, sender_email, sender_password, timeout)
+
+    def _is_alive(self, session: PooledSMTPSession) -> bool:
+        if time.monotonic() - session.last_used < self.keepalive_interval:
+            return True
+        try:
+            code, _ = session.smtp.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def acquire(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str) -> PooledSMTPSession:
+        """
+        Returns an idle live session for the sender, or opens (and authenticates) a new one.
+        """
+        key = self.make_key(smtp_server, smtp_port, sender_email)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                session = idle.pop() if idle else None
+            if session is None:
+                return self._connect(key, smtp_server, smtp_port, sender_email, sender_password)
+            if self._is_alive(session):
+                return session
+            print(f"Pooled SMTP session for {sender_email} went stale, reconnecting.")
+            session.close()
+
+    def release(self, session: PooledSMTPSession, discard: bool = False):
+        """
+        Returns a session to the pool, or closes it if it is broken or has reached
+        the per-session message cap.
+        """
+        session.last_used = time.monotonic()
+        if discard or session.messages_sent >= self.max_messages_per_session:
+            session.close()
+            return
+        with self._lock:
+            self._idle.setdefault(session.key, []).append(session)
+
+    @contextmanager
+    def session(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str):
+        """
+        Context manager around acquire()/release(). Sessions are discarded on
+        connection-level errors and kept on SMTP error replies, since the server
+        resets the transaction and the connection remains usable.
+        """
+        session = self.acquire(smtp_server, smtp_port, sender_email, sender_password)
+        discard = False
+        try:
+            yield session
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(session, discard=discard)
+
+    def send(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str, deliver: Callable[[smtplib.SMTP], Any]) -> Any:
+        """
+        Runs deliver(smtp) on a pooled session and counts it as one message.
+        If the server has dropped the connection, the session is thrown away and
+        deliver is retried once on a fresh connection.
+        """
+        for attempt in range(2):
+            try:
+                with self.session(smtp_server, smtp_port, sender_email, sender_password) as session:
+                    result = deliver(session.smtp)
+                    session.messages_sent += 1
+                    return result
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+                print(f"SMTP session for {sender_email} was disconnected, retrying on a new connection.")
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+        if sessions:
+            print(f"Closed {len(sessions)} pooled SMTP session(s).")
+
+def verify_email_configs(
+    email_configs: List[Dict[str, str]],
+    timeout: float = SMTP_VERIFY_TIMEOUT,
+    connection_pool: Optional[SMTPConnectionPool] = None
+) -> List[Dict[str, Any]]:
+    """
+    Connects, runs STARTTLS and logs in with every sender config at once, and
+    reports per config whether that worked, how long the handshake took and
+    why it failed. A config that has not finished within timeout seconds is
+    reported as timed out.
+
+    With a connection_pool the sessions that succeeded are left in it, so a
+    campaign sends its first messages without another handshake; otherwise
+    they are closed.
+    """
+    pool = connection_pool or SMTPConnectionPool()
+    deadline = time.monotonic() + timeout
+    expired = threading.Event() # sessions that finish after the deadline are closed instead of pooled
+
+    def check(config: Dict[str, str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        session = pool.open(config['smtpServer'], config['smtpPort'], config['senderEmail'], config['senderPassword'], timeout)
+        latency = time.perf_counter() - started
+        pool.release(session, discard=connection_pool is None or expired.is_set())
+        return {"latency_ms": round(latency * 1000)}
+
+    def report(config: Dict[str, str], future) -> Dict[str, Any]:
+        result = {
+            "senderEmail": config['senderEmail'], "smtpServer": config['smtpServer'], "smtpPort": config['smtpPort'],
+            "ok": False, "latency_ms": None, "error": None, "error_class": None
+        }
+        if not future.done():
+            future.cancel()
+            return dict(result, error=f"no response within {timeout:g} seconds", error_class="TimeoutError")
+        error = future.exception()
+        if error is not None:
+            print(f"Verifying sender {config['senderEmail']} on {config['smtpServer']}:{config['smtpPort']} failed: {error}")
+            return dict(result, error=str(error), error_class=type(error).__name__)
+        return dict(result, ok=True, **future.result())
+
+    if not email_configs:
+        return []
+    executor = ThreadPoolExecutor(max_workers=len(email_configs), thread_name_prefix="smtp-verify")
+    try:
+        futures = [executor.submit(check, config) for config in email_configs]
+        concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        expired.set()
+        return [report(config, future) for config, future in zip(email_configs, futures)]
+    finally:
+        executor.shutdown(wait=False)
+
+def row_values(row_data: dict, variables: List[str]) -> List[str]:
+    """
+    The row's values for variables, in order, as the strings a CompiledTemplate renders.
+    Missing and empty (NaN) cells become "".
+    """
+    values = []
+    for variable in variables:
+        value = row_data.get(variable)
+        values.append(str(value) if value is not None and pd.notna(value) else "")
+    return values
+
 def replace_variables_in_message(template: str, row_data: dict, variables: List[str]) -> str:
     """
     Replace variables in message/subject template with actual data from CSV row.
+    For repeated use, compile the template once with compile_template instead.
     """
-    personalized_text = template
-    for variable in variables:
-        placeholder = f"{{{variable}}}"
-        if variable in row_data and pd.notna(row_data[variable]):
-            value = str(row_data[variable])
-        else:
-            value = "" 
-        personalized_text = personalized_text.replace(placeholder, value)
-    return personalized_text
+    return compile_template(template, variables).render(row_values(row_data, variables))
+
+SMTP_OK = 250
+
+class SendResult(NamedTuple):
+    success: bool
+    smtp_code: Optional[int] = None # SMTP_OK on success, the reply code of a failure if the server gave one
+    error: Optional[str] = None
+    transient: bool = False # the failure is worth retrying, see retry_queue.is_transient_failure
+    error_class: Optional[str] = None # exception type of the failure, e.g. SMTPRecipientsRefused
+    sender_failure: bool = False # the sender itself could not be used, see sender_health.is_sender_failure
+
+    @property
+    def throttled(self) -> bool:
+        return is_throttling_reply(self.smtp_code)
+
+def _smtp_error_code(error: Exception) -> Optional[int]:
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        return next(iter(error.recipients.values()))[0]
+    return None
 
 def send_single_email(
     sender_email: str,
@@ -67,12 +314,60 @@ def send_single_email(
     smtp_port: int,
     html_content: bool,
     bcc_mode: bool,
-    attachment_path: Optional[str] = None
+    attachment_path: Optional[str] = None,
+    connection_pool: Optional[SMTPConnectionPool] = None
 ) -> bool:
     """
     Sends a single email with optional attachment, supporting HTML and BCC.
+    When a connection_pool is given, a pooled session is reused instead of
+    opening a new connection for every recipient.
     Returns True on success, False on failure.
     """
+    return deliver_email(
+        sender_email, sender_password, receiver_email, subject, body,
+        smtp_server, smtp_port, html_content, bcc_mode, attachment_path, connection_pool
+    ).success
+
+def load_attachment_part(attachment_path: Optional[str]) -> Optional[MIMEBase]:
+    """
+    Reads and base64-encodes an attachment into a MIME part. The part is never
+    modified afterwards, so a campaign can build it once and attach the same
+    object to every message instead of re-reading and re-encoding the file per
+    recipient.
+    """
+    if not attachment_path or not os.path.exists(attachment_path):
+        return None
+    try:
+        filename = os.path.basename(attachment_path)
+        with open(attachment_path, "rb") as attachment:
+            part = MIMEBase("application", "octet-stream")
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header(
+            "Content-Disposition",
+            f"attachment; filename= {filename}",
+        )
+        print(f"Attached file: {filename}")
+        return part
+    except Exception as e:
+        print(f"Error attaching file {attachment_path}: {e}")
+        return None
+
+def build_email_message(
+    sender_email: str,
+    receiver_email: str,
+    subject: str,
+    body: str,
+    html_content: bool,
+    bcc_mode: bool,
+    attachment_path: Optional[str] = None,
+    attachment_part: Optional[MIMEBase] = None
+) -> MIMEMultipart:
+    """
+    Builds the MIME message. A pre-encoded attachment_part (see
+    load_attachment_part) is attached as-is; otherwise attachment_path is read
+    and encoded for this message alone.
+    """
     msg = MIMEMultipart()
     msg['From'] = sender_email
     msg['Subject'] = subject
@@ -87,124 +382,996 @@ def send_single_email(
     else:
         msg.attach(MIMEText(body, 'plain', 'utf-8')) 
 
-    if attachment_path and os.path.exists(attachment_path):
-        try:
-            filename = os.path.basename(attachment_path)
-            with open(attachment_path, "rb") as attachment:
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                "Content-Disposition",
-                f"attachment; filename= {filename}",
-            )
-            msg.attach(part)
-            print(f"Attached file: {filename}")
-        except Exception as e:
-            print(f"Error attaching file {attachment_path}: {e}")
+    if attachment_part is None:
+        attachment_part = load_attachment_part(attachment_path)
+    if attachment_part is not None:
+        msg.attach(attachment_part)
 
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls() 
-            server.login(sender_email, sender_password)
+    return msg
 
-            if bcc_mode:
-                server.send_message(msg, from_addr=sender_email, to_addrs=[receiver_email])
-            else:
+def serialize_message(msg: MIMEMultipart) -> bytes:
+    """
+    Flattens a message the way smtplib's send_message would put it on the wire.
+    """
+    buffer = io.BytesIO()
+    BytesGenerator(buffer).flatten(msg, linesep="\r\n")
+    return buffer.getvalue()
+
+class MessageSkeleton:
+    """
+    The parts of a campaign message that are the same for every recipient,
+    serialized once: the multipart boundary and headers, the text part headers
+    and the encoded attachment. render() only encodes the personalized From,
+    Subject and To headers and the body and splices them in, producing the same
+    bytes as serialize_message(build_email_message(...)) without building and
+    flattening a MIME tree per recipient. See benchmarks/bench_message_build.py.
+
+    assemble() does the splicing for a Subject and body encoded beforehand, e.g.
+    by a RenderPool.
+    """
+    def __init__(self, html_content: bool, attachment_part: Optional[MIMEBase] = None, boundary: Optional[str] = None):
+        self.boundary = boundary or ("=" * 15) + str(random.randrange(sys.maxsize)) + "=="
+        delimiter = b"\r\n--" + self.boundary.encode("ascii")
+
+        text_part = serialize_message(MIMEText("", 'html' if html_content else 'plain', 'utf-8'))
+        text_part_headers = text_part.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+
+        self._head = fold_header("Content-Type", f'multipart/mixed; boundary="{self.boundary}"') + fold_header("MIME-Version", "1.0")
+        self._body_head = b"\r\n" + delimiter[2:] + b"\r\n" + text_part_headers
+        tail = b""
+        if attachment_part is not None:
+            tail += delimiter + b"\r\n" + serialize_message(attachment_part)
+        self._tail = tail + delimiter + b"--\r\n"
+
+    def render(self, sender_email: str, receiver_email: str, subject: str, body: str) -> bytes:
+        return self.assemble(sender_email, receiver_email, fold_header("Subject", subject), encode_body(body))
+
+    def assemble(self, sender_email: str, receiver_email: str, subject_header: bytes, encoded_body: bytes) -> bytes:
+        return b"".join((
+            self._head,
+            fold_header("From", sender_email),
+            subject_header,
+            fold_header("To", receiver_email),
+            self._body_head,
+            encoded_body,
+            self._tail,
+        ))
+
+def deliver_email(
+    sender_email: str,
+    sender_password: str,
+    receiver_email: str,
+    subject: str,
+    body: str,
+    smtp_server: str,
+    smtp_port: int,
+    html_content: bool,
+    bcc_mode: bool,
+    attachment_path: Optional[str] = None,
+    connection_pool: Optional[SMTPConnectionPool] = None,
+    attachment_part: Optional[MIMEBase] = None
+) -> SendResult:
+    """
+    Same as send_single_email, but returns a SendResult carrying the SMTP reply
+    code of a failure so callers can tell throttling from other errors.
+    """
+    msg = build_email_message(sender_email, receiver_email, subject, body, html_content, bcc_mode, attachment_path, attachment_part)
+
+    try:
+        if connection_pool is not None:
+            connection_pool.send(
+                smtp_server, smtp_port, sender_email, sender_password,
+                lambda server: server.send_message(msg, from_addr=sender_email, to_addrs=[receiver_email])
+            )
+        else:
+            with smtplib.SMTP(smtp_server, smtp_port) as server:
+                server.starttls() 
+                server.login(sender_email, sender_password)
                 server.send_message(msg, from_addr=sender_email, to_addrs=[receiver_email])
 
         send_type = "BCC" if bcc_mode else "TO"
         print(f"Email sent ({send_type}) to {receiver_email} with subject: '{subject}' using sender: {sender_email}")
-        return True
-    except smtplib.SMTPAuthenticationError:
+        return SendResult(True, SMTP_OK)
+    except Exception as e:
+        return _send_failure(e, sender_email, receiver_email, smtp_server, smtp_port)
+
+def deliver_prepared_email(
+    sender_email: str,
+    sender_password: str,
+    receiver_email: str,
+    message_bytes: bytes,
+    smtp_server: str,
+    smtp_port: int,
+    connection_pool: SMTPConnectionPool
+) -> SendResult:
+    """
+    Sends a message that is already serialized (see MessageSkeleton) over a pooled session.
+    """
+    try:
+        connection_pool.send(
+            smtp_server, smtp_port, sender_email, sender_password,
+            lambda server: server.sendmail(sender_email, [receiver_email], message_bytes)
+        )
+        print(f"Email sent to {receiver_email} using sender: {sender_email}")
+        return SendResult(True, SMTP_OK)
+    except Exception as e:
+        return _send_failure(e, sender_email, receiver_email, smtp_server, smtp_port)
+
+def _send_failure(error: Exception, sender_email: str, receiver_email: str, smtp_server: str, smtp_port: int) -> SendResult:
+    if isinstance(error, smtplib.SMTPAuthenticationError):
         print(f"Authentication failed for {sender_email}. Check password/app password and SMTP settings. For Gmail/Outlook, use an App Password.")
-        return False
-    except smtplib.SMTPConnectError as e:
-        print(f"Could not connect to SMTP server {smtp_server}:{smtp_port}. Error: {e}")
+    elif isinstance(error, smtplib.SMTPConnectError):
+        print(f"Could not connect to SMTP server {smtp_server}:{smtp_port}. Error: {error}")
         print("Please check your SMTP server address and port, and ensure your network allows outgoing connections on this port.")
-        return False
+    elif is_throttling_reply(_smtp_error_code(error)):
+        print(f"Sender {sender_email} was throttled by {smtp_server} ({_smtp_error_code(error)}) while sending to {receiver_email}: {error}")
+    else:
+        print(f"Error sending email to {receiver_email}: {error}")
+    return SendResult(False, _smtp_error_code(error), str(error), is_transient_failure(error), type(error).__name__, is_sender_failure(error))
+
+def deliver_bcc_batch(
+    sender_email: str,
+    sender_password: str,
+    receiver_emails: List[str],
+    message_bytes: bytes,
+    smtp_server: str,
+    smtp_port: int,
+    connection_pool: SMTPConnectionPool
+) -> Dict[str, SendResult]:
+    """
+    Submits one already serialized message to many recipients in a single SMTP
+    transaction (one MAIL FROM, one RCPT TO per recipient, one DATA).
+    Returns a SendResult per recipient, so addresses the server refused are
+    reported individually while the rest of the batch is still delivered.
+    """
+    try:
+        refused = connection_pool.send(
+            smtp_server, smtp_port, sender_email, sender_password,
+            lambda server: server.sendmail(sender_email, receiver_emails, message_bytes)
+        )
+    except smtplib.SMTPRecipientsRefused as e:
+        refused = e.recipients
     except Exception as e:
-        print(f"Error sending email to {receiver_email}: {e}")
-        return False
+        smtp_code = _smtp_error_code(e)
+        print(f"Error sending BCC batch of {len(receiver_emails)} recipients using sender {sender_email}: {e}")
+        transient = is_transient_failure(e)
+        failure = SendResult(False, smtp_code, str(e), transient, type(e).__name__, is_sender_failure(e))
+        return {receiver_email: failure for receiver_email in receiver_emails}
+
+    results: Dict[str, SendResult] = {}
+    for receiver_email in receiver_emails:
+        if receiver_email in refused:
+            smtp_code, response = refused[receiver_email]
+            reason = response.decode("utf-8", "replace") if isinstance(response, bytes) else str(response)
+            print(f"Recipient {receiver_email} refused by {smtp_server} ({smtp_code}): {reason}")
+            results[receiver_email] = SendResult(False, smtp_code, reason, is_transient_reply(smtp_code), "SMTPRecipientsRefused")
+        else:
+            results[receiver_email] = SendResult(True, SMTP_OK)
+    print(f"Email sent (BCC batch) to {len(receiver_emails) - len(refused)} of {len(receiver_emails)} recipients using sender: {sender_email}")
+    return results
+
+DEFAULT_SENDER_CONCURRENCY = 1 # in-flight messages per sender config unless the config sets maxConcurrency
+WORK_QUEUE_SIZE_PER_LANE = 8 # bound on queued work items per lane, so chunked input is read only as fast as it is sent
+
+DISPATCH_SERIAL = "serial" # one thread rotating through the sender configs
+DISPATCH_THREADED = "threaded" # one worker thread per sender config sharing a work queue
+DISPATCH_MODES = (DISPATCH_SERIAL, DISPATCH_THREADED)
+
+RETRY_POLL_INTERVAL = 0.5 # seconds an idle lane waits for input before looking at the retry queue again
+
+Frames = Union[pd.DataFrame, Iterable[pd.DataFrame]]
+
+def _open_frames(df: Frames) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """
+    Accepts a whole DataFrame or an iterable of DataFrame chunks (for example
+    pd.read_csv(..., chunksize=N)) and returns (columns, chunk iterator).
+    """
+    if isinstance(df, pd.DataFrame):
+        return list(df.columns), iter([df])
+    frames = iter(df)
+    first = next(frames, None)
+    if first is None:
+        return [], iter([])
+    return list(first.columns), itertools.chain([first], frames)
+
+def _find_email_column(columns: List[str]) -> Optional[str]:
+    for col in columns:
+        if col.strip().lower() == 'email':
+            return col
+    return None
+
+# Same rule as before vectorizing: an '@' whose domain part contains a '.'.
+EMAIL_SHAPE_PATTERN = r"@[^@]*\.[^@]*$"
+
+def _column_strings(column: pd.Series) -> pd.Series:
+    """
+    The column as strings the way the templates render them, with empty (NaN) cells as "".
+    """
+    return column.where(column.notna(), "").astype(str)
+
+class _CampaignResults:
+    """
+    The sent and failed counts of a campaign run, plus the addresses behind them
+    when keep is True. A campaign run with keep_results=False only counts, so it
+    does not hold every address in memory; its outbox keeps the outcomes.
+    Thread-safe, shared by all lanes of a run.
+    """
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.sent = 0
+        self.failed = 0
+        self.successful_emails: List[str] = []
+        self.failed_emails: List[str] = []
+        self._lock = threading.Lock()
+
+    def add_sent(self, emails: List[str]):
+        with self._lock:
+            self.sent += len(emails)
+            if self.keep:
+                self.successful_emails.extend(emails)
+
+    def add_failed(self, emails: List[str]):
+        with self._lock:
+            self.failed += len(emails)
+            if self.keep:
+                self.failed_emails.extend(emails)
+
+    def record(self, results: List[Tuple[str, SendResult]]):
+        self.add_sent([receiver_email for receiver_email, result in results if result.success])
+        self.add_failed([receiver_email for receiver_email, result in results if not result.success])
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {"successful_emails": self.successful_emails, "failed_emails": self.failed_emails}
+
+def _iter_valid_recipients(
+    frames: Iterable[pd.DataFrame],
+    email_column_actual_name: str,
+    variables: List[str],
+    results: _CampaignResults,
+    progress: Optional[CampaignProgress] = None,
+    outbox: Optional[OutboxWriter] = None
+):
+    """
+    Yields (row_index, receiver_email, values) for every row with a usable address,
+    where values is a tuple of the row's strings for variables, in order.
+
+    Each chunk is validated with vectorized string operations and only the
+    variable columns are converted, so no per-row Series is built. Rows without an
+    address or with a malformed one are recorded as failed in results in row order,
+    counted in progress and written to outbox as failed. With an outbox, the
+    valid rows of each chunk are written as pending before any is yielded.
+    """
+    for frame in frames:
+        emails = _column_strings(frame[email_column_actual_name]).str.strip()
+        empty = emails == ""
+        valid = ~empty & emails.str.contains(EMAIL_SHAPE_PATTERN, regex=True)
+
+        if not valid.all():
+            skipped = []
+            for index, receiver_email, is_empty in zip(frame.index[~valid], emails[~valid], empty[~valid]):
+                if is_empty:
+                    print(f"Skipping row {index+1}: 'email' column is empty or missing.")
+                    results.add_failed([f"Row {index+1} (no email address found)"])
+                    skipped.append((f"Row {index+1}", "no email address found"))
+                    if outbox is not None:
+                        outbox.record(index, None, STATE_FAILED, error="no email address found", error_class="MissingEmail")
+                else:
+                    print(f"Skipping invalid email address: '{receiver_email}' (row {index+1})")
+                    results.add_failed([f"{receiver_email} (invalid format)"])
+                    skipped.append((receiver_email, "invalid format"))
+                    if outbox is not None:
+                        outbox.record(index, receiver_email, STATE_FAILED, error="invalid format", error_class="InvalidEmail")
+            if progress is not None:
+                progress.record(failed=len(skipped), failures=skipped)
+            frame = frame[valid]
+            emails = emails[valid]
+
+        row_indexes = frame.index.tolist()
+        receiver_emails = emails.tolist()
+        if outbox is not None:
+            outbox.add_pending(zip(row_indexes, receiver_emails))
+        if variables:
+            values = zip(*[_column_strings(frame[variable]).tolist() for variable in variables])
+        else:
+            values = itertools.repeat((), len(frame))
+        yield from zip(row_indexes, receiver_emails, values)
+
+class CampaignContext:
+    """
+    Campaign-wide state shared by every engine and lane: compiled templates,
+    options, the message skeleton with the attachment encoded once, the SMTP
+    connection pool and the per-sender rate limiters. The limiters come from
+    rate_limiters, shared with the other campaigns of the process, or from a
+    registry of the campaign's own if none is given.
+
+    Recipients are grouped into work items. A work item is a list of
+    (row_index, receiver_email, values) tuples holding a single recipient, or up
+    to bcc_batch_size recipients when the campaign is sent as batched BCC. Batched
+    BCC applies only when bcc_mode is on and the templates contain no variables,
+    because every recipient of a batch receives the very same message.
+
+    Messages are rendered from the skeleton. Recipients or senders with non-ASCII
+    addresses need SMTPUTF8, so they are sent alone through the regular
+    send_message path instead.
+
+    Recipients whose send failed transiently are not reported yet but put on the
+    retry queue, from which the lanes take them again once their backoff is over,
+    preferably through another sender.
+
+    With render_processes, single-recipient messages are personalized and
+    encoded by a RenderPool while the work items are read, and the lanes only
+    splice in the sender. The values of those recipients are then
+    RenderedMessages instead of template values.
+    """
+    def __init__(
+        self,
+        subject_template: str,
+        message_template: str,
+        variables: List[str],
+        email_configs: List[Dict[str, str]],
+        html_content: bool,
+        bcc_mode: bool,
+        media_path: Optional[str] = None,
+        bcc_batch_size: int = 1,
+        columns: Optional[List[str]] = None,
+        progress: Optional[CampaignProgress] = None,
+        outbox: Optional[OutboxWriter] = None,
+        render_processes: int = 0,
+        rate_limiters: Optional[RateLimiterRegistry] = None
+    ):
+        self.outbox = outbox
+        self.progress = progress or CampaignProgress()
+        self.progress.start()
+        self.subject_template = compile_template(subject_template, variables, columns)
+        self.message_template = compile_template(message_template, variables, columns)
+        for name in self.subject_template.unknown_placeholders + self.message_template.unknown_placeholders:
+            print(f"Warning: placeholder '{{{name}}}' is not one of the selected variables and will be sent as-is.")
+        # Recipients carry only the values the templates use, so compile against that projection.
+        used = set(self.subject_template.used_variables) | set(self.message_template.used_variables)
+        self.variables = [variable for variable in dict.fromkeys(variables) if variable in used]
+        self.subject_template = compile_template(subject_template, self.variables)
+        self.message_template = compile_template(message_template, self.variables)
+        self.html_content = html_content
+        self.bcc_mode = bcc_mode
+        self.media_path = media_path
+        self.attachment_part = load_attachment_part(media_path)
+        self.skeleton = MessageSkeleton(html_content, self.attachment_part)
+        self.connection_pool = SMTPConnectionPool()
+        rate_limiters = rate_limiters or RateLimiterRegistry()
+        self.rate_limiters = {sender_key(config): rate_limiters.get(config) for config in email_configs}
+        self.retries = RetryQueue(senders=len(self.rate_limiters))
+        self.health = SenderHealth([config['senderEmail'] for config in email_configs], on_change=self.progress.set_sender_state)
+        self.batch_size = 1
+        if bcc_mode and bcc_batch_size > 1:
+            if self.subject_template.has_slots or self.message_template.has_slots:
+                print("Templates contain variables, sending BCC messages one recipient at a time.")
+            else:
+                self.batch_size = bcc_batch_size
+                print(f"Sending as batched BCC with up to {bcc_batch_size} recipients per message.")
+        self._batch_messages: Dict[str, bytes] = {}
+        self._render_pool: Optional[RenderPool] = None
+        if render_processes > 0:
+            if self.batch_size > 1:
+                print("Batched BCC messages are rendered once per sender, not starting render processes.")
+            elif not all(config['senderEmail'].isascii() for config in email_configs):
+                print("Non-ASCII sender addresses need SMTPUTF8, not starting render processes.")
+            else:
+                print(f"Rendering messages in {render_processes} processes.")
+                self._render_pool = RenderPool(render_processes, subject_template, message_template, self.variables)
+
+    def work_items(self, recipients):
+        items = self._work_items(recipients)
+        if self._render_pool is not None:
+            items = self._pre_rendered(items)
+        return items
+
+    def _work_items(self, recipients):
+        item = []
+        for recipient in recipients:
+            if self.progress.cancelled:
+                print("Campaign cancelled, no further recipients will be read.")
+                return
+            if self.batch_size > 1 and not recipient[1].isascii():
+                yield [recipient]
+                continue
+            item.append(recipient)
+            if len(item) >= self.batch_size:
+                yield item
+                item = []
+        if item:
+            yield item
+
+    def _pre_rendered(self, items):
+        def chunks():
+            while True:
+                chunk = _take(items, RENDER_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk, [item[0][2] for item in chunk if item[0][1].isascii()]
+
+        try:
+            for chunk, rendered in self._render_pool.render(chunks()):
+                if rendered is None:
+                    yield from chunk
+                    continue
+                rendered = iter(rendered)
+                for item in chunk:
+                    index, receiver_email, values = item[0]
+                    yield [(index, receiver_email, next(rendered))] if receiver_email.isascii() else item
+        finally:
+            self._render_pool.close()
+
+    def _batch_message(self, config: Dict[str, str]) -> bytes:
+        sender_email = config['senderEmail']
+        message_bytes = self._batch_messages.get(sender_email)
+        if message_bytes is None:
+            message_bytes = self.skeleton.render(sender_email, "", self.subject_template.source, self.message_template.source)
+            self._batch_messages[sender_email] = message_bytes
+        return message_bytes
+
+    def send(self, config: Dict[str, str], item: list) -> List[Tuple[str, SendResult]]:
+        """
+        Sends one work item through config and feeds the outcome back to the
+        sender's rate limiter. Returns (receiver_email, SendResult) per recipient,
+        leaving out the recipients queued for a retry.
+        """
+        sender_email = config['senderEmail']
+        started = time.perf_counter()
+        if len(item) == 1 and (self.batch_size == 1 or not item[0][1].isascii()):
+            index, receiver_email, values = item[0]
+            print(f"Attempting to send email to {receiver_email} using sender: {sender_email}...")
+
+            if isinstance(values, RenderedMessage):
+                message_bytes = self.skeleton.assemble(
+                    sender_email, "" if self.bcc_mode else receiver_email, values.subject_header, values.encoded_body
+                )
+            elif receiver_email.isascii() and sender_email.isascii():
+                message_bytes = self.skeleton.render(
+                    sender_email, "" if self.bcc_mode else receiver_email,
+                    self.subject_template.render(values), self.message_template.render(values)
+                )
+            else:
+                message_bytes = None
+
+            if message_bytes is not None:
+                result = deliver_prepared_email(
+                    sender_email=sender_email,
+                    sender_password=config['senderPassword'],
+                    receiver_email=receiver_email,
+                    message_bytes=message_bytes,
+                    smtp_server=config['smtpServer'],
+                    smtp_port=config['smtpPort'],
+                    connection_pool=self.connection_pool
+                )
+            else:
+                personalized_subject = self.subject_template.render(values)
+                personalized_message = self.message_template.render(values)
+                result = deliver_email(
+                    sender_email=sender_email,
+                    sender_password=config['senderPassword'],
+                    receiver_email=receiver_email,
+                    subject=personalized_subject,
+                    body=personalized_message,
+                    smtp_server=config['smtpServer'],
+                    smtp_port=config['smtpPort'],
+                    html_content=self.html_content,
+                    bcc_mode=self.bcc_mode,
+                    connection_pool=self.connection_pool,
+                    attachment_part=self.attachment_part
+                )
+            results = [(receiver_email, result)]
+        else:
+            receiver_emails = [receiver_email for index, receiver_email, values in item]
+            print(f"Attempting to send BCC batch of {len(receiver_emails)} recipients using sender: {config['senderEmail']}...")
+            batch_results = deliver_bcc_batch(
+                sender_email=config['senderEmail'],
+                sender_password=config['senderPassword'],
+                receiver_emails=receiver_emails,
+                message_bytes=self._batch_message(config),
+                smtp_server=config['smtpServer'],
+                smtp_port=config['smtpPort'],
+                connection_pool=self.connection_pool
+            )
+            results = [(receiver_email, batch_results[receiver_email]) for receiver_email in receiver_emails]
+        latency = time.perf_counter() - started
+
+        self.health.record(
+            sender_email, any(result.success for _, result in results), latency,
+            sender_failure=any(result.sender_failure for _, result in results)
+        )
+        limiter = self.limiter(config)
+        if any(result.throttled for _, result in results):
+            limiter.on_throttled()
+        elif any(result.success for _, result in results):
+            limiter.on_success()
+        unsent = sum(1 for _, result in results if result.sender_failure)
+        if unsent:
+            limiter.refund(unsent) # never reached the provider, so it does not count against maxPerDay
+
+        outcomes = list(zip(item, (result for _, result in results)))
+        retry_item = [recipient for recipient, result in outcomes if not result.success and result.transient]
+        if retry_item and not self.progress.cancelled and self.retries.schedule(retry_item, sender_email):
+            print(f"Transient failure sending to {len(retry_item)} recipient(s) using sender {sender_email}, retrying later.")
+            retrying = {index for index, receiver_email, values in retry_item}
+        else:
+            retrying = set()
+
+        failures = [(receiver_email, result.error) for (index, receiver_email, values), result in outcomes if not result.success and index not in retrying]
+        sent = sum(1 for _, result in outcomes if result.success)
+        self.progress.record(sent, len(failures), sender_email, failures, retried=len(retrying))
+        if self.outbox is not None:
+            for (index, receiver_email, values), result in outcomes:
+                state = STATE_SENT if result.success else STATE_RETRYING if index in retrying else STATE_FAILED
+                self.outbox.record(
+                    index, receiver_email, state, sender_email, result.smtp_code, result.error, latency, result.error_class
+                )
+        return [(receiver_email, result) for (index, receiver_email, values), result in outcomes if index not in retrying]
+
+    def preflight(self, email_configs: List[Dict[str, str]], timeout: float = SMTP_VERIFY_TIMEOUT) -> List[Dict[str, Any]]:
+        """
+        Verifies every sender before the first send (see verify_email_configs)
+        and leaves the sessions that succeeded in the connection pool. Senders
+        whose login is rejected are retired and those that could not be reached
+        quarantined, so no recipient is spent on finding that out.
+        """
+        checks = verify_email_configs(email_configs, timeout, self.connection_pool)
+        for check in checks:
+            if check["ok"]:
+                print(f"Sender {check['senderEmail']} verified in {check['latency_ms']} ms.")
+            elif check["error_class"] == smtplib.SMTPAuthenticationError.__name__:
+                self.health.retire(check["senderEmail"], f"login rejected ({check['error']})")
+            else:
+                self.health.record(check["senderEmail"], False, 0.0, sender_failure=True)
+        return checks
+
+    def limiter(self, config: Dict[str, str]) -> SenderRateLimiter:
+        return self.rate_limiters[sender_key(config)]
+
+    def no_sender_failures(self, item: list) -> List[str]:
+        """
+        Reports item as failed because no sender can take it any more.
+        """
+        if self.health.all_retired():
+            return self._unsent_failures(item, "every sender failed to authenticate or connect")
+        return self._unsent_failures(item, "daily sending quota reached")
+
+    def cancelled_failures(self, item: list) -> List[str]:
+        return self._unsent_failures(item, "campaign cancelled")
+
+    def _unsent_failures(self, item: list, reason: str) -> List[str]:
+        self.progress.record(failed=len(item), failures=[(receiver_email, reason) for index, receiver_email, values in item])
+        return [f"{receiver_email} ({reason})" for index, receiver_email, values in item]
+
+    def close(self):
+        if self._render_pool is not None:
+            self._render_pool.close()
+        self.connection_pool.close_all()
+        if self.outbox is not None:
+            self.outbox.flush()
+
+def _lane_stop_reason(retired: bool) -> str:
+    return "was retired after repeated authentication or connection failures" if retired else "reached its daily quota"
+
+def _check_campaign_inputs(columns: List[str], frames: Iterator[pd.DataFrame], email_configs: List[Dict[str, str]]) -> Tuple[Optional[str], Optional[Dict[str, List[str]]]]:
+    """
+    Returns (email_column, None) when the campaign can run, or (None, results) with
+    every row failed when the CSV has no email column or no senders were given.
+    """
+    email_column_actual_name = _find_email_column(columns)
+
+    if email_column_actual_name is None:
+        print("Error: CSV must contain an 'email' column (case-insensitive, whitespace-trimmed).")
+        failed_emails_for_missing_column = [
+            f"Row {idx+1} (no 'email' column found)" for frame in frames for idx in frame.index
+        ]
+        return None, {"successful_emails": [], "failed_emails": failed_emails_for_missing_column}
+
+    if not email_configs:
+        print("No email configurations provided. Email sending will fail for all recipients.")
+        failed_emails = [email for frame in frames for email in frame[email_column_actual_name].astype(str).tolist()]
+        return None, {"successful_emails": [], "failed_emails": failed_emails}
+
+    return email_column_actual_name, None
+
+def _next_config_with_quota(
+    email_configs: List[Dict[str, str]],
+    campaign: CampaignContext,
+    count: int,
+    avoid: Optional[str] = None
+) -> Tuple[Optional[Dict[str, str]], float]:
+    """
+    Picks the next sender by health (see SenderHealth.rank) whose daily quota
+    still allows count messages and reserves them. The sender avoid (one a retry
+    failed on) is only used if no other has quota left, and a quarantined sender
+    only if no other is ready. Returns (config, seconds to wait), or (None, 0) if
+    every sender is exhausted or retired.
+    """
+    quarantines = {config['senderEmail']: campaign.health.quarantined_for(config['senderEmail']) for config in email_configs}
+    ranked = [email_configs[position] for position in campaign.health.rank([config['senderEmail'] for config in email_configs])]
+    ranked.sort(key=lambda config: (quarantines[config['senderEmail']] > 0, config['senderEmail'] == avoid))
+    for config in ranked:
+        wait = campaign.limiter(config).reserve(count)
+        if wait is not None:
+            return config, max(wait, quarantines[config['senderEmail']])
+    return None, 0.0
+
+def _with_retries(work_items, campaign: CampaignContext):
+    """
+    Yields (item, sender it failed on) for the serial engine: due retries ahead
+    of every new work item, then, once the input is exhausted, the remaining
+    retries as they become due. Retries still queued when the campaign is
+    cancelled are left on the queue.
+    """
+    for item in work_items:
+        retry = campaign.retries.take()
+        while retry is not None:
+            yield retry
+            retry = campaign.retries.take()
+        yield item, None
+    while not campaign.progress.cancelled:
+        retry = campaign.retries.take()
+        if retry is not None:
+            yield retry
+            continue
+        wait = campaign.retries.next_due_in()
+        if wait is None:
+            return
+        time.sleep(min(wait, RETRY_POLL_INTERVAL))
 
 def send_emails_from_dataframe_enhanced(
-    df: pd.DataFrame,
+    df: Frames,
     subject_template: str,
     message_template: str,
     variables: List[str],
     email_configs: List[Dict[str, str]], 
     html_content: bool,
     bcc_mode: bool,
-    media_path: Optional[str] = None
+    media_path: Optional[str] = None,
+    dispatch_mode: str = DISPATCH_SERIAL,
+    bcc_batch_size: int = 1,
+    progress: Optional[CampaignProgress] = None,
+    outbox: Optional[OutboxWriter] = None,
+    render_processes: int = 0,
+    keep_results: bool = True,
+    preflight: bool = True,
+    rate_limiters: Optional[RateLimiterRegistry] = None
 ) -> Dict[str, List[str]]:
-    successful_emails: List[str] = []
-    failed_emails: List[str] = []
+    """
+    Sends the campaign from the calling thread. With dispatch_mode="serial" the
+    sender configs take turns weighted by their recent success rate and latency;
+    with dispatch_mode="threaded" each sender config gets its own worker thread
+    pulling from a shared work queue, so a slow or stalled sender does not hold
+    back the others. Either way, senders that fail to authenticate or connect
+    are quarantined and eventually retired (see SenderHealth).
 
-    email_column_actual_name = None
-    for col in df.columns:
-        if col.strip().lower() == 'email':
-            email_column_actual_name = col
-            break
+    df may be a DataFrame or an iterable of DataFrame chunks; chunks are read only
+    as fast as they are sent. Senders are held to their maxPerMinute/maxPerDay
+    quotas, across campaigns if they share rate_limiters; recipients left once
+    every sender has used up its daily quota are reported as failed. With bcc_mode and bcc_batch_size > 1, non-personalized
+    campaigns are sent as one message per batch of recipients. Transient
+    failures (see retry_queue.is_transient_failure) are retried with jittered
+    exponential backoff, preferably through another sender, while the rest of
+    the campaign carries on.
 
-    if email_column_actual_name is None:
-        print("Error: CSV must contain an 'email' column (case-insensitive, whitespace-trimmed).")
-        failed_emails_for_missing_column = [
-            f"Row {idx+1} (no 'email' column found)" for idx in range(len(df))
-        ]
-        return {"successful_emails": [], "failed_emails": failed_emails_for_missing_column}
+    If progress is given it is kept up to date while sending, and cancelling it
+    stops the campaign early. With an outbox, every recipient's state is
+    recorded as the campaign runs, and rows the campaign finished in an earlier
+    run are skipped, so an interrupted campaign can be resumed.
 
+    render_processes > 0 moves personalizing and encoding the messages to that
+    many worker processes (see RenderPool), for campaigns where one core cannot
+    render as fast as the senders deliver.
 
-    if not email_configs:
-        print("No email configurations provided. Email sending will fail for all recipients.")
-        failed_emails = [str(row.get("email", "N/A")) for index, row in df.iterrows()]
-        return {"successful_emails": [], "failed_emails": failed_emails}
+    With keep_results=False the returned lists stay empty, so a large campaign
+    does not hold every address in memory; pass an outbox to keep the outcomes.
+
+    With preflight, every sender is verified concurrently before the first send
+    (see CampaignContext.preflight), so wrong passwords or hosts cost no
+    recipients and the first messages go out on already open sessions.
+
+    Templates are compiled once up front; TemplateError is raised before anything
+    is sent if they use variables the DataFrame does not have.
+    """
+    if dispatch_mode not in DISPATCH_MODES:
+        raise ValueError(f"Unknown dispatch mode '{dispatch_mode}'. Expected one of: {', '.join(DISPATCH_MODES)}")
+
+    results = _CampaignResults(keep_results)
 
-    print(f"Starting email campaign (HTML: {html_content}, BCC: {bcc_mode})...")
+    columns, frames = _open_frames(df)
+    email_column_actual_name, early_results = _check_campaign_inputs(columns, frames, email_configs)
+    if early_results is not None:
+        if progress is not None:
+            progress.record(failed=len(early_results["failed_emails"]))
+        return early_results
+
+    print(f"Starting email campaign (HTML: {html_content}, BCC: {bcc_mode}, dispatch: {dispatch_mode})...")
     print(f"Found {len(email_configs)} sender configurations.")
 
-    config_queue = deque(email_configs)
+    campaign = CampaignContext(
+        subject_template, message_template, variables, email_configs,
+        html_content, bcc_mode, media_path, bcc_batch_size, columns=columns, progress=progress, outbox=outbox,
+        render_processes=render_processes, rate_limiters=rate_limiters
+    )
+    if outbox is not None:
+        frames = outbox.skip_finished(frames)
+    work_items = campaign.work_items(_iter_valid_recipients(
+        frames, email_column_actual_name, campaign.variables, results, campaign.progress, outbox
+    ))
 
-    for index, row in df.iterrows():
-        receiver_email = str(row.get(email_column_actual_name, "")).strip()
+    try:
+        if preflight:
+            campaign.preflight(email_configs)
+        if dispatch_mode == DISPATCH_THREADED:
+            _dispatch_threaded(work_items, email_configs, campaign, results)
+        else:
+            for item, failed_sender in _with_retries(work_items, campaign):
+                current_config, wait = _next_config_with_quota(email_configs, campaign, len(item), avoid=failed_sender)
+                if current_config is None:
+                    results.add_failed(campaign.no_sender_failures(item))
+                    continue
+                if wait > 0:
+                    time.sleep(wait)
 
-        if not receiver_email:
-            print(f"Skipping row {index+1}: 'email' column is empty or missing.")
-            failed_emails.append(f"Row {index+1} (no email address found)")
-            continue
+                results.record(campaign.send(current_config, item))
+            for item in campaign.retries.drain():
+                results.add_failed(campaign.cancelled_failures(item))
+    finally:
+        campaign.close()
 
-        if "@" not in receiver_email or "." not in receiver_email.split("@")[-1]:
-            print(f"Skipping invalid email address: '{receiver_email}' (row {index+1})")
-            failed_emails.append(f"{receiver_email} (invalid format)")
-            continue
+    print("Email campaign finished!")
+    print(f"Summary: {results.sent} emails sent successfully, {results.failed} failed.")
+    return results.to_dict()
 
-        row_dict = row.to_dict()
+def _dispatch_threaded(
+    work_items,
+    email_configs: List[Dict[str, str]],
+    campaign: CampaignContext,
+    results: _CampaignResults
+):
+    """
+    Runs one worker lane per sender config on a ThreadPoolExecutor while the
+    calling thread feeds a bounded shared queue. Lanes record their outcomes in
+    results as they go.
 
-        personalized_subject = replace_variables_in_message(subject_template, row_dict, variables)
-        personalized_message = replace_variables_in_message(message_template, row_dict, variables)
+    A lane stops when its sender runs out of daily quota or is retired (see
+    SenderHealth) and hands its item back to the lanes still running; the last lane to stop drains the queue and reports
+    what is left as failed, so the feeding thread never blocks on a queue nobody
+    reads. Between work items lanes take due retries, and once the input is
+    exhausted they stay until the retry queue is empty.
+    """
+    work_queue: queue.Queue = queue.Queue(maxsize=WORK_QUEUE_SIZE_PER_LANE * len(email_configs))
+    returned_items: deque = deque() # items handed back by lanes whose sender is quarantined, retired or out of quota
+    lane_state = {"active": len(email_configs)}
+    lane_state_lock = threading.Lock()
 
-        current_config = config_queue[0]
-        config_queue.rotate(-1)
+    def run_lane(config: Dict[str, str]):
+        limiter = campaign.limiter(config)
+        input_done = False
+        while True:
+            with lane_state_lock:
+                item = returned_items.popleft() if returned_items else None
+            if item is None:
+                retry = campaign.retries.take(config['senderEmail'])
+                item = retry[0] if retry is not None else None
+            if item is None and input_done:
+                if campaign.progress.cancelled:
+                    for retry_item in campaign.retries.drain():
+                        results.add_failed(campaign.cancelled_failures(retry_item))
+                wait = campaign.retries.next_due_in(config['senderEmail'])
+                if wait is None:
+                    with lane_state_lock:
+                        if not returned_items:
+                            lane_state["active"] -= 1
+                            return
+                    continue
+                time.sleep(min(wait, RETRY_POLL_INTERVAL))
+                continue
+            if item is None:
+                try:
+                    item = work_queue.get(timeout=RETRY_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    input_done = True
+                    continue
+            if campaign.progress.cancelled:
+                results.add_failed(campaign.cancelled_failures(item))
+                continue
+            quarantine = campaign.health.quarantined_for(config['senderEmail'])
+            if quarantine:
+                with lane_state_lock:
+                    returned_items.append(item) # for a healthy lane, or this one once the quarantine is over
+                time.sleep(min(quarantine, RETRY_POLL_INTERVAL))
+                continue
+            retired = campaign.health.retired(config['senderEmail'])
+            if retired or not limiter.acquire(len(item)):
+                print(f"Sender {config['senderEmail']} {_lane_stop_reason(retired)}, stopping its lane.")
+                with lane_state_lock:
+                    lane_state["active"] -= 1
+                    if lane_state["active"]:
+                        returned_items.append(item)
+                        return
+                results.add_failed(campaign.no_sender_failures(item))
+                while not input_done:
+                    item = work_queue.get()
+                    if item is None:
+                        input_done = True
+                    else:
+                        results.add_failed(campaign.no_sender_failures(item))
+                while returned_items:
+                    results.add_failed(campaign.no_sender_failures(returned_items.popleft()))
+                for retry_item in campaign.retries.drain():
+                    results.add_failed(campaign.no_sender_failures(retry_item))
+                return
+            results.record(campaign.send(config, item))
+            pause = campaign.health.pacing_delay(config['senderEmail'])
+            if pause:
+                time.sleep(pause)
 
-        print(f"Attempting to send email to {receiver_email} using sender: {current_config['senderEmail']}...")
+    with ThreadPoolExecutor(max_workers=len(email_configs), thread_name_prefix="smtp-lane") as executor:
+        lanes = [executor.submit(run_lane, config) for config in email_configs]
+        try:
+            for item in work_items:
+                work_queue.put(item)
+        finally:
+            for _ in lanes:
+                work_queue.put(None)
+        for lane in lanes:
+            lane.result()
 
-        success = send_single_email(
-            sender_email=current_config['senderEmail'],
-            sender_password=current_config['senderPassword'],
-            receiver_email=receiver_email,
-            subject=personalized_subject,
-            body=personalized_message,
-            smtp_server=current_config['smtpServer'],
-            smtp_port=current_config['smtpPort'],
-            html_content=html_content,
-            bcc_mode=bcc_mode,
-            attachment_path=media_path
-        )
+async def send_emails_from_dataframe_async(
+    df: Frames,
+    subject_template: str,
+    message_template: str,
+    variables: List[str],
+    email_configs: List[Dict[str, str]],
+    html_content: bool,
+    bcc_mode: bool,
+    media_path: Optional[str] = None,
+    bcc_batch_size: int = 1,
+    progress: Optional[CampaignProgress] = None,
+    outbox: Optional[OutboxWriter] = None,
+    render_processes: int = 0,
+    keep_results: bool = True,
+    preflight: bool = True,
+    rate_limiters: Optional[RateLimiterRegistry] = None
+) -> Dict[str, List[str]]:
+    """
+    Asyncio counterpart of send_emails_from_dataframe_enhanced that can be awaited
+    from FastAPI without blocking the event loop.
 
-        if success:
-            successful_emails.append(receiver_email)
-        else:
-            failed_emails.append(receiver_email)
+    Every sender config runs maxConcurrency lanes (DEFAULT_SENDER_CONCURRENCY if
+    unset). Lanes pull work items from a bounded shared queue and run the blocking
+    SMTP work on a thread pool, reusing pooled sessions, so throughput grows with
+    the number of senders and their concurrency. A producer reads the input in
+    chunks off the event loop and only as fast as the lanes send. Rate-limit
+    waits are awaited, so they never occupy a thread. Transient failures are
+    retried, and failing senders quarantined, as in
+    send_emails_from_dataframe_enhanced.
+    """
+    results = _CampaignResults(keep_results)
+
+    loop = asyncio.get_running_loop()
+    columns, frames = await loop.run_in_executor(None, _open_frames, df)
+    email_column_actual_name, early_results = await loop.run_in_executor(
+        None, _check_campaign_inputs, columns, frames, email_configs
+    )
+    if early_results is not None:
+        if progress is not None:
+            progress.record(failed=len(early_results["failed_emails"]))
+        return early_results
+
+    lanes = [
+        config
+        for config in email_configs
+        for _ in range(max(1, int(config.get('maxConcurrency') or DEFAULT_SENDER_CONCURRENCY)))
+    ]
+    print(f"Starting async email campaign (HTML: {html_content}, BCC: {bcc_mode})...")
+    print(f"Found {len(email_configs)} sender configurations, running {len(lanes)} concurrent lanes.")
+
+    # Reading and encoding the attachment and starting the render processes would block the loop.
+    campaign = await loop.run_in_executor(None, functools.partial(
+        CampaignContext, subject_template, message_template, variables, email_configs,
+        html_content, bcc_mode, media_path, bcc_batch_size, columns=columns, progress=progress, outbox=outbox,
+        render_processes=render_processes, rate_limiters=rate_limiters
+    ))
+    if outbox is not None:
+        frames = outbox.skip_finished(frames)
+    work_items = campaign.work_items(_iter_valid_recipients(
+        frames, email_column_actual_name, campaign.variables, results, campaign.progress, outbox
+    ))
+    work_queue: asyncio.Queue = asyncio.Queue(maxsize=WORK_QUEUE_SIZE_PER_LANE * len(lanes))
+    returned_items: deque = deque() # items handed back by lanes whose sender is quarantined, retired or out of quota
+    executor = ThreadPoolExecutor(max_workers=len(lanes), thread_name_prefix="smtp-lane")
+    active_lanes = len(lanes)
+
+    async def produce():
+        while True:
+            items = await loop.run_in_executor(None, _take, work_items, WORK_QUEUE_SIZE_PER_LANE)
+            if not items:
+                break
+            for item in items:
+                await work_queue.put(item)
+        for _ in lanes:
+            await work_queue.put(None)
+
+    async def run_lane(config: Dict[str, str]):
+        nonlocal active_lanes
+        limiter = campaign.limiter(config)
+        input_done = False
+        while True:
+            item = returned_items.popleft() if returned_items else None
+            if item is None:
+                retry = campaign.retries.take(config['senderEmail'])
+                item = retry[0] if retry is not None else None
+            if item is None and input_done:
+                if campaign.progress.cancelled:
+                    for retry_item in campaign.retries.drain():
+                        results.add_failed(campaign.cancelled_failures(retry_item))
+                wait = campaign.retries.next_due_in(config['senderEmail'])
+                if wait is None:
+                    active_lanes -= 1
+                    return
+                await asyncio.sleep(min(wait, RETRY_POLL_INTERVAL))
+                continue
+            if item is None:
+                try:
+                    item = await asyncio.wait_for(work_queue.get(), RETRY_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    continue
+                if item is None:
+                    input_done = True
+                    continue
+            if campaign.progress.cancelled:
+                results.add_failed(campaign.cancelled_failures(item))
+                continue
+            quarantine = campaign.health.quarantined_for(config['senderEmail'])
+            if quarantine:
+                returned_items.append(item) # for a healthy lane, or this one once the quarantine is over
+                await asyncio.sleep(min(quarantine, RETRY_POLL_INTERVAL))
+                continue
+            retired = campaign.health.retired(config['senderEmail'])
+            wait = None if retired else limiter.reserve(len(item))
+            if wait is None:
+                print(f"Sender {config['senderEmail']} {_lane_stop_reason(retired)}, stopping its lane.")
+                active_lanes -= 1
+                if active_lanes:
+                    returned_items.append(item)
+                    return
+                results.add_failed(campaign.no_sender_failures(item))
+                while not input_done:
+                    item = await work_queue.get()
+                    if item is None:
+                        input_done = True
+                    else:
+                        results.add_failed(campaign.no_sender_failures(item))
+                while returned_items:
+                    results.add_failed(campaign.no_sender_failures(returned_items.popleft()))
+                for retry_item in campaign.retries.drain():
+                    results.add_failed(campaign.no_sender_failures(retry_item))
+                return
+            if wait > 0:
+                await asyncio.sleep(wait)
+            results.record(await loop.run_in_executor(executor, campaign.send, config, item))
+            pause = campaign.health.pacing_delay(config['senderEmail'])
+            if pause:
+                await asyncio.sleep(pause)
+
+    tasks = []
+    try:
+        if preflight:
+            await loop.run_in_executor(executor, campaign.preflight, email_configs)
+        tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(run_lane(config)) for config in lanes]
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await loop.run_in_executor(executor, campaign.close)
+        executor.shutdown(wait=False)
 
     print("Email campaign finished!")
-    print(f"Summary: {len(successful_emails)} emails sent successfully, {len(failed_emails)} failed.")
-    return {"successful_emails": successful_emails, "failed_emails": failed_emails}
\ No newline at end of file
+    print(f"Summary: {results.sent} emails sent successfully, {results.failed} failed.")
+    return results.to_dict()
+
+def _take(iterator, count: int) -> list:
+    return list(itertools.islice(iterator, count))
@@ -5,7 +5,7 @@ a = Analysis(
     ['run_server.py'],
     pathex=[],
     binaries=[],
-    datas=[('email_sender.py', '.')],
+    datas=[('email_sender.py', '.'), ('rate_limiter.py', '.'), ('template_engine.py', '.'), ('data_loader.py', '.'), ('dataset_store.py', '.'), ('campaign_jobs.py', '.'), ('campaign_progress.py', '.'), ('campaign_outbox.py', '.'), ('retry_queue.py', '.'), ('render_pool.py', '.'), ('atomic_write.py', '.'), ('config_store.py', '.'), ('sender_health.py', '.'), ('system_identity.py', '.'), ('activation.py', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
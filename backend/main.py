@@ -1,22 +1,29 @@
 import os
 import shutil
-import tempfile
 import json
-import pandas as pd
-import subprocess
-import hashlib
 import asyncio
 import sys # Import sys for sys.exit()
-import requests
 import logging
 
-from pathlib import Path # Add this, it was missing from your provided file but used later
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body # <--- ADD Body here
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Body, BackgroundTasks, Query # <--- ADD Body here
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, EmailStr # <--- ADD EmailStr here
 from contextlib import asynccontextmanager
-from typing import List, Optional # <--- ADD List and Optional here (List is explicitly used by FastAPI now)
+from typing import Iterator, List, Optional # <--- ADD List and Optional here (List is explicitly used by FastAPI now)
+from template_engine import compile_template, TemplateError
+from data_loader import save_upload, contact_list_format, ContactListError, CONTACT_LIST_FORMATS
+from dataset_store import DatasetStore
+from campaign_jobs import CampaignJobManager
+from campaign_progress import CampaignProgress
+from system_identity import SystemIdentity, SystemIdentityError
+from activation import ActivationChecker
+from config_store import SenderConfigStore, ConfigStoreError
+from rate_limiter import RateLimiterRegistry
+from campaign_outbox import (
+    CampaignOutbox, CAMPAIGN_RUNNING, CAMPAIGN_COMPLETED, CAMPAIGN_INCOMPLETE, CAMPAIGN_CANCELLED, CAMPAIGN_FAILED,
+    STATE_NAMES, RESULTS_PAGE_MAX
+)
 # --- Logging Configuration ---
 # Configure logging for better output in console and potentially files
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -27,7 +34,22 @@ logger = logging.getLogger(__name__)
 shutdown_event = asyncio.Event()
 SHUTDOWN_GRACE_PERIOD = 5 # seconds to wait for graceful shutdown before explicit exit
 
-ACTIVATION_API_URL = "https://api-keygen.obzentechnolabs.com/api/sadmin/check-activation" #"http://localhost:5000/api/sadmin/check-activation" #
+ACTIVATION_API_URL = os.environ.get("ACTIVATION_API_URL", "https://api-keygen.obzentechnolabs.com/api/sadmin/check-activation") # e.g. http://localhost:5000/api/sadmin/check-activation for a local server
+
+# pandas, requests and the send engine are imported where they are used (modules that only
+# annotate with pandas import it under TYPE_CHECKING), so the server answers /health without
+# waiting for them; they are loaded in the background shortly after.
+PREWARM_MODULES = ["pandas", "requests", "email_sender"]
+PREWARM_DELAY = 1.0 # seconds after startup before loading PREWARM_MODULES, leaving the first requests the CPU
+
+async def _prewarm_imports():
+    import importlib
+    await asyncio.sleep(PREWARM_DELAY)
+    for name in PREWARM_MODULES:
+        try:
+            await asyncio.to_thread(importlib.import_module, name)
+        except Exception as e:
+            logger.warning(f"Could not preload {name}: {e}")
 
 # --- FastAPI Lifespan Context Manager ---
 @asynccontextmanager
@@ -36,8 +58,16 @@ async def lifespan(app: FastAPI):
     FastAPI lifespan context manager for startup and shutdown events.
     """
     logger.info("FastAPI app starting up...")
+    activation_checker.start() # computes the system id too, so the UI's first check is answered from memory
+    _resume_interrupted_campaigns()
+    prewarm = asyncio.create_task(_prewarm_imports())
     yield # Application is ready to receive requests
+    prewarm.cancel()
     logger.info("FastAPI app received shutdown signal. Waiting for graceful termination...")
+    # Campaigns stop after their in-flight sends and stay 'running' in the outbox, so the next start resumes them.
+    await campaign_jobs.shutdown(SHUTDOWN_GRACE_PERIOD)
+    campaign_outbox.close() # writes buffered outcomes and sender usage; its flush thread dies with the process
+    activation_checker.close()
 
     try:
         # Wait for the shutdown event with a timeout
@@ -86,6 +116,23 @@ except OSError as e:
     sys.exit(1) 
 
 EMAIL_CONFIG_FILE = os.path.join(APP_DATA_PATH, "email_configs.json")
+DATASET_CACHE_PATH = os.path.join(APP_DATA_PATH, "datasets")
+OUTBOX_PATH = os.path.join(APP_DATA_PATH, "outbox.sqlite3")
+CAMPAIGN_MEDIA_PATH = os.path.join(APP_DATA_PATH, "campaign_media") # attachments, kept until their campaign has completed
+SYSTEM_ID_CACHE_FILE = os.path.join(APP_DATA_PATH, "system_id.json")
+ACTIVATION_CACHE_FILE = os.path.join(APP_DATA_PATH, "activation.json")
+
+dataset_store = DatasetStore(DATASET_CACHE_PATH)
+campaign_jobs = CampaignJobManager()
+campaign_outbox = CampaignOutbox(OUTBOX_PATH)
+rate_limiters = RateLimiterRegistry(campaign_outbox) # per sender account, shared by all campaigns; daily counts survive restarts
+system_identity = SystemIdentity(SYSTEM_ID_CACHE_FILE)
+activation_checker = ActivationChecker(ACTIVATION_API_URL, system_identity, ACTIVATION_CACHE_FILE)
+
+MAX_RENDER_PROCESSES = os.cpu_count() or 1
+SMTP_VERIFY_TIMEOUT = 10 # default seconds per sender for /verify-email-configs
+PROGRESS_EVENT_INTERVAL = 0.5 # seconds between coalesced progress events
+PROGRESS_KEEPALIVE_INTERVAL = 15 # seconds of silence after which the stream sends a comment line
 
 class ActivationRequest(BaseModel):
     motherboardSerial: str
@@ -97,292 +144,117 @@ class EmailConfig(BaseModel):
     senderPassword: str = Field(..., alias="senderPassword", description="Sender's email password or app password")
     smtpServer: str = Field(..., alias="smtpServer", description="SMTP server address (e.g., smtp.gmail.com)")
     smtpPort: int = Field(587, alias="smtpPort", description="SMTP server port (e.g., 587 for TLS, 465 for SSL)")
+    maxConcurrency: int = Field(1, alias="maxConcurrency", ge=1, le=20, description="Maximum messages in flight at once for this sender")
+    maxPerMinute: Optional[int] = Field(None, alias="maxPerMinute", ge=1, description="Provider limit on messages per minute for this sender")
+    maxPerDay: Optional[int] = Field(None, alias="maxPerDay", ge=1, description="Provider limit on messages per rolling 24 hours for this sender")
 
-def get_motherboard_serial():
-    try:
-        try:
-            result = subprocess.check_output(
-                ["powershell.exe", "-Command", "(Get-WmiObject Win32_BaseBoard).SerialNumber"],
-                text=True,
-                stderr=subprocess.PIPE,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            serial = result.strip()
-            if serial:
-                return serial
-            else:
-                logger.warning("Powershell returned empty motherboard serial. Falling back to wmic.")
-        except (subprocess.CalledProcessError, FileNotFoundError, Exception) as e:
-            logger.warning(f"Powershell WMI query for motherboard serial failed ({e}). Falling back to wmic.")
-
-        result = subprocess.check_output("wmic baseboard get serialnumber", shell=True, text=True)
-        serial = result.split('\n')[1].strip()
-        return serial
-    except Exception as e:
-        logger.error(f"Failed to get motherboard serial: {e}")
-        return f"Error getting motherboard serial: {e}"
-
-def get_processor_id():
-    try:
-        try:
-            result = subprocess.check_output(
-                ["powershell.exe", "-Command", "(Get-WmiObject Win32_Processor).ProcessorId"],
-                text=True,
-                stderr=subprocess.PIPE,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            processor_id = result.strip()
-            if processor_id:
-                return processor_id
-            else:
-                logger.warning("Powershell returned empty processor ID. Falling back to wmic.")
-        except (subprocess.CalledProcessError, FileNotFoundError, Exception) as e:
-            logger.warning(f"Powershell WMI query for processor ID failed ({e}). Falling back to wmic.")
-
-    except Exception as e:
-        logger.warning(f"Initial attempt for processor ID failed. Falling back to wmic. Error: {e}")
-    try:
-        result = subprocess.check_output("wmic cpu get processorId", shell=True, text=True)
-        processor_id = result.split('\n')[1].strip()
-        return processor_id
-    except Exception as e:
-        logger.error(f"Failed to get processor ID: {e}")
-        return f"Error getting processor ID: {e}"
-
-def generate_systemId(processorId: str, motherboardSerial: str) -> str:
-    input_string = f"{processorId}:{motherboardSerial}".upper()
-
-    # BLAKE2b with digest size of 32 bytes (256 bits)
-    hash_object = hashlib.blake2b(digest_size=32)
-    hash_object.update(input_string.encode('utf-8'))
-    hex_hash = hash_object.hexdigest().upper()
-
-    big_int_value = int(hex_hash, 16)
-
-    base36_chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    base36_result = ""
-    while big_int_value > 0:
-        big_int_value, remainder = divmod(big_int_value, 36)
-        base36_result = base36_chars[remainder] + base36_result
-
-    if not base36_result:
-        base36_result = "0"
-
-    base36 = base36_result.upper()
-
-    raw_key = base36.zfill(16)[:16]
-
-    formatted_key = "-".join([raw_key[i:i+4] for i in range(0, len(raw_key), 4)])
-
-    return formatted_key
+sender_configs = SenderConfigStore(EMAIL_CONFIG_FILE, EmailConfig)
 
 @app.get("/system-info")
 async def get_system_info_endpoint():
-    motherboard_serial = get_motherboard_serial()
-    processor_id = get_processor_id()
-
-    if "Error" in motherboard_serial or "Error" in processor_id:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to retrieve complete system information. Motherboard: {motherboard_serial}, Processor: {processor_id}"
-        )
+    try:
+        systemId = await system_identity.get()
+    except SystemIdentityError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    systemId = generate_systemId(processor_id, motherboard_serial)
-    
     return {"systemId" : systemId} 
 
 @app.get("/check-activation")
 async def check_activation_endpoint():
-    motherboard_serial = get_motherboard_serial()
-    processor_id = get_processor_id()
-
-    if "Error" in motherboard_serial or "Error" in processor_id:
-        return {
-            "deviceActivation": False,
-            "activationStatus": "error",
-            "message": "Failed to retrieve complete system information.",
-            "success": False,
-            "systemId": None,
-        }
-
-    systemId = generate_systemId(processor_id, motherboard_serial)
-    appName = "Email Storm"
-
-    payload = {
-        "systemId": systemId,
-        "appName": appName
-    }
-
-    try:
-        logger.info(f"Sending activation check to {ACTIVATION_API_URL} with payload: {payload}")
-        response = requests.post(ACTIVATION_API_URL, json=payload, timeout=10)
-        response.raise_for_status()
-
-        data = response.json()
-
-        activation_status = data.get("activationStatus", "").lower()
-        device_activation = data.get("deviceActivation", False)
-
-        if activation_status == "device not found":
-            message = "Please register the device on the website."
-        elif activation_status == "inactive":
-            message = "Please activate the device on the website."
-        elif activation_status == "active":
-            message = ""
-        else:
-            message = "Please register the device on the website."
-
-        return {
-            "deviceActivation": device_activation,
-            "activationStatus": activation_status,
-            "message": message,
-            "success": activation_status == "active",
-            "systemId": systemId
-        }
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect to activation server: {e}")
-        return {
-            "deviceActivation": False,
-            "activationStatus": "error",
-            "message": f"Could not connect to activation server: {e}",
-            "success": False,
-            "systemId": systemId
-        }
+    """
+    Activation status of this device. Answered from the cached status while it
+    is fresh; the activation server is asked in the background.
+    """
+    return await activation_checker.check()
 
 @app.post("/logout")
 async def logout_endpoint():
-    if os.path.exists(EMAIL_CONFIG_FILE):
-        try:
-            os.remove(EMAIL_CONFIG_FILE)
-            global email_configs_data
-            email_configs_data = []
-            return {"message": f"Successfully logged out and '{EMAIL_CONFIG_FILE}' deleted."}
-        except OSError as e:
-            raise HTTPException(status_code=500, detail=f"Error deleting file '{EMAIL_CONFIG_FILE}': {e.strerror}")
-    else:
-        return {"message": "Logged out. No email configuration file to delete."}
+    try:
+        deleted = sender_configs.clear()
+    except ConfigStoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if deleted:
+        return {"message": f"Successfully logged out and '{EMAIL_CONFIG_FILE}' deleted."}
+    return {"message": "Logged out. No email configuration file to delete."}
 
   
+UNSUPPORTED_CONTACT_LIST_DETAIL = f"Unsupported contact list format. Upload one of: {', '.join(CONTACT_LIST_FORMATS)}."
+
+def _dataset_preview_response(meta: dict) -> JSONResponse:
+    df = dataset_store.preview(meta)
+    return JSONResponse({
+        "status": "success",
+        "dataset_id": meta["dataset_id"],
+        "columns": meta["columns"],
+        "preview": df.fillna("").to_dict('records'),
+        "total_rows": meta["total_rows"]
+    })
+
+@app.post("/datasets")
 @app.post("/preview-csv")
 async def preview_csv_endpoint(
-    csv_file: UploadFile = File(..., description="CSV file to preview")
+    background_tasks: BackgroundTasks,
+    csv_file: UploadFile = File(..., description="Contact list to preview: CSV, XLSX, Parquet or JSONL")
 ):
-    if not csv_file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Uploaded file is not a CSV.")
+    """
+    Stores the contact list in the dataset cache and returns its preview together
+    with a dataset_id that /send-emails accepts instead of uploading the file again.
+    """
+    file_format = contact_list_format(csv_file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_CONTACT_LIST_DETAIL)
 
-    temp_dir = None
     try:
-        temp_dir = tempfile.mkdtemp()
-        csv_path = os.path.join(temp_dir, "preview.csv")
-
-        with open(csv_path, "wb") as f:
-            f.write(await csv_file.read())
-
-        try:
-            df = pd.read_csv(csv_path, encoding='utf-8')
-        except UnicodeDecodeError:
-            try:
-                df = pd.read_csv(csv_path, encoding='latin1')
-            except Exception as e:
-                raise HTTPException(status_code=422, detail=f"Failed to parse CSV with fallback encoding: {e}")
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Failed to parse CSV: {e}")
-
-        columns = df.columns.tolist()
-        preview_data = df.head(10).fillna("").to_dict('records')
-
-        return JSONResponse({
-            "status": "success",
-            "columns": columns,
-            "preview": preview_data,
-            "total_rows": len(df)
-        })
-
-    except HTTPException:
-        raise
+        meta = await dataset_store.ingest_upload(csv_file, file_format)
+        if not meta["cached"]:
+            # Parse the whole list into the columnar cache once the preview has been sent, ahead of the campaign.
+            background_tasks.add_task(dataset_store.materialize, meta["dataset_id"])
+        return await asyncio.to_thread(_dataset_preview_response, meta)
+    except ContactListError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Unexpected error in /preview-csv: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
-    finally:
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except OSError as e:
-                logger.error(f"Error cleaning up temp directory {temp_dir}: {e}")
+
+@app.get("/datasets/{dataset_id}/preview")
+async def preview_dataset_endpoint(dataset_id: str):
+    meta = await asyncio.to_thread(dataset_store.get, dataset_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Dataset not found. Upload the CSV again.")
+    try:
+        return await asyncio.to_thread(_dataset_preview_response, meta)
+    except ContactListError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.post("/save-email-configs")
 async def save_email_configs_endpoint(configs: list[EmailConfig]):
     """
-    Saves the provided email configurations to a local JSON file.
+    Saves the provided email configurations instead of the current ones.
     """
     try:
-        # Convert Pydantic models to dictionaries for JSON serialization
-        configs_data = [config.model_dump(by_alias=True) for config in configs]
-
-        with open(EMAIL_CONFIG_FILE, 'w') as f:
-            json.dump(configs_data, f, indent=4)
+        sender_configs.replace(configs)
         logger.info(f"Email configurations saved to {EMAIL_CONFIG_FILE}")
         return JSONResponse(status_code=200, content={"message": "Email configurations saved successfully!"})
-    except Exception as e:
-        logger.error(f"Failed to save email configurations: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to save email configurations: {e}")
+    except ConfigStoreError as e:
+        logger.error(f"Failed to save email configurations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/load-email-configs")
 async def load_email_configs_endpoint():
     """
-    Loads email configurations from a local JSON file.
+    Returns the saved email configurations, an empty list if there are none.
     """
-    if not os.path.exists(EMAIL_CONFIG_FILE):
-        logger.info("No saved email configurations found.")
-        return JSONResponse(status_code=200, content=[]) # Return empty list if file doesn't exist
-
     try:
-        with open(EMAIL_CONFIG_FILE, 'r') as f:
-            configs_data = json.load(f)
-        logger.info(f"Email configurations loaded from {EMAIL_CONFIG_FILE}")
-        # Convert dictionaries back to Pydantic models for consistency
-        # This also validates the data against the EmailConfig schema
-        loaded_configs = [EmailConfig(**config) for config in configs_data]
-        return JSONResponse(status_code=200, content=[config.dict(by_alias=True) for config in loaded_configs])
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON from {EMAIL_CONFIG_FILE}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Error reading saved email configurations: Invalid file format.")
-    except Exception as e:
-        logger.error(f"Failed to load email configurations: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to load email configurations: {e}")
+        return JSONResponse(status_code=200, content=[config.model_dump(by_alias=True) for config in sender_configs.list()])
+    except ConfigStoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 def load_email_configs_from_file() -> List[EmailConfig]:
-    """Loads email configurations from the JSON file."""
-    if not Path(EMAIL_CONFIG_FILE).exists():
-        logger.info(f"Email config file not found: {EMAIL_CONFIG_FILE}. Returning empty list.")
-        return []
-    try:
-        with open(EMAIL_CONFIG_FILE, 'r') as f:
-            data = json.load(f)
-            # Ensure loaded data is a list and contains dictionaries
-            if not isinstance(data, list):
-                logger.warning(f"File {EMAIL_CONFIG_FILE} content is not a list. Initializing with empty list.")
-                return []
-            return [EmailConfig(**config) for config in data]
-    except json.JSONDecodeError:
-        logger.warning(f"Error decoding JSON from {EMAIL_CONFIG_FILE}. Returning empty list.")
-        return []
-    except Exception as e:
-        logger.error(f"Unexpected error loading email configs from {EMAIL_CONFIG_FILE}: {e}", exc_info=True)
-        return []
-  
-def save_email_configs_to_file(configs: List[EmailConfig]):
-    """Saves email configurations to the JSON file."""
-    try:
-        # Convert Pydantic models to dictionaries for JSON serialization
-        configs_data = [config.model_dump(by_alias=True) for config in configs]
-        with open(EMAIL_CONFIG_FILE, 'w') as f:
-            json.dump(configs_data, f, indent=4)
-        logger.info(f"Email configurations saved to {EMAIL_CONFIG_FILE}")
-    except Exception as e:
-        logger.error(f"Failed to save email configurations to file: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to save email configurations to file: {e}")
+    """
+    The saved email configurations. Raises ConfigStoreError if the file cannot
+    be read.
+    """
+    return sender_configs.list()
 
 @app.post("/save-single-email-config")
 async def save_single_email_config_endpoint(new_config: EmailConfig = Body(...)):
@@ -392,77 +264,54 @@ async def save_single_email_config_endpoint(new_config: EmailConfig = Body(...))
     """
     logger.info(f"Received request to save single email config for: {new_config.senderEmail}")
     try:
-        current_configs = load_email_configs_from_file()
-        found = False
-        for i, config in enumerate(current_configs):
-            if config.senderEmail.lower() == new_config.senderEmail.lower():
-                current_configs[i] = new_config  # Update existing config
-                found = True
-                break
-        if not found:
-            current_configs.append(new_config) # Add new config if not found
-
-        save_email_configs_to_file(current_configs)
-
-        # Return all updated configs for immediate UI refresh
-        return JSONResponse(status_code=200, content={
-            "message": f"Configuration for {new_config.senderEmail} saved successfully!",
-            "all_configs": [cfg.model_dump(by_alias=True) for cfg in current_configs]
-        })
-    except Exception as e:
-        logger.error(f"Failed to save single email configuration: {e}", exc_info=True)
+        current_configs = sender_configs.upsert(new_config)
+    except ConfigStoreError as e:
+        logger.error(f"Failed to save single email configuration: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save email configuration: {e}")
 
-# class DeleteEmailRequest(BaseModel):
-#     senderEmail: EmailStr = Field(..., alias="senderEmail", description="Sender email to delete")
+    # Return all updated configs for immediate UI refresh
+    return JSONResponse(status_code=200, content={
+        "message": f"Configuration for {new_config.senderEmail} saved successfully!",
+        "all_configs": [cfg.model_dump(by_alias=True) for cfg in current_configs]
+    })
 
 @app.post("/delete-email-config")
 async def delete_email_config_endpoint(request: EmailConfig = Body(...)):
     logger.info(f"Received request to delete email config for: {request.senderEmail}")
     try:
-        current_configs = load_email_configs_from_file()
-        print(current_configs)  # Debugging line to check current configs
-        initial_count = len(current_configs)
-        
-        # Filter out the config to be deleted
-        updated_configs = [
-            config for config in current_configs
-            if config.senderEmail.lower() != request.senderEmail.lower()
-        ]
-
-        if len(updated_configs) == initial_count:
-            # No config was removed, meaning it wasn't found
-            raise HTTPException(status_code=404, detail=f"Email configuration for {request.senderEmail} not found.")
-
-        save_email_configs_to_file(updated_configs)
-        
-        # Return all remaining configs for immediate UI refresh
-        return JSONResponse(status_code=200, content={
-            "message": f"Configuration for {request.senderEmail} deleted successfully!",
-            "all_configs": [cfg.model_dump(by_alias=True) for cfg in updated_configs]
-        })
-    except HTTPException as e:
-        raise e # Re-raise FastAPI HTTPExceptions directly
-    except Exception as e:
-        logger.error(f"Failed to delete email configuration: {e}", exc_info=True)
+        updated_configs = sender_configs.delete(request.senderEmail)
+    except ConfigStoreError as e:
+        logger.error(f"Failed to delete email configuration: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete email configuration: {e}")
-
-@app.post("/send-emails")
-async def send_emails_endpoint(
-    subject: str = Form(..., description="Email subject template"),
-    message: str = Form(..., description="Email body template (HTML or plain text) with variables like {name}"),
-    csv_file: UploadFile = File(..., description="CSV with contact data"),
-    variables: str = Form(..., description="JSON list of variable names used in template"),
-    email_configs: str = Form(..., description="JSON list of sender email configurations"), # CHANGED
-    media_file: UploadFile = File(None, description="Optional media file to attach to all emails."),
-    html_content: bool = Form(False, description="True if the message is HTML, False for plain text"),
-    bcc_mode: bool = Form(False, description="True to send emails as BCC, False for TO")
+    if updated_configs is None:
+        raise HTTPException(status_code=404, detail=f"Email configuration for {request.senderEmail} not found.")
+
+    # Return all remaining configs for immediate UI refresh
+    return JSONResponse(status_code=200, content={
+        "message": f"Configuration for {request.senderEmail} deleted successfully!",
+        "all_configs": [cfg.model_dump(by_alias=True) for cfg in updated_configs]
+    })
+
+@app.post("/verify-email-configs")
+async def verify_email_configs_endpoint(
+    configs: Optional[List[EmailConfig]] = Body(None, description="Configurations to check; the saved ones if omitted"),
+    timeout: float = Query(SMTP_VERIFY_TIMEOUT, gt=0, le=60, description="Seconds allowed per sender")
 ):
-    try:
-        variable_list = json.loads(variables)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid variables format. Must be a JSON array.")
+    """
+    Connects, runs STARTTLS and logs in with every sender configuration at once
+    and reports per sender whether that worked and how long the handshake took.
+    Nothing is sent.
+    """
+    from email_sender import verify_email_configs
+    if configs is None:
+        try:
+            configs = sender_configs.list()
+        except ConfigStoreError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    results = await asyncio.to_thread(verify_email_configs, [config.model_dump(by_alias=True) for config in configs], timeout)
+    return {"results": results, "healthy": sum(1 for result in results if result["ok"])}
 
+def _parse_email_configs(email_configs: str) -> List[dict]:
     try:
         configs_data = json.loads(email_configs)
         email_configs_list = [EmailConfig(**config).model_dump(by_alias=True) for config in configs_data]
@@ -478,35 +327,67 @@ async def send_emails_endpoint(
         raise HTTPException(status_code=400, detail="Invalid email configurations format. Must be a JSON array of objects.")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error validating email configurations: {e}")
+    return email_configs_list
 
-    if not csv_file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Uploaded file is not a CSV.")
+@app.post("/send-emails")
+async def send_emails_endpoint(
+    subject: str = Form(..., description="Email subject template"),
+    message: str = Form(..., description="Email body template (HTML or plain text) with variables like {name}"),
+    csv_file: UploadFile = File(None, description="Contact list (CSV, XLSX, Parquet or JSONL), if no dataset_id is given"),
+    dataset_id: Optional[str] = Form(None, description="Id of a contact list already uploaded through /datasets or /preview-csv"),
+    variables: str = Form(..., description="JSON list of variable names used in template"),
+    email_configs: str = Form(..., description="JSON list of sender email configurations"), # CHANGED
+    media_file: UploadFile = File(None, description="Optional media file to attach to all emails."),
+    html_content: bool = Form(False, description="True if the message is HTML, False for plain text"),
+    bcc_mode: bool = Form(False, description="True to send emails as BCC, False for TO"),
+    dispatch_mode: str = Form("async", description="Send engine: 'async', 'threaded' or 'serial'"),
+    bcc_batch_size: int = Form(50, ge=1, le=500, description="Recipients per message when a BCC campaign has no template variables"),
+    render_processes: int = Form(0, ge=0, le=MAX_RENDER_PROCESSES, description="Worker processes that render messages in parallel; 0 renders in the send engine")
+):
+    if dispatch_mode not in ("async", "threaded", "serial"):
+        raise HTTPException(status_code=400, detail="Invalid dispatch mode. Must be 'async', 'threaded' or 'serial'.")
 
-    temp_dir = None
     try:
-        temp_dir = tempfile.mkdtemp()
-        csv_path = os.path.join(temp_dir, "contacts.csv")
-        with open(csv_path, "wb") as f:
-            f.write(await csv_file.read())
+        variable_list = json.loads(variables)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid variables format. Must be a JSON array.")
 
-        try:
-            df = pd.read_csv(csv_path, encoding='utf-8')
-        except UnicodeDecodeError:
+    email_configs_list = _parse_email_configs(email_configs)
+
+    if dataset_id:
+        dataset = await asyncio.to_thread(dataset_store.get, dataset_id)
+        if dataset is None:
+            raise HTTPException(status_code=404, detail="Dataset not found. Upload the CSV again.")
+    elif csv_file is None:
+        raise HTTPException(status_code=400, detail="Either a CSV file or a dataset_id is required.")
+    elif contact_list_format(csv_file.filename) is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_CONTACT_LIST_DETAIL)
+
+    media_dir = None
+    try:
+        if not dataset_id:
             try:
-                df = pd.read_csv(csv_path, encoding='latin1')
-            except Exception as e:
-                raise HTTPException(status_code=422, detail=f"Failed to parse CSV with fallback encoding: {e}")
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Failed to parse CSV: {e}")
+                dataset = await dataset_store.ingest_upload(csv_file, contact_list_format(csv_file.filename))
+            except ContactListError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        columns = dataset["columns"]
 
-        missing_vars = [var for var in variable_list if var not in df.columns]
+        missing_vars = [var for var in variable_list if var not in columns]
         if missing_vars:
             raise HTTPException(
                 status_code=422,
                 detail=f"Variables not found in CSV: {', '.join(missing_vars)}"
             )
+
+        try:
+            compiled_templates = [compile_template(template, variable_list, columns) for template in (subject, message)]
+        except TemplateError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        unknown_placeholders = sorted({name for template in compiled_templates for name in template.unknown_placeholders})
+        if unknown_placeholders:
+            logger.warning(f"Template placeholders not in the selected variables will be sent as-is: {unknown_placeholders}")
         
-        cleaned_columns = [col.strip().lower() for col in df.columns]
+        cleaned_columns = [col.strip().lower() for col in columns]
         print(cleaned_columns)
 
         if 'email' not in cleaned_columns:
@@ -515,29 +396,47 @@ async def send_emails_endpoint(
                 detail="CSV must contain an 'email' column for sending emails."
             )
 
-        media_path = None
+        # Read only the address column and the variables the templates actually use.
+        email_column = next(col for col in columns if col.strip().lower() == 'email')
+        used_variables = {name for template in compiled_templates for name in template.used_variables}
+        projected_columns = [col for col in columns if col == email_column or col in used_variables]
+
+        # Everything needed to run the campaign again after a restart, except the sender passwords,
+        # which stay in the email config file.
+        settings = {
+            "subject": subject,
+            "message": message,
+            "variables": variable_list,
+            "html_content": html_content,
+            "bcc_mode": bcc_mode,
+            "dispatch_mode": dispatch_mode,
+            "bcc_batch_size": bcc_batch_size,
+            "render_processes": render_processes,
+            "columns": projected_columns,
+            "media_path": None,
+            "senders": [config["senderEmail"] for config in email_configs_list],
+            "unknown_placeholders": unknown_placeholders,
+        }
+        campaign_id = campaign_outbox.create_campaign(dataset["dataset_id"], dataset["total_rows"], settings)
         if media_file:
-            media_path = os.path.join(temp_dir, media_file.filename)
-            with open(media_path, "wb") as f:
-                f.write(await media_file.read())
-
-        from email_sender import send_emails_from_dataframe_enhanced
-        send_results = send_emails_from_dataframe_enhanced(
-            df=df,
-            subject_template=subject,
-            message_template=message,
-            variables=variable_list,
-            email_configs=email_configs_list,
-            media_path=media_path,
-            html_content=html_content,
-            bcc_mode=bcc_mode
-        )
-        logger.info(f"Email campaign completed: {len(send_results['successful_emails'])} successful, {len(send_results['failed_emails'])} failed.")
-        return JSONResponse({
-            "status": "success",
-            "detail": f"Email campaign initiated. {len(send_results['successful_emails'])} emails successfully sent, {len(send_results['failed_emails'])} failed.",
-            "successful_emails": send_results['successful_emails'],
-            "failed_emails": send_results['failed_emails']
+            media_dir = os.path.join(CAMPAIGN_MEDIA_PATH, campaign_id)
+            os.makedirs(media_dir, exist_ok=True)
+            settings["media_path"] = os.path.join(media_dir, os.path.basename(media_file.filename))
+            await save_upload(media_file, settings["media_path"])
+            campaign_outbox.set_settings(campaign_id, settings)
+
+        try:
+            job = _submit_campaign(campaign_outbox.get_campaign(campaign_id), email_configs_list)
+        except LookupError: # evicted since it was looked up above
+            campaign_outbox.set_status(campaign_id, CAMPAIGN_FAILED)
+            raise HTTPException(status_code=404, detail="Dataset not found. Upload the CSV again.")
+        media_dir = None # the campaign removes it once it has completed
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "job_id": job.job_id,
+            "campaign_id": campaign_id,
+            "detail": "Email campaign queued.",
+            "unknown_placeholders": unknown_placeholders
         })
 
     except HTTPException:
@@ -546,11 +445,303 @@ async def send_emails_endpoint(
         logger.error(f"Unexpected error in /send-emails: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Unexpected server error: {e}")
     finally:
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except OSError as e:
-                logger.error(f"Error cleaning up temp directory {temp_dir}: {e}")
+        _remove_temp_dir(media_dir)
+
+def _submit_campaign(campaign: dict, email_configs_list: List[dict], progress: Optional[CampaignProgress] = None):
+    """
+    Queues a campaign recorded in the outbox as a background job. Rows the
+    campaign already finished in earlier runs are skipped. Its contact list is
+    pinned in the dataset cache until the job has finished; raises LookupError
+    if the list is no longer cached.
+    """
+    from email_sender import send_emails_from_dataframe_async, send_emails_from_dataframe_enhanced
+    if dataset_store.pin(campaign["dataset_id"]) is None:
+        raise LookupError("its contact list is no longer in the dataset cache")
+    campaign_id = campaign["campaign_id"]
+    settings = campaign["settings"]
+    dispatch_mode = settings["dispatch_mode"]
+    campaign_kwargs = dict(
+        df=dataset_store.iter_chunks(campaign["dataset_id"], columns=settings["columns"]),
+        subject_template=settings["subject"],
+        message_template=settings["message"],
+        variables=settings["variables"],
+        email_configs=email_configs_list,
+        media_path=settings["media_path"],
+        html_content=settings["html_content"],
+        bcc_mode=settings["bcc_mode"],
+        bcc_batch_size=settings["bcc_batch_size"],
+        render_processes=settings.get("render_processes", 0),
+        rate_limiters=rate_limiters,
+        keep_results=False # per-recipient outcomes are in the outbox, see /campaigns/{id}/results
+    )
+
+    async def run_campaign(progress):
+        outbox = campaign_outbox.writer(campaign_id)
+        status = CAMPAIGN_RUNNING # unless the run gets to decide otherwise, it is resumed on the next start
+        try:
+            if dispatch_mode == "async":
+                await send_emails_from_dataframe_async(progress=progress, outbox=outbox, **campaign_kwargs)
+            else:
+                await asyncio.to_thread(
+                    send_emails_from_dataframe_enhanced, dispatch_mode=dispatch_mode, progress=progress, outbox=outbox, **campaign_kwargs
+                )
+            if progress.cancelled:
+                status = CAMPAIGN_RUNNING if campaign_jobs.shutting_down else CAMPAIGN_CANCELLED
+            else:
+                counts = await asyncio.to_thread(campaign_outbox.state_counts, campaign_id)
+                status = CAMPAIGN_INCOMPLETE if counts["pending"] or counts["retrying"] else CAMPAIGN_COMPLETED
+        except Exception:
+            status = CAMPAIGN_FAILED
+            raise
+        finally:
+            outbox.flush()
+            campaign_outbox.set_status(campaign_id, status)
+            if status == CAMPAIGN_COMPLETED and settings["media_path"]:
+                _remove_temp_dir(os.path.dirname(settings["media_path"]))
+        logger.info(f"Email campaign {campaign_id} {status}: {progress.sent} successful, {progress.failed} failed.")
+        return {
+            "detail": f"Email campaign finished. {progress.sent} emails successfully sent, {progress.failed} failed.",
+            "campaign_id": campaign_id,
+            "status": status,
+            "sent": progress.sent,
+            "failed": progress.failed,
+        }
+
+    def finish_job(job):
+        dataset_store.unpin(campaign["dataset_id"])
+        if job.started_at is None and not campaign_jobs.shutting_down:
+            # Cancelled while queued, so run_campaign never set a status; 'running' would resume it on the next start.
+            campaign_outbox.set_status(campaign_id, CAMPAIGN_CANCELLED)
+
+    return campaign_jobs.submit(
+        run_campaign,
+        progress or CampaignProgress(total_rows=campaign["total_rows"]),
+        cleanup=finish_job,
+        campaign_id=campaign_id,
+        dataset_id=campaign["dataset_id"],
+        subject=settings["subject"],
+        dispatch_mode=dispatch_mode,
+        unknown_placeholders=settings["unknown_placeholders"]
+    )
+
+def _campaign_sender_configs(campaign: dict, email_configs_list: Optional[List[dict]] = None) -> List[dict]:
+    """
+    The configurations of the campaign's senders, from email_configs_list if
+    given and from the saved email configurations otherwise, matched by sender
+    address. Senders without a configuration are left out. Raises LookupError
+    if the saved configurations cannot be read.
+    """
+    if email_configs_list is None:
+        try:
+            email_configs_list = [config.model_dump(by_alias=True) for config in load_email_configs_from_file()]
+        except ConfigStoreError as e:
+            raise LookupError(str(e))
+    by_sender = {config["senderEmail"].lower(): config for config in email_configs_list}
+    return [by_sender[sender.lower()] for sender in campaign["settings"]["senders"] if sender.lower() in by_sender]
+
+def _resume_campaign(campaign: dict, email_configs_list: Optional[List[dict]] = None):
+    """
+    Queues a campaign again, starting from the counts it reached before. Raises
+    LookupError if its contact list is no longer cached or none of its senders
+    is configured.
+    """
+    sender_configs = _campaign_sender_configs(campaign, email_configs_list)
+    if not sender_configs:
+        raise LookupError("none of its sender email configurations is available")
+    counts = campaign_outbox.state_counts(campaign["campaign_id"])
+    progress = CampaignProgress(total_rows=campaign["total_rows"], sent=counts["sent"], failed=counts["failed"])
+    job = _submit_campaign(campaign, sender_configs, progress)
+    campaign_outbox.set_status(campaign["campaign_id"], CAMPAIGN_RUNNING)
+    return job
+
+def _resume_interrupted_campaigns():
+    """
+    Resumes the campaigns that were still running when the app last stopped.
+    """
+    for campaign in campaign_outbox.list_campaigns(status=CAMPAIGN_RUNNING):
+        try:
+            job = _resume_campaign(campaign)
+            logger.info(f"Resuming interrupted campaign {campaign['campaign_id']} as job {job.job_id}.")
+        except LookupError as e:
+            logger.warning(f"Cannot resume interrupted campaign {campaign['campaign_id']}: {e}. Marking it incomplete.")
+            campaign_outbox.set_status(campaign["campaign_id"], CAMPAIGN_INCOMPLETE)
+
+def _remove_temp_dir(temp_dir: Optional[str]):
+    if temp_dir and os.path.exists(temp_dir):
+        try:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        except OSError as e:
+            logger.error(f"Error cleaning up temp directory {temp_dir}: {e}")
+
+def _get_campaign_or_404(campaign_id: str) -> dict:
+    campaign = campaign_outbox.get_campaign(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail=f"Campaign {campaign_id} not found.")
+    return campaign
+
+def _campaign_response(campaign: dict) -> dict:
+    settings = campaign.pop("settings")
+    return dict(
+        campaign,
+        subject=settings["subject"],
+        dispatch_mode=settings["dispatch_mode"],
+        senders=settings["senders"],
+        recipients=campaign_outbox.state_counts(campaign["campaign_id"])
+    )
+
+@app.get("/campaigns")
+async def list_campaigns_endpoint():
+    """
+    Campaigns recorded in the outbox, newest first, with their recipient counts by state.
+    """
+    campaigns = await asyncio.to_thread(campaign_outbox.list_campaigns)
+    return {"campaigns": [await asyncio.to_thread(_campaign_response, campaign) for campaign in campaigns]}
+
+@app.get("/campaigns/{campaign_id}")
+async def get_campaign_endpoint(campaign_id: str):
+    return await asyncio.to_thread(_campaign_response, _get_campaign_or_404(campaign_id))
+
+@app.get("/campaigns/{campaign_id}/results")
+async def campaign_results_endpoint(
+    campaign_id: str,
+    state: Optional[str] = Query(None, description="pending, sent, failed or retrying"),
+    sender: Optional[str] = None,
+    error_class: Optional[str] = None,
+    after: int = Query(-1, description="row_index of the last result of the previous page"),
+    limit: int = Query(100, ge=1, le=RESULTS_PAGE_MAX)
+):
+    """
+    Per-recipient results of a campaign in row order, one page at a time:
+    state, SMTP status code, sender used, send latency and error class. Pass
+    next_after as after to get the next page; it is null on the last one.
+    """
+    _get_campaign_or_404(campaign_id)
+    state_codes = {name: code for code, name in STATE_NAMES.items()}
+    if state is not None and state not in state_codes:
+        raise HTTPException(status_code=422, detail=f"Unknown state '{state}'. Expected one of: {', '.join(state_codes)}.")
+    filters = dict(state=state_codes.get(state), sender=sender, error_class=error_class)
+    results = await asyncio.to_thread(campaign_outbox.results, campaign_id, after=after, limit=limit, **filters)
+    total = await asyncio.to_thread(campaign_outbox.count_results, campaign_id, **filters)
+    return {
+        "total": total,
+        "results": results,
+        "next_after": results[-1]["row_index"] if len(results) == limit else None
+    }
+
+FAILURE_COLUMNS = ["smtp_code", "error_class", "error"]
+
+def _failure_csv_rows(campaign: dict) -> Iterator[str]:
+    """
+    The campaign's failed recipients as CSV, with every column of the contact
+    list followed by FAILURE_COLUMNS, ready to be uploaded again. Falls back to
+    the addresses kept in the outbox if the contact list left the dataset cache.
+    """
+    import pandas as pd
+    failures = campaign_outbox.failures(campaign["campaign_id"])
+    if dataset_store.get(campaign["dataset_id"]) is None:
+        rows = pd.DataFrame([failures[index] for index in sorted(failures)], columns=["email", *FAILURE_COLUMNS])
+        yield rows.astype({"smtp_code": "Int64"}).to_csv(index=False)
+        return
+    header = True
+    for chunk in dataset_store.iter_chunks(campaign["dataset_id"]):
+        failed = chunk[chunk.index.isin(failures.keys())]
+        if failed.empty and not header:
+            continue
+        details = pd.DataFrame([failures[index][1:] for index in failed.index], index=failed.index, columns=FAILURE_COLUMNS)
+        yield pd.concat([failed, details.astype({"smtp_code": "Int64"})], axis=1).to_csv(index=False, header=header)
+        header = False
+
+@app.get("/campaigns/{campaign_id}/failures.csv")
+async def campaign_failures_endpoint(campaign_id: str):
+    """
+    Streams the campaign's failed recipients as a CSV for re-sending.
+    """
+    campaign = _get_campaign_or_404(campaign_id)
+    return StreamingResponse(
+        _failure_csv_rows(campaign), # a plain generator, so Starlette reads it in its threadpool
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="campaign-{campaign_id}-failures.csv"'}
+    )
+
+@app.post("/campaigns/{campaign_id}/resume")
+async def resume_campaign_endpoint(
+    campaign_id: str,
+    email_configs: Optional[str] = Form(None, description="JSON list of sender email configurations; the saved ones are used if omitted")
+):
+    """
+    Sends a stopped campaign to the recipients it has not reached yet.
+    """
+    campaign = _get_campaign_or_404(campaign_id)
+    if campaign["status"] == CAMPAIGN_COMPLETED:
+        raise HTTPException(status_code=409, detail="Campaign already completed.")
+    if any(job.info.get("campaign_id") == campaign_id and not job.finished for job in campaign_jobs.list()):
+        raise HTTPException(status_code=409, detail="Campaign is already running.")
+    if campaign["settings"]["media_path"] and not os.path.exists(campaign["settings"]["media_path"]):
+        raise HTTPException(status_code=409, detail="The campaign's attachment is no longer available.")
+
+    email_configs_list = _parse_email_configs(email_configs) if email_configs else None
+    try:
+        job = _resume_campaign(campaign, email_configs_list)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=f"Cannot resume the campaign: {e}.")
+    return JSONResponse(status_code=202, content={
+        "status": "queued",
+        "job_id": job.job_id,
+        "campaign_id": campaign_id,
+        "detail": "Email campaign resumed."
+    })
+
+def _get_job_or_404(job_id: str):
+    job = campaign_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Campaign job {job_id} not found.")
+    return job
+
+@app.get("/jobs")
+async def list_jobs_endpoint():
+    return {"jobs": [job.to_dict() for job in campaign_jobs.list()]}
+
+@app.get("/jobs/{job_id}")
+async def get_job_endpoint(job_id: str):
+    """
+    Status and progress of a campaign job; includes the result once it has finished.
+    """
+    return _get_job_or_404(job_id).to_dict(include_result=True)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
+    """
+    Server-Sent Events stream of a campaign job's progress. Updates are coalesced:
+    at most one 'progress' event per PROGRESS_EVENT_INTERVAL, and only when
+    something changed. A final 'done' event carries the finished job's status and
+    counts; the full result is available from /jobs/{id}.
+    """
+    job = _get_job_or_404(job_id)
+
+    async def events():
+        last_state = None
+        last_event_at = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            finished = job.finished
+            state = (job.status, job.progress.version)
+            if finished or state != last_state:
+                last_state = state
+                last_event_at = loop.time()
+                yield f"event: {'done' if finished else 'progress'}\ndata: {json.dumps(job.to_dict())}\n\n"
+                if finished:
+                    return
+            elif loop.time() - last_event_at >= PROGRESS_KEEPALIVE_INTERVAL:
+                last_event_at = loop.time()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(PROGRESS_EVENT_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job_endpoint(job_id: str):
+    _get_job_or_404(job_id)
+    return campaign_jobs.cancel(job_id).to_dict()
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,219 @@
+import time
+import threading
+import logging
+import functools
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Transient SMTP replies providers use to say "slow down" (Gmail/Outlook send 421 4.7.0, 451 4.3.0, 452 4.5.3).
+THROTTLING_REPLY_CODES = {421, 451, 452}
+
+DAY_MINUTES = 24 * 60 # daily quotas are counted in per-minute buckets of wall-clock time
+MIN_RATE_PER_MINUTE = 1.0 # AIMD never backs a sender off below this
+BACKOFF_FACTOR = 0.5 # multiplicative decrease on a throttling reply
+RECOVERY_PER_SUCCESS = 0.05 # additive increase per accepted message, as a fraction of the configured rate
+
+def is_throttling_reply(smtp_code: Optional[int]) -> bool:
+    return smtp_code in THROTTLING_REPLY_CODES
+
+class SenderRateLimiter:
+    """
+    Token bucket for one sender account with AIMD (additive increase,
+    multiplicative decrease) adjustment of the refill rate.
+
+    maxPerMinute sets the bucket size and the ceiling of the refill rate,
+    maxPerDay caps accepted reservations over a rolling 24 hour window. A sender
+    without maxPerMinute is unlimited until its first throttling reply, after
+    which it is limited to half of the rate it had been sending at.
+
+    Reservations of the last 24 hours are counted per minute of wall-clock
+    time, so counts kept elsewhere can be loaded with seed_daily_usage(), and
+    on_reserve(count) is called for every accepted reservation, with a negative
+    count for refund().
+    Thread-safe; shared by every lane that sends through the same account.
+    """
+    def __init__(
+        self,
+        max_per_minute: Optional[int] = None,
+        max_per_day: Optional[int] = None,
+        on_reserve: Optional[Callable[[int], None]] = None
+    ):
+        self.max_per_minute = max_per_minute
+        self.max_per_day = max_per_day
+        self.rate_per_minute: Optional[float] = float(max_per_minute) if max_per_minute else None
+        self._capacity = float(max_per_minute) if max_per_minute else 1.0
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._recent_sends: deque = deque() # monotonic timestamps of the last minute, to size the first backoff
+        self._day_buckets: deque = deque() # [minute, reservations] of the last 24 hours, minute = wall-clock time // 60
+        self._day_total = 0
+        self._on_reserve = on_reserve
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict, on_reserve: Optional[Callable[[int], None]] = None) -> "SenderRateLimiter":
+        return cls(config.get('maxPerMinute'), config.get('maxPerDay'), on_reserve)
+
+    def configure(self, max_per_minute: Optional[int], max_per_day: Optional[int]):
+        """
+        Applies the account's current limits, e.g. after its configuration was
+        edited. Unchanged limits keep the current rate and backoff.
+        """
+        with self._lock:
+            self.max_per_day = max_per_day
+            if max_per_minute == self.max_per_minute:
+                return
+            self.max_per_minute = max_per_minute
+            self.rate_per_minute = float(max_per_minute) if max_per_minute else None
+            self._capacity = float(max_per_minute) if max_per_minute else 1.0
+            self._tokens = min(self._tokens, self._capacity)
+
+    def seed_daily_usage(self, usage: Iterable[Tuple[int, int]]):
+        """
+        Adds (minute, reservations) counts made before, e.g. by an earlier run of
+        the app, to the daily count.
+        """
+        with self._lock:
+            buckets = {minute: sends for minute, sends in self._day_buckets}
+            for minute, sends in usage:
+                buckets[minute] = buckets.get(minute, 0) + sends
+            self._day_buckets = deque([minute, sends] for minute, sends in sorted(buckets.items()))
+            self._day_total = sum(buckets.values())
+            self._trim_day(int(time.time() // 60))
+
+    def _refill(self, now: float):
+        if self.rate_per_minute is not None:
+            elapsed = now - self._last_refill
+            self._tokens = min(self._capacity, self._tokens + elapsed * self.rate_per_minute / 60.0)
+        self._last_refill = now
+
+    def _trim(self, now: float):
+        while self._recent_sends and now - self._recent_sends[0] > 60:
+            self._recent_sends.popleft()
+
+    def _trim_day(self, minute: int):
+        while self._day_buckets and self._day_buckets[0][0] <= minute - DAY_MINUTES:
+            self._day_total -= self._day_buckets.popleft()[1]
+
+    def reserve(self, count: int = 1) -> Optional[float]:
+        """
+        Reserves count messages and returns how many seconds the caller must wait
+        before sending them, or None if the daily quota does not allow them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            minute = int(time.time() // 60)
+            self._trim(now)
+            self._trim_day(minute)
+            if self.max_per_day is not None and self._day_total + count > self.max_per_day:
+                return None
+
+            wait = 0.0
+            if self.rate_per_minute is not None:
+                self._refill(now)
+                self._tokens -= count
+                if self._tokens < 0:
+                    wait = -self._tokens * 60.0 / self.rate_per_minute
+
+            self._recent_sends.extend([now + wait] * count)
+            if self._day_buckets and self._day_buckets[-1][0] == minute:
+                self._day_buckets[-1][1] += count
+            else:
+                self._day_buckets.append([minute, count])
+            self._day_total += count
+        if self._on_reserve is not None:
+            self._on_reserve(count)
+        return wait
+
+    def refund(self, count: int = 1):
+        """
+        Gives count reserved messages back to the daily quota because they never
+        reached the provider, e.g. the login or the connection failed. The
+        per-minute rate is not refunded; such a sender is quarantined anyway.
+        """
+        with self._lock:
+            remaining = count
+            for bucket in reversed(self._day_buckets): # the newest reservations
+                taken = min(bucket[1], remaining)
+                bucket[1] -= taken
+                remaining -= taken
+                if not remaining:
+                    break
+            refunded = count - remaining
+            self._day_total -= refunded
+        if refunded and self._on_reserve is not None:
+            self._on_reserve(-refunded)
+
+    def acquire(self, count: int = 1) -> bool:
+        """
+        Blocking variant of reserve(). Returns False if the daily quota is exhausted.
+        """
+        wait = self.reserve(count)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def on_success(self):
+        with self._lock:
+            if self.rate_per_minute is None:
+                return
+            step = RECOVERY_PER_SUCCESS * (self.max_per_minute or self.rate_per_minute)
+            ceiling = self.max_per_minute if self.max_per_minute else float("inf")
+            self.rate_per_minute = min(ceiling, self.rate_per_minute + step)
+            self._capacity = max(1.0, self.rate_per_minute)
+
+    def on_throttled(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            current = self.rate_per_minute
+            if current is None:
+                current = float(max(len(self._recent_sends), 2))
+            self._refill(now)
+            self.rate_per_minute = max(MIN_RATE_PER_MINUTE, current * BACKOFF_FACTOR)
+            self._capacity = max(1.0, self.rate_per_minute)
+            self._tokens = min(self._tokens, 0.0)
+            logger.warning(f"Sender throttled by provider, backing off to {self.rate_per_minute:.1f} messages/minute.")
+
+def sender_key(config: Dict) -> str:
+    """
+    The account a configuration sends through: SMTP host and lowercase senderEmail.
+    """
+    return f"{config['smtpServer'].strip().lower()}/{config['senderEmail'].strip().lower()}"
+
+class RateLimiterRegistry:
+    """
+    The SenderRateLimiter of every sender account in the process, keyed by
+    sender_key, so campaigns running at the same time or one after another share
+    one per-minute rate, throttling backoff and daily quota per account.
+
+    With a usage_store (the CampaignOutbox), every reservation is recorded there
+    and the counts of the last 24 hours are read back when the registry is
+    created, so maxPerDay also holds across restarts. Thread-safe.
+    """
+    def __init__(self, usage_store=None):
+        self.usage_store = usage_store
+        self._limiters: Dict[str, SenderRateLimiter] = {}
+        self._lock = threading.Lock()
+        self._earlier_usage = usage_store.sender_usage(int(time.time() // 60) - DAY_MINUTES) if usage_store is not None else {}
+
+    def get(self, config: Dict) -> SenderRateLimiter:
+        """
+        The limiter of config's account, created on first use and updated to the
+        limits config sets.
+        """
+        key = sender_key(config)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                on_reserve = functools.partial(self.usage_store.record_sender_usage, key) if self.usage_store is not None else None
+                limiter = SenderRateLimiter.from_config(config, on_reserve)
+                limiter.seed_daily_usage(self._earlier_usage.pop(key, ()))
+                self._limiters[key] = limiter
+                return limiter
+        limiter.configure(config.get('maxPerMinute'), config.get('maxPerDay'))
+        return limiter
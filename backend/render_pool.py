@@ -0,0 +1,107 @@
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email import base64mime
+from email.policy import compat32
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from template_engine import compile_template
+
+logger = logging.getLogger(__name__)
+
+RENDER_CHUNK_SIZE = 256 # recipients per task sent to a render process
+RENDER_CHUNKS_IN_FLIGHT_PER_PROCESS = 2 # bound on submitted chunks not yet handed to the send engine
+
+_WIRE_POLICY = compat32.clone(linesep="\r\n") # what smtplib's send_message serializes with
+
+def fold_header(name: str, value: str) -> bytes:
+    return _WIRE_POLICY.fold_binary(name, value)
+
+def encode_body(body: str) -> bytes:
+    """
+    The body as it appears on the wire in a base64 utf-8 text part.
+    """
+    encoded_body = base64mime.body_encode(body.encode("utf-8")) if body else ""
+    return encoded_body.replace("\n", "\r\n").encode("ascii")
+
+class RenderedMessage(NamedTuple):
+    """
+    The personalized parts of one recipient's message, encoded for the wire.
+    Everything else, including From and To, is spliced in by
+    MessageSkeleton.assemble at send time, so the parts fit any sender.
+    """
+    subject_header: bytes
+    encoded_body: bytes
+
+_worker_templates = None
+
+def _init_worker(subject_source: str, message_source: str, variables: List[str]):
+    global _worker_templates
+    _worker_templates = (compile_template(subject_source, variables), compile_template(message_source, variables))
+
+def _render_chunk(chunk: List[Sequence[str]]) -> List[RenderedMessage]:
+    subject_template, message_template = _worker_templates
+    return [
+        RenderedMessage(fold_header("Subject", subject_template.render(values)), encode_body(message_template.render(values)))
+        for values in chunk
+    ]
+
+class RenderPool:
+    """
+    Process pool that personalizes and encodes messages on all cores, for
+    campaigns where rendering rather than SMTP is the bottleneck.
+
+    render() takes chunks of template values and yields their RenderedMessages
+    chunk by chunk, in input order. At most RENDER_CHUNKS_IN_FLIGHT_PER_PROCESS
+    chunks per process are submitted ahead of the consumer, so the input is read
+    only as fast as messages are sent. Workers are started with spawn, which is
+    what Windows uses anyway and avoids forking a process that runs threads.
+    """
+    def __init__(self, processes: int, subject_source: str, message_source: str, variables: List[str]):
+        self.processes = processes
+        self._broken = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(subject_source, message_source, list(variables))
+        )
+
+    def render(self, chunks: Iterable[Tuple[object, List[Sequence[str]]]]) -> Iterator[Tuple[object, Optional[List[RenderedMessage]]]]:
+        """
+        For every (key, values) chunk yields (key, rendered messages), or
+        (key, None) if the chunk could not be rendered, in which case the caller
+        renders it itself. Once the pool breaks, every further chunk is
+        returned unrendered.
+        """
+        pending: deque = deque()
+        max_pending = self.processes * RENDER_CHUNKS_IN_FLIGHT_PER_PROCESS
+        for key, values in chunks:
+            future = None
+            if values and not self._broken:
+                try:
+                    future = self._executor.submit(_render_chunk, values)
+                except Exception as e:
+                    logger.error(f"Render processes unavailable, rendering in the send engine instead: {e}")
+                    self._broken = True
+            pending.append((key, values, future))
+            if len(pending) >= max_pending:
+                yield self._result(*pending.popleft())
+        while pending:
+            yield self._result(*pending.popleft())
+
+    def _result(self, key, values, future) -> Tuple[object, Optional[List[RenderedMessage]]]:
+        if not values:
+            return key, []
+        if future is None:
+            return key, None
+        try:
+            return key, future.result()
+        except Exception as e:
+            logger.error(f"Render process failed, rendering the chunk in the send engine instead: {e}")
+            self._broken = True
+            return key, None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
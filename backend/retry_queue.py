@@ -0,0 +1,127 @@
+import time
+import random
+import smtplib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+RETRY_MAX_ATTEMPTS = 4 # sends per recipient, the first one included
+RETRY_BASE_DELAY = 2.0 # seconds before the first retry, doubled for every further one
+RETRY_MAX_DELAY = 120.0 # cap on the backoff before jitter
+RETRY_HANDOFF_WAIT = 5.0 # seconds a due retry waits for a different sender before the one that failed may take it
+
+def is_transient_reply(smtp_code: Optional[int]) -> bool:
+    return smtp_code is not None and 400 <= smtp_code < 500
+
+def is_transient_failure(error: Exception) -> bool:
+    """
+    Whether a send that raised error is worth trying again, possibly through
+    another sender. That covers 4xx replies, dropped or refused connections,
+    timeouts, and rejections of the sender account itself (failed login, sender
+    refused), which say nothing about the recipient. 5xx replies about the
+    recipient or the message are permanent.
+    """
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused, smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(is_transient_reply(code) for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return is_transient_reply(error.smtp_code)
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError) # socket errors and timeouts
+
+def retry_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """
+    Seconds to wait before the given attempt (2 for the first retry), with full
+    jitter so recipients that failed together do not come back together.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 2)))
+
+class RetryQueue:
+    """
+    Work items waiting to be sent again after a transient failure. Lanes take
+    due items between their regular work, so a retry never holds up the rest of
+    the campaign.
+
+    A due item goes preferably to a sender other than the one it failed on;
+    after handoff_wait, or if the campaign has a single sender, any sender may
+    take it. Attempts are counted per recipient (row index), and schedule()
+    refuses recipients that have used up max_attempts. Thread-safe.
+    """
+    def __init__(
+        self,
+        senders: int,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        handoff_wait: float = RETRY_HANDOFF_WAIT
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.handoff_wait = handoff_wait if senders > 1 else 0.0
+        self._entries: List[Tuple[float, list, str]] = [] # (due monotonic time, item, sender it failed on)
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def schedule(self, item: list, sender: str) -> bool:
+        """
+        Queues item for another attempt after a transient failure through sender.
+        Returns False, leaving the item to be reported as failed, if its
+        recipients are out of attempts.
+        """
+        with self._lock:
+            attempt = 1 + max(self._attempts.get(index, 1) for index, _, _ in item)
+            if attempt > self.max_attempts:
+                return False
+            for index, _, _ in item:
+                self._attempts[index] = attempt
+            due = time.monotonic() + retry_delay(attempt, self.base_delay, self.max_delay)
+            self._entries.append((due, item, sender))
+            return True
+
+    def take(self, sender: Optional[str] = None) -> Optional[Tuple[list, str]]:
+        """
+        Removes and returns the earliest due (item, failed sender) that sender may
+        send, or None. Without a sender, any due item is returned.
+        """
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            for position, (due, item, failed_sender) in enumerate(self._entries):
+                if due > now:
+                    continue
+                if sender is not None and failed_sender == sender and now < due + self.handoff_wait:
+                    continue
+                if best is None or due < self._entries[best][0]:
+                    best = position
+            if best is None:
+                return None
+            _, item, failed_sender = self._entries.pop(best)
+            return item, failed_sender
+
+    def next_due_in(self, sender: Optional[str] = None) -> Optional[float]:
+        """
+        Seconds until take(sender) can return an item, or None if nothing is queued.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self._entries:
+                return None
+            return max(0.0, min(
+                due + (self.handoff_wait if sender is not None and failed_sender == sender else 0.0) - now
+                for due, _, failed_sender in self._entries
+            ))
+
+    def drain(self) -> List[list]:
+        """
+        Removes and returns every queued item, due or not.
+        """
+        with self._lock:
+            items = [item for _, item, _ in self._entries]
+            self._entries.clear()
+            return items
@@ -1,8 +1,8 @@
 import uvicorn
-import main as fastapi_app # Import your FastAPI app from main.py
 import os
 import sys
 import logging
+import multiprocessing
 
 # Configure logging for uvicorn, ensuring it respects the main app's logging settings
 log_config = uvicorn.config.LOGGING_CONFIG
@@ -27,29 +27,35 @@ if not server_logger.handlers:
 # This ensures uvicorn's internal messages also use the desired format.
 logging.config.dictConfig(log_config)
 
-server_logger.info(f"Starting FastAPI server on http://{HOST}:{PORT}")
-
-try:
-    # Create a Uvicorn server configuration
-    config = uvicorn.Config(
-        app=fastapi_app.app, # Reference the app from main.py
-        host=HOST,
-        port=PORT,
-        log_level="info",
-        log_config=log_config,
-        lifespan="on" # Explicitly turn on lifespan management
-    )
-
-    # Create a Uvicorn Server instance
-    server = uvicorn.Server(config)
-
-    # Run the server. This call will block until the server is stopped.
-    # The server will stop when the `shutdown_event` in `main.py` is set,
-    # because the `lifespan` context manager will then complete.
-    server.run()
-
-    server_logger.info("Uvicorn server has gracefully stopped.")
-
-except Exception as e:
-    server_logger.critical(f"CRITICAL ERROR: Failed to start or run FastAPI server: {e}", exc_info=True)
-    sys.exit(1)
\ No newline at end of file
+if __name__ == "__main__":
+    # Render worker processes start by re-running this executable (PyInstaller) or importing this
+    # script (spawn), so the server must only start in the parent process.
+    multiprocessing.freeze_support()
+    import main as fastapi_app # Import your FastAPI app from main.py
+
+    server_logger.info(f"Starting FastAPI server on http://{HOST}:{PORT}")
+
+    try:
+        # Create a Uvicorn server configuration
+        config = uvicorn.Config(
+            app=fastapi_app.app, # Reference the app from main.py
+            host=HOST,
+            port=PORT,
+            log_level="info",
+            log_config=log_config,
+            lifespan="on" # Explicitly turn on lifespan management
+        )
+
+        # Create a Uvicorn Server instance
+        server = uvicorn.Server(config)
+
+        # Run the server. This call will block until the server is stopped.
+        # The server will stop when the `shutdown_event` in `main.py` is set,
+        # because the `lifespan` context manager will then complete.
+        server.run()
+
+        server_logger.info("Uvicorn server has gracefully stopped.")
+
+    except Exception as e:
+        server_logger.critical(f"CRITICAL ERROR: Failed to start or run FastAPI server: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,168 @@
+import time
+import socket
+import smtplib
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_SMOOTHING = 0.1 # weight of the newest send in the rolling success rate and latency, roughly the last 20 sends
+SENDER_QUARANTINE_BASE = 30.0 # seconds a sender sits out after an auth or connection failure, doubled for every repeat
+SENDER_MAX_QUARANTINES = 3 # consecutive quarantines without a successful send after which the sender is retired
+SENDER_MAX_PACING_DELAY = 5.0 # cap on the pause a lane of a less successful sender takes between sends
+MIN_SUCCESS_RATE = 0.05 # floor on the rate a sender is weighted by, so it keeps a trickle of traffic to recover
+
+SENDER_HEALTHY = "healthy"
+SENDER_QUARANTINED = "quarantined"
+SENDER_RETIRED = "retired"
+
+def is_sender_failure(error: Exception) -> bool:
+    """
+    Whether error says the sender account or its server cannot be used right
+    now, rather than anything about the recipient: a failed login, a refused
+    or unreachable connection, an unknown host.
+    """
+    return isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPConnectError, ConnectionRefusedError, socket.gaierror))
+
+class _SenderStats:
+    __slots__ = ("success_rate", "latency", "quarantined_until", "quarantines", "retired", "current_weight")
+
+    def __init__(self):
+        self.success_rate = 1.0
+        self.latency: Optional[float] = None # seconds per successful send
+        self.quarantined_until = 0.0 # monotonic
+        self.quarantines = 0
+        self.retired = False
+        self.current_weight = 0.0 # smooth weighted round-robin state
+
+class SenderHealth:
+    """
+    Rolling success rate and latency of every sender of a campaign, used to
+    route traffic away from senders that fail and toward those that deliver
+    fast.
+
+    A sender failure (see is_sender_failure) quarantines the sender for
+    SENDER_QUARANTINE_BASE seconds, doubled for every further quarantine in a
+    row; a successful send ends the streak. After SENDER_MAX_QUARANTINES in a
+    row the sender is retired for the rest of the campaign. Failures of sends
+    that were already in flight when the sender was quarantined are ignored.
+
+    rank() orders senders by smooth weighted round-robin over success rate per
+    second of latency, for the serial engine. Lanes pull work as fast as their
+    sender delivers, so they are paced by pacing_delay() instead. Keyed by
+    lowercase senderEmail. Thread-safe.
+    """
+    def __init__(self, senders: Iterable[str], on_change: Optional[Callable[[str, str], None]] = None):
+        self._stats: Dict[str, _SenderStats] = {self._key(sender): _SenderStats() for sender in senders}
+        self._on_change = on_change
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sender: str) -> str:
+        return sender.strip().lower()
+
+    def record(self, sender: str, success: bool, latency: float, sender_failure: bool = False):
+        """
+        Feeds back the outcome of one send through sender that took latency seconds.
+        """
+        now = time.monotonic()
+        state = None
+        with self._lock:
+            stats = self._stats[self._key(sender)]
+            if sender_failure:
+                if stats.retired or now < stats.quarantined_until:
+                    return
+                stats.success_rate *= 1 - HEALTH_SMOOTHING
+                stats.quarantines += 1
+                if stats.quarantines >= SENDER_MAX_QUARANTINES:
+                    stats.retired = True
+                    state = SENDER_RETIRED
+                    logger.warning(f"Sender {sender} failed {stats.quarantines} times in a row, not using it for the rest of the campaign.")
+                else:
+                    pause = SENDER_QUARANTINE_BASE * 2 ** (stats.quarantines - 1)
+                    stats.quarantined_until = now + pause
+                    state = SENDER_QUARANTINED
+                    logger.warning(f"Sender {sender} failed to authenticate or connect, quarantining it for {pause:.0f} seconds.")
+            else:
+                stats.success_rate += HEALTH_SMOOTHING * ((1.0 if success else 0.0) - stats.success_rate)
+                if success:
+                    stats.latency = latency if stats.latency is None else stats.latency + HEALTH_SMOOTHING * (latency - stats.latency)
+                    if stats.quarantines:
+                        stats.quarantines = 0
+                        state = SENDER_HEALTHY
+        if state is not None and self._on_change is not None:
+            self._on_change(sender, state)
+
+    def retire(self, sender: str, reason: str):
+        """
+        Takes sender out of the campaign, e.g. because pre-flight verification
+        showed its login does not work.
+        """
+        with self._lock:
+            stats = self._stats[self._key(sender)]
+            if stats.retired:
+                return
+            stats.retired = True
+        logger.warning(f"Not using sender {sender} for this campaign: {reason}")
+        if self._on_change is not None:
+            self._on_change(sender, SENDER_RETIRED)
+
+    def quarantined_for(self, sender: str) -> float:
+        """
+        Seconds until sender may send again, 0 if it is not quarantined.
+        """
+        with self._lock:
+            return max(0.0, self._stats[self._key(sender)].quarantined_until - time.monotonic())
+
+    def retired(self, sender: str) -> bool:
+        with self._lock:
+            return self._stats[self._key(sender)].retired
+
+    def all_retired(self) -> bool:
+        with self._lock:
+            return all(stats.retired for stats in self._stats.values())
+
+    def _weight(self, stats: _SenderStats, default_latency: float) -> float:
+        latency = stats.latency if stats.latency is not None else default_latency
+        return max(stats.success_rate, MIN_SUCCESS_RATE) / max(latency, 1e-3)
+
+    def rank(self, senders: List[str]) -> List[int]:
+        """
+        Positions in senders in the order they should be tried for the next send:
+        the sender picked by smooth weighted round-robin among those ready to
+        send, the other ready ones by preference, then the quarantined ones by
+        the time they are released. Retired senders are left out.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats_of = [self._stats[self._key(sender)] for sender in senders]
+            known = [stats.latency for stats in stats_of if stats.latency is not None]
+            default_latency = sum(known) / len(known) if known else 1.0
+            ready = [position for position, stats in enumerate(stats_of) if not stats.retired and stats.quarantined_until <= now]
+            waiting = [position for position, stats in enumerate(stats_of) if not stats.retired and stats.quarantined_until > now]
+            total_weight = 0.0
+            for stats in {self._key(senders[position]): stats_of[position] for position in ready}.values():
+                weight = self._weight(stats, default_latency)
+                stats.current_weight += weight
+                total_weight += weight
+            ready.sort(key=lambda position: stats_of[position].current_weight, reverse=True)
+            if ready:
+                stats_of[ready[0]].current_weight -= total_weight
+            waiting.sort(key=lambda position: stats_of[position].quarantined_until)
+            return ready + waiting
+
+    def pacing_delay(self, sender: str) -> float:
+        """
+        Seconds a lane of sender should pause after a send so that its share of
+        the traffic follows its success rate relative to the best sender's.
+        """
+        with self._lock:
+            stats = self._stats[self._key(sender)]
+            if stats.latency is None or stats.retired:
+                return 0.0
+            best = max(other.success_rate for other in self._stats.values() if not other.retired)
+            rate = max(stats.success_rate, MIN_SUCCESS_RATE)
+            if rate >= best:
+                return 0.0
+            return min(SENDER_MAX_PACING_DELAY, stats.latency * (best / rate - 1))
@@ -0,0 +1,164 @@
+import json
+import uuid
+import socket
+import asyncio
+import hashlib
+import logging
+import platform
+import subprocess
+from typing import Optional
+
+from atomic_write import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+class SystemIdentityError(RuntimeError):
+    """Raised when the hardware identifiers cannot be read."""
+
+def get_motherboard_serial():
+    try:
+        try:
+            result = subprocess.check_output(
+                ["powershell.exe", "-Command", "(Get-WmiObject Win32_BaseBoard).SerialNumber"],
+                text=True,
+                stderr=subprocess.PIPE,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
+            serial = result.strip()
+            if serial:
+                return serial
+            else:
+                logger.warning("Powershell returned empty motherboard serial. Falling back to wmic.")
+        except (subprocess.CalledProcessError, FileNotFoundError, Exception) as e:
+            logger.warning(f"Powershell WMI query for motherboard serial failed ({e}). Falling back to wmic.")
+
+        result = subprocess.check_output("wmic baseboard get serialnumber", shell=True, text=True)
+        serial = result.split('\n')[1].strip()
+        return serial
+    except Exception as e:
+        logger.error(f"Failed to get motherboard serial: {e}")
+        return f"Error getting motherboard serial: {e}"
+
+def get_processor_id():
+    try:
+        try:
+            result = subprocess.check_output(
+                ["powershell.exe", "-Command", "(Get-WmiObject Win32_Processor).ProcessorId"],
+                text=True,
+                stderr=subprocess.PIPE,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
+            processor_id = result.strip()
+            if processor_id:
+                return processor_id
+            else:
+                logger.warning("Powershell returned empty processor ID. Falling back to wmic.")
+        except (subprocess.CalledProcessError, FileNotFoundError, Exception) as e:
+            logger.warning(f"Powershell WMI query for processor ID failed ({e}). Falling back to wmic.")
+
+    except Exception as e:
+        logger.warning(f"Initial attempt for processor ID failed. Falling back to wmic. Error: {e}")
+    try:
+        result = subprocess.check_output("wmic cpu get processorId", shell=True, text=True)
+        processor_id = result.split('\n')[1].strip()
+        return processor_id
+    except Exception as e:
+        logger.error(f"Failed to get processor ID: {e}")
+        return f"Error getting processor ID: {e}"
+
+def generate_systemId(processorId: str, motherboardSerial: str) -> str:
+    input_string = f"{processorId}:{motherboardSerial}".upper()
+
+    # BLAKE2b with digest size of 32 bytes (256 bits)
+    hash_object = hashlib.blake2b(digest_size=32)
+    hash_object.update(input_string.encode('utf-8'))
+    hex_hash = hash_object.hexdigest().upper()
+
+    big_int_value = int(hex_hash, 16)
+
+    base36_chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    base36_result = ""
+    while big_int_value > 0:
+        big_int_value, remainder = divmod(big_int_value, 36)
+        base36_result = base36_chars[remainder] + base36_result
+
+    if not base36_result:
+        base36_result = "0"
+
+    base36 = base36_result.upper()
+
+    raw_key = base36.zfill(16)[:16]
+
+    formatted_key = "-".join([raw_key[i:i+4] for i in range(0, len(raw_key), 4)])
+
+    return formatted_key
+
+def machine_fingerprint() -> str:
+    """
+    Cheap stand-in for the hardware probes that tells whether a cached systemId
+    was computed on this machine, e.g. not on one whose app data was copied here.
+    """
+    return hashlib.sha256(f"{uuid.getnode()}:{socket.gethostname()}:{platform.machine()}".encode("utf-8")).hexdigest()
+
+class SystemIdentity:
+    """
+    The systemId of this machine, derived from the motherboard serial and the
+    processor id. The probes spawn PowerShell or WMIC and can take seconds, so
+    they run once, concurrently and off the event loop, and the result is kept
+    in memory and in cache_path. The cached value is used only on the machine
+    that wrote it. Failed probes are not cached, so the next get() tries again.
+    """
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._system_id: Optional[str] = None
+        self._loading: Optional[asyncio.Task] = None
+
+    def _read_cache(self) -> Optional[str]:
+        try:
+            with open(self.cache_path, "r") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == machine_fingerprint():
+                return cached.get("systemId") or None
+        except (OSError, ValueError, AttributeError):
+            pass
+        return None
+
+    def _write_cache(self, system_id: str):
+        try:
+            write_json_atomic(self.cache_path, {"systemId": system_id, "fingerprint": machine_fingerprint()})
+        except OSError as e:
+            logger.warning(f"Could not cache the system id in {self.cache_path}: {e}")
+
+    async def _load(self) -> str:
+        system_id = await asyncio.to_thread(self._read_cache)
+        if system_id is None:
+            motherboard_serial, processor_id = await asyncio.gather(
+                asyncio.to_thread(get_motherboard_serial), asyncio.to_thread(get_processor_id)
+            )
+            if "Error" in motherboard_serial or "Error" in processor_id:
+                raise SystemIdentityError(
+                    f"Failed to retrieve complete system information. Motherboard: {motherboard_serial}, Processor: {processor_id}"
+                )
+            system_id = generate_systemId(processor_id, motherboard_serial)
+            await asyncio.to_thread(self._write_cache, system_id)
+        self._system_id = system_id
+        return system_id
+
+    async def get(self) -> str:
+        """
+        The systemId; concurrent callers share one probe. Raises
+        SystemIdentityError if the hardware identifiers cannot be read.
+        """
+        if self._system_id is not None:
+            return self._system_id
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(self._load())
+        return await asyncio.shield(self._loading)
+
+    def start(self):
+        """
+        Starts computing the systemId in the background, e.g. at app startup.
+        """
+        if self._system_id is None and self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+            self._loading.add_done_callback(lambda task: task.cancelled() or task.exception()) # a failure is reported by get(), not logged as unretrieved
@@ -0,0 +1,88 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Anything between single braces is a candidate placeholder; only names listed in
+# the campaign variables become slots, everything else stays literal text.
+PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)\}")
+
+# Brace contents that look like a variable name rather than CSS or JSON, e.g. {first_name} or {First Name}.
+VARIABLE_NAME_PATTERN = re.compile(r"^\w[\w .-]*$")
+
+class TemplateError(ValueError):
+    """Raised when a template refers to variables the contact list does not provide."""
+
+class CompiledTemplate:
+    """
+    A subject or message template parsed once into literal chunks and variable
+    slots. render() is a single join per recipient instead of one str.replace
+    pass over the whole template per variable.
+
+    Slots refer to positions in the variables list the template was compiled
+    with, so render() takes the row's values in that same order.
+    """
+    def __init__(self, source: str, variables: List[str], literals: List[str], slots: List[int], unknown_placeholders: List[str]):
+        self.source = source
+        self.variables = list(variables)
+        self.unknown_placeholders = unknown_placeholders
+        self._head = literals[0]
+        self._tail: List[Tuple[int, str]] = list(zip(slots, literals[1:]))
+
+    @property
+    def has_slots(self) -> bool:
+        return bool(self._tail)
+
+    @property
+    def used_variables(self) -> List[str]:
+        used = {slot for slot, _ in self._tail}
+        return [variable for index, variable in enumerate(self.variables) if index in used]
+
+    def render(self, values: Sequence[str]) -> str:
+        if not self._tail:
+            return self._head
+        parts = [self._head]
+        for slot, literal in self._tail:
+            parts.append(values[slot])
+            parts.append(literal)
+        return "".join(parts)
+
+    def render_mapping(self, row: Dict[str, str]) -> str:
+        return self.render([row.get(variable, "") for variable in self.variables])
+
+def compile_template(template: str, variables: List[str], columns: Optional[Iterable[str]] = None) -> CompiledTemplate:
+    """
+    Parses template into a CompiledTemplate.
+
+    If columns is given, every variable the template actually uses must be one of
+    them, otherwise TemplateError is raised. Brace expressions that look like
+    variable names but are not in variables are kept as literal text and listed
+    in unknown_placeholders so the caller can report them before sending.
+    """
+    slot_of = {variable: index for index, variable in enumerate(variables)}
+    literals: List[str] = []
+    slots: List[int] = []
+    unknown_placeholders: List[str] = []
+
+    position = 0
+    pending = ""
+    for match in PLACEHOLDER_PATTERN.finditer(template):
+        name = match.group(1)
+        if name in slot_of:
+            literals.append(pending + template[position:match.start()])
+            slots.append(slot_of[name])
+            pending = ""
+        else:
+            pending += template[position:match.end()]
+            if VARIABLE_NAME_PATTERN.match(name) and name not in unknown_placeholders:
+                unknown_placeholders.append(name)
+        position = match.end()
+    literals.append(pending + template[position:])
+
+    compiled = CompiledTemplate(template, variables, literals, slots, unknown_placeholders)
+
+    if columns is not None:
+        available = set(columns)
+        missing = [variable for variable in compiled.used_variables if variable not in available]
+        if missing:
+            raise TemplateError(f"Variables not found in CSV: {', '.join(missing)}")
+
+    return compiled
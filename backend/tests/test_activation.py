@@ -0,0 +1,196 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from activation import ActivationChecker
+
+SYSTEM_ID = "SYS-1"
+
+class FakeIdentity:
+    async def get(self):
+        return SYSTEM_ID
+
+class StubActivationServer:
+    """
+    Answers every POST with `answer` and records the payloads. Clearing
+    `release` holds requests until it is set again.
+    """
+    def __init__(self):
+        self.answer = {"activationStatus": "active", "deviceActivation": True}
+        self.requests = []
+        self.release = threading.Event()
+        self.release.set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                stub.release.wait(5)
+                body = json.dumps(stub.answer).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/api/sadmin/check-activation"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.release.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server():
+    server = StubActivationServer()
+    yield server
+    server.close()
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "activation.json")
+
+def _checker(server, cache_path, **kwargs):
+    return ActivationChecker(server.url, FakeIdentity(), cache_path, timeout=2, **kwargs)
+
+async def _settle(checker):
+    # Waits for a background refresh started by check().
+    if checker._refreshing is not None:
+        await asyncio.gather(checker._refreshing, return_exceptions=True)
+
+def test_active_answer_is_served_from_memory_within_the_ttl(server, cache_path):
+    async def scenario():
+        checker = _checker(server, cache_path)
+        first = await checker.check()
+        second = await checker.check()
+        checker.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["success"] and second["success"]
+    assert second["checkedAt"] == first["checkedAt"]
+    assert server.requests == [{"systemId": SYSTEM_ID, "appName": "Email Storm"}]
+
+def test_stale_answer_is_served_while_the_server_is_asked_again(server, cache_path):
+    async def scenario():
+        checker = _checker(server, cache_path, ttl=0.05, grace=60)
+        await checker.check()
+        await asyncio.sleep(0.1)
+        server.release.clear()
+        server.answer = {"activationStatus": "inactive", "deviceActivation": False}
+        start = time.monotonic()
+        stale = await checker.check() # must not wait for the held request
+        waited = time.monotonic() - start
+        server.release.set()
+        await _settle(checker)
+        fresh = await checker.check()
+        checker.close()
+        return stale, waited, fresh
+
+    stale, waited, fresh = asyncio.run(scenario())
+    assert stale["activationStatus"] == "active" and waited < 1
+    assert fresh["activationStatus"] == "inactive"
+    assert len(server.requests) == 3 # the inactive answer was not cached
+
+def test_inactive_answers_are_not_cached(server, cache_path):
+    server.answer = {"activationStatus": "inactive", "deviceActivation": False}
+
+    async def scenario():
+        checker = _checker(server, cache_path)
+        results = [await checker.check(), await checker.check()]
+        checker.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [result["activationStatus"] for result in results] == ["inactive", "inactive"]
+    assert results[0]["message"] == "Please activate the device on the website."
+    assert len(server.requests) == 2
+
+def test_cache_file_is_a_hint_until_the_server_answers(server, cache_path):
+    async def scenario():
+        await _checker(server, cache_path).check() # writes the cache file
+        server.release.clear()
+        server.answer = {"activationStatus": "inactive", "deviceActivation": False}
+        checker = _checker(server, cache_path) # the next start of the app
+        start = time.monotonic()
+        hinted = await checker.check()
+        waited = time.monotonic() - start
+        server.release.set()
+        await _settle(checker)
+        answered = await checker.check()
+        checker.close()
+        return hinted, waited, answered
+
+    hinted, waited, answered = asyncio.run(scenario())
+    assert hinted["activationStatus"] == "active" and waited < 1
+    assert answered["activationStatus"] == "inactive"
+
+def test_hint_is_dropped_when_the_server_cannot_be_reached(server, cache_path):
+    with open(cache_path, "w") as f: # e.g. written by hand, nothing vouches for it
+        json.dump({"systemId": SYSTEM_ID, "activationStatus": "active", "deviceActivation": True, "checkedAt": time.time()}, f)
+    server.close()
+
+    async def scenario():
+        checker = _checker(server, cache_path)
+        hinted = await checker.check()
+        await _settle(checker)
+        offline = await checker.check()
+        checker.close()
+        return hinted, offline
+
+    hinted, offline = asyncio.run(scenario())
+    assert hinted["success"]
+    assert offline["activationStatus"] == "error" and not offline["success"]
+
+def test_cache_file_of_another_system_is_ignored(server, cache_path):
+    with open(cache_path, "w") as f:
+        json.dump({"systemId": "SYS-2", "activationStatus": "active", "deviceActivation": True, "checkedAt": time.time()}, f)
+    server.answer = {"activationStatus": "inactive", "deviceActivation": False}
+
+    async def scenario():
+        checker = _checker(server, cache_path)
+        result = await checker.check()
+        checker.close()
+        return result
+
+    assert asyncio.run(scenario())["activationStatus"] == "inactive"
+    assert len(server.requests) == 1
+
+def test_server_answer_stays_valid_offline_for_the_grace_period(server, cache_path):
+    async def scenario():
+        checker = _checker(server, cache_path, ttl=0.05, grace=60)
+        await checker.check()
+        server.close()
+        await asyncio.sleep(0.1)
+        offline = await checker.check() # refreshes in the background and fails
+        await _settle(checker)
+        still_offline = await checker.check()
+        checker.close()
+        return offline, still_offline
+
+    offline, still_offline = asyncio.run(scenario())
+    assert offline["success"] and still_offline["success"]
+
+def test_concurrent_checks_share_one_request(server, cache_path):
+    async def scenario():
+        checker = _checker(server, cache_path)
+        server.release.clear()
+        checks = asyncio.gather(*[checker.check() for _ in range(5)])
+        await asyncio.sleep(0.2)
+        server.release.set()
+        results = await checks
+        checker.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(result["success"] for result in results)
+    assert len(server.requests) == 1
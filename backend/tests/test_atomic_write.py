@@ -0,0 +1,31 @@
+import json
+import os
+
+import pytest
+
+import atomic_write
+from atomic_write import write_json_atomic
+
+def test_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    write_json_atomic(path, {"a": 1})
+    write_json_atomic(path, {"a": 2}, indent=4)
+    with open(path) as f:
+        assert json.load(f) == {"a": 2}
+    assert os.listdir(tmp_path) == ["data.json"]
+
+def test_failed_write_keeps_the_old_file_and_removes_the_temp_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.json")
+    write_json_atomic(path, {"a": 1})
+
+    def fail(src, dst):
+        raise PermissionError("read-only")
+    monkeypatch.setattr(atomic_write.os, "replace", fail)
+    with pytest.raises(OSError):
+        write_json_atomic(path, {"a": 2})
+    with pytest.raises(TypeError): # not serializable, fails halfway through the dump
+        write_json_atomic(path, {"a": object()})
+
+    with open(path) as f:
+        assert json.load(f) == {"a": 1}
+    assert os.listdir(tmp_path) == ["data.json"]
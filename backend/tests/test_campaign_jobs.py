@@ -0,0 +1,28 @@
+import asyncio
+
+from campaign_jobs import JOB_CANCELLED, JOB_COMPLETED, CampaignJobManager
+from campaign_progress import CampaignProgress
+
+def test_cleanup_tells_a_job_cancelled_while_queued_from_one_that_ran():
+    async def scenario():
+        jobs = CampaignJobManager(max_running=1)
+        release = asyncio.Event()
+        finished = []
+
+        async def run(progress):
+            await release.wait()
+            return {"sent": 1}
+
+        running = jobs.submit(run, CampaignProgress(), cleanup=finished.append)
+        queued = jobs.submit(run, CampaignProgress(), cleanup=finished.append)
+        await asyncio.sleep(0)
+        jobs.cancel(queued.job_id)
+        release.set()
+        await asyncio.gather(running.task, queued.task)
+        return running, queued, finished
+
+    running, queued, finished = asyncio.run(scenario())
+    assert (running.status, queued.status) == (JOB_COMPLETED, JOB_CANCELLED)
+    assert running.started_at is not None and queued.started_at is None
+    assert queued.result is None
+    assert sorted(finished, key=id) == sorted([running, queued], key=id)
@@ -0,0 +1,86 @@
+import time
+
+import pandas as pd
+import pytest
+
+import campaign_outbox
+from campaign_outbox import CampaignOutbox, STATE_FAILED, STATE_PENDING, STATE_RETRYING, STATE_SENT
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+def _campaign(outbox: CampaignOutbox) -> str:
+    return outbox.create_campaign("dataset", 6, {"subject": "Hi"})
+
+def test_pending_rows_keep_their_state_when_a_resumed_run_adds_them_again(outbox_path):
+    outbox = CampaignOutbox(outbox_path)
+    campaign_id = _campaign(outbox)
+    writer = outbox.writer(campaign_id)
+    writer.add_pending([(0, "a@x.com"), (1, "b@x.com")])
+    writer.record(0, "a@x.com", STATE_SENT, "s@x.com")
+    writer.flush()
+
+    writer = outbox.writer(campaign_id)
+    writer.add_pending([(0, "a@x.com"), (1, "b@x.com")])
+    assert outbox.state_counts(campaign_id) == {"pending": 1, "sent": 1, "failed": 0, "retrying": 0}
+
+def test_outcomes_are_written_while_the_campaign_waits(outbox_path, monkeypatch):
+    monkeypatch.setattr(campaign_outbox, "OUTBOX_FLUSH_INTERVAL", 0.05)
+    outbox = CampaignOutbox(outbox_path)
+    campaign_id = _campaign(outbox)
+    writer = outbox.writer(campaign_id)
+    writer.add_pending([(0, "a@x.com")])
+    writer.record(0, "a@x.com", STATE_SENT, "s@x.com")
+
+    # Nothing else is recorded, as when the engine sleeps on a rate limit, and nothing flushes explicitly.
+    deadline = time.monotonic() + 2
+    while outbox.state_counts(campaign_id)["sent"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert outbox.state_counts(campaign_id)["sent"] == 1
+
+def test_resume_after_a_crash_skips_the_recipients_already_reached(outbox_path, monkeypatch):
+    monkeypatch.setattr(campaign_outbox, "OUTBOX_FLUSH_INTERVAL", 0.05)
+    outbox = CampaignOutbox(outbox_path)
+    campaign_id = _campaign(outbox)
+    frame = pd.DataFrame({"email": [f"u{i}@x.com" for i in range(6)]})
+    writer = outbox.writer(campaign_id)
+    writer.add_pending(zip(frame.index, frame["email"]))
+    writer.record(0, "u0@x.com", STATE_SENT, "s@x.com")
+    writer.record(1, "u1@x.com", STATE_FAILED, "s@x.com", smtp_code=550, error="rejected")
+    writer.record(2, "u2@x.com", STATE_RETRYING, "s@x.com", smtp_code=451)
+    time.sleep(0.3)
+    # Crash: the flush thread dies with the process, the last outcome never leaves the buffer.
+    outbox._closed.set()
+    time.sleep(0.1)
+    writer.record(3, "u3@x.com", STATE_SENT, "s@x.com")
+    resumed = CampaignOutbox(outbox_path)
+    writer = resumed.writer(campaign_id)
+    remaining = pd.concat(list(writer.skip_finished([frame])))
+
+    assert remaining.index.tolist() == [2, 3, 4, 5]
+    writer.add_pending(zip(remaining.index, remaining["email"]))
+    assert resumed.state_counts(campaign_id) == {"pending": 3, "sent": 1, "failed": 1, "retrying": 1}
+
+def test_every_attempt_is_counted_and_the_last_outcome_kept(outbox_path):
+    outbox = CampaignOutbox(outbox_path)
+    campaign_id = _campaign(outbox)
+    writer = outbox.writer(campaign_id)
+    writer.add_pending([(0, "a@x.com")])
+    writer.record(0, "a@x.com", STATE_RETRYING, "s1@x.com", smtp_code=421, error_class="SMTPResponseException")
+    writer.record(0, "a@x.com", STATE_SENT, "s2@x.com", smtp_code=250, latency=0.0123)
+    writer.flush()
+
+    [result] = outbox.results(campaign_id)
+    assert result["state"] == "sent"
+    assert result["attempts"] == 2
+    assert result["sender"] == "s2@x.com"
+    assert result["latency_ms"] == 12
+    assert result["error_class"] is None
+
+def test_pending_is_the_state_of_a_row_nobody_sent(outbox_path):
+    outbox = CampaignOutbox(outbox_path)
+    campaign_id = _campaign(outbox)
+    outbox.writer(campaign_id).add_pending([(7, "z@x.com")])
+    assert outbox.results(campaign_id)[0]["state"] == campaign_outbox.STATE_NAMES[STATE_PENDING]
+    assert outbox.finished_rows(campaign_id).tolist() == []
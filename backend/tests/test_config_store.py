@@ -0,0 +1,120 @@
+import json
+import os
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+import config_store
+from config_store import ConfigStoreError, SenderConfigStore
+
+class Config(BaseModel):
+    senderEmail: str
+    smtpServer: str = "smtp.x.com"
+    maxPerDay: Optional[int] = None
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "email_configs.json")
+
+def _write(path, configs, mtime_ns=None):
+    with open(path, "w") as f:
+        json.dump(configs, f)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _emails(configs):
+    return [config.senderEmail for config in configs]
+
+def test_missing_file_reads_as_empty(path):
+    assert SenderConfigStore(path, Config).list() == []
+
+def test_upsert_writes_the_file_and_replaces_case_insensitively(path):
+    store = SenderConfigStore(path, Config)
+    store.upsert(Config(senderEmail="A@x.com"))
+    store.upsert(Config(senderEmail="b@x.com"))
+    store.upsert(Config(senderEmail=" a@X.com ", maxPerDay=100))
+
+    with open(path) as f:
+        saved = json.load(f)
+    assert [config["senderEmail"] for config in saved] == [" a@X.com ", "b@x.com"]
+    assert saved[0]["maxPerDay"] == 100
+    assert store.get("A@X.COM").maxPerDay == 100
+    assert os.listdir(os.path.dirname(path)) == ["email_configs.json"] # no temporary files left
+
+def test_delete_is_case_insensitive(path):
+    store = SenderConfigStore(path, Config)
+    store.replace([Config(senderEmail="a@x.com"), Config(senderEmail="b@x.com")])
+    assert _emails(store.delete("B@X.com")) == ["a@x.com"]
+    assert store.delete("b@x.com") is None
+    assert _emails(SenderConfigStore(path, Config).list()) == ["a@x.com"]
+
+def test_failed_write_keeps_the_old_file(path, monkeypatch):
+    store = SenderConfigStore(path, Config)
+    store.upsert(Config(senderEmail="a@x.com"))
+    with open(path) as f:
+        before = f.read()
+
+    def fail(source, destination):
+        raise OSError("disk full")
+    monkeypatch.setattr(config_store.os, "replace", fail)
+    with pytest.raises(ConfigStoreError):
+        store.upsert(Config(senderEmail="b@x.com"))
+
+    with open(path) as f:
+        assert f.read() == before
+    assert os.listdir(os.path.dirname(path)) == ["email_configs.json"]
+    assert _emails(store.list()) == ["a@x.com"]
+
+def test_file_is_only_parsed_again_when_it_changes(path, monkeypatch):
+    _write(path, [{"senderEmail": "a@x.com"}], mtime_ns=1_000_000_000)
+    store = SenderConfigStore(path, Config)
+    loads = []
+    real_load = json.load
+    monkeypatch.setattr(config_store.json, "load", lambda f: loads.append(1) or real_load(f))
+
+    assert _emails(store.list()) == ["a@x.com"]
+    assert _emails(store.list()) == ["a@x.com"]
+    assert len(loads) == 1
+
+    # Another process saves a list of the same size; only the mtime tells.
+    _write(path, [{"senderEmail": "c@x.com"}], mtime_ns=2_000_000_000)
+    assert _emails(store.list()) == ["c@x.com"]
+    assert len(loads) == 2
+
+def test_removed_file_reads_as_empty(path):
+    store = SenderConfigStore(path, Config)
+    store.upsert(Config(senderEmail="a@x.com"))
+    os.remove(path)
+    assert store.list() == []
+
+def test_unreadable_file_raises_and_is_not_saved_over(path):
+    with open(path, "w") as f:
+        f.write('[{"senderEmail": "a@x.com"},')
+    store = SenderConfigStore(path, Config)
+    with pytest.raises(ConfigStoreError):
+        store.list()
+    with pytest.raises(ConfigStoreError):
+        store.upsert(Config(senderEmail="b@x.com"))
+    with open(path) as f:
+        assert f.read() == '[{"senderEmail": "a@x.com"},'
+
+def test_invalid_configuration_raises(path):
+    _write(path, [{"smtpServer": "smtp.x.com"}]) # no senderEmail
+    with pytest.raises(ConfigStoreError):
+        SenderConfigStore(path, Config).list()
+
+def test_replace_overwrites_an_unreadable_file(path):
+    with open(path, "w") as f:
+        f.write("not json")
+    store = SenderConfigStore(path, Config)
+    store.replace([Config(senderEmail="a@x.com"), Config(senderEmail="A@x.com", maxPerDay=5)])
+    assert [(config.senderEmail, config.maxPerDay) for config in store.list()] == [("A@x.com", 5)]
+
+def test_clear_deletes_the_file(path):
+    store = SenderConfigStore(path, Config)
+    store.upsert(Config(senderEmail="a@x.com"))
+    assert store.clear()
+    assert not os.path.exists(path)
+    assert store.list() == []
+    assert not store.clear()
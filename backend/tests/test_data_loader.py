@@ -0,0 +1,23 @@
+import json
+
+from data_loader import iter_contact_list_chunks
+
+def _cells(path, file_format, chunksize):
+    chunks = list(iter_contact_list_chunks(str(path), file_format, "utf-8", chunksize, ["Email", "age"]))
+    return [value for chunk in chunks for value in chunk["age"]], [list(chunk.index) for chunk in chunks]
+
+def test_csv_values_render_the_same_in_every_chunk(tmp_path):
+    # The second chunk has an empty age, which would make its inferred dtype float.
+    path = tmp_path / "list.csv"
+    path.write_text("Email,name,age\na@x.com,A,5\nb@x.com,B,7\nc@x.com,C,5\nd@x.com,D,\ne@x.com,NA,12\n")
+    ages, index = _cells(path, "csv", 2)
+    assert ages == ["5", "7", "5", "", "12"]
+    assert index == [[0, 1], [2, 3], [4]]
+
+def test_jsonl_values_render_the_same_in_every_chunk(tmp_path):
+    path = tmp_path / "list.jsonl"
+    records = [{"Email": "a@x.com", "age": 5}, {"Email": "b@x.com", "age": 7}, {"Email": "c@x.com", "age": 5}, {"Email": "d@x.com"}, {"Email": "e@x.com", "age": None}]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records) + "\n")
+    ages, index = _cells(path, "jsonl", 2)
+    assert ages == ["5", "7", "5", "", ""]
+    assert index == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import smtplib
+
+import pandas as pd
+import pytest
+
+from campaign_progress import CampaignProgress
+from email_sender import DISPATCH_MODES, send_emails_from_dataframe_async, send_emails_from_dataframe_enhanced
+
+REFUSED = "refused@y.com"
+CONFIGS = [
+    {"senderEmail": "a@x.com", "senderPassword": "p", "smtpServer": "smtp.x.com", "smtpPort": 587},
+    {"senderEmail": "b@x.com", "senderPassword": "p", "smtpServer": "smtp.x.com", "smtpPort": 587},
+]
+
+class StubSMTP:
+    """smtplib.SMTP that accepts every message except those to REFUSED."""
+    delivered = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = None
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b"ok"
+
+    def sendmail(self, from_addr, to_addrs, message):
+        if REFUSED in to_addrs:
+            raise smtplib.SMTPRecipientsRefused({REFUSED: (550, b"no such user")})
+        StubSMTP.delivered.extend(to_addrs)
+        return {}
+
+    def send_message(self, message, from_addr=None, to_addrs=None):
+        return self.sendmail(from_addr, to_addrs, message.as_bytes())
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def stub_smtp(monkeypatch):
+    StubSMTP.delivered = []
+    monkeypatch.setattr(smtplib, "SMTP", StubSMTP)
+
+def _contacts():
+    return pd.DataFrame({
+        "Email": ["u0@y.com", "not-an-address", "u1@y.com", REFUSED, "u2@y.com"],
+        "name": ["A", "B", "C", "D", "E"],
+    })
+
+def _send(engine, keep_results, progress):
+    args = (_contacts(), "Hi {name}", "Hello {name}", ["name"], CONFIGS, False, False)
+    kwargs = dict(progress=progress, keep_results=keep_results)
+    if engine == "async":
+        return asyncio.run(send_emails_from_dataframe_async(*args, **kwargs))
+    return send_emails_from_dataframe_enhanced(*args, dispatch_mode=engine, **kwargs)
+
+@pytest.mark.parametrize("engine", DISPATCH_MODES + ("async",))
+@pytest.mark.parametrize("keep_results", [True, False])
+def test_engines_report_sent_invalid_and_refused_recipients(engine, keep_results, caplog):
+    progress = CampaignProgress(total_rows=5)
+    with caplog.at_level(logging.INFO, logger="email_sender"):
+        results = _send(engine, keep_results, progress)
+
+    assert sorted(StubSMTP.delivered) == ["u0@y.com", "u1@y.com", "u2@y.com"]
+    assert (progress.sent, progress.failed) == (3, 2)
+    assert "Summary: 3 emails sent successfully, 2 failed." in caplog.text
+    if keep_results:
+        assert sorted(results["successful_emails"]) == ["u0@y.com", "u1@y.com", "u2@y.com"]
+        assert sorted(results["failed_emails"]) == ["not-an-address (invalid format)", REFUSED]
+    else:
+        assert results == {"successful_emails": [], "failed_emails": []}
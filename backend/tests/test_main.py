@@ -0,0 +1,98 @@
+import contextlib
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+
+# main keeps its data under XDG_DATA_HOME and checks activation at startup; keep both local.
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="mailstorm-test-")
+os.environ["ACTIVATION_API_URL"] = "http://127.0.0.1:9/api/sadmin/check-activation"
+
+from fastapi.testclient import TestClient
+
+import campaign_outbox
+import main
+from campaign_outbox import CAMPAIGN_CANCELLED, CAMPAIGN_COMPLETED, CAMPAIGN_RUNNING, CampaignOutbox
+
+CONFIGS = json.dumps([{"senderEmail": "a@x.com", "senderPassword": "p", "smtpServer": "smtp.x.com", "smtpPort": 587}])
+
+class BlockingSMTP:
+    """smtplib.SMTP whose sends wait for `release`."""
+    release = threading.Event()
+    delivered = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = None
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        return 250, b"ok"
+
+    def sendmail(self, from_addr, to_addrs, message):
+        BlockingSMTP.release.wait(10)
+        BlockingSMTP.delivered.extend(to_addrs)
+        return {}
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@contextlib.contextmanager
+def running_app(monkeypatch):
+    monkeypatch.setattr(main, "SHUTDOWN_GRACE_PERIOD", 0)
+    monkeypatch.setattr(main.sys, "exit", lambda code=0: None) # the lifespan exits the process on shutdown
+    with TestClient(main.app) as client:
+        yield client
+
+def _contacts(prefix: str, count: int = 5) -> bytes:
+    return b"Email,name\n" + b"".join(f"{prefix}{i}@y.com,N{i}\n".encode() for i in range(count))
+
+def _wait_for(client, job_id, statuses):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not reach {statuses}")
+
+def test_campaign_cancelled_while_queued_is_not_resumed(monkeypatch):
+    BlockingSMTP.release.clear()
+    BlockingSMTP.delivered = []
+    monkeypatch.setattr(smtplib, "SMTP", BlockingSMTP)
+    monkeypatch.setattr(campaign_outbox, "OUTBOX_FLUSH_INTERVAL", 3600) # only the shutdown writes the sender usage
+    with running_app(monkeypatch) as client:
+        submitted = [
+            client.post(
+                "/send-emails",
+                data={"subject": "Hi", "message": "Hello {name}", "variables": '["name"]', "email_configs": CONFIGS, "dispatch_mode": "threaded"},
+                files={"csv_file": (f"{prefix}.csv", _contacts(prefix))}
+            ).json()
+            for prefix in ("first", "second", "queued")
+        ]
+        for response in submitted[:2]: # fill the running slots
+            _wait_for(client, response["job_id"], ("running",))
+        queued = submitted[2]
+        assert client.get(f"/jobs/{queued['job_id']}").json()["status"] == "queued"
+
+        assert client.post(f"/jobs/{queued['job_id']}/cancel").json()["status"] == "cancelled"
+        BlockingSMTP.release.set()
+        for response in submitted:
+            _wait_for(client, response["job_id"], ("completed", "cancelled"))
+
+        statuses = {response["campaign_id"]: main.campaign_outbox.get_campaign(response["campaign_id"])["status"] for response in submitted}
+        assert [statuses[response["campaign_id"]] for response in submitted] == [CAMPAIGN_COMPLETED, CAMPAIGN_COMPLETED, CAMPAIGN_CANCELLED]
+        interrupted = {campaign["campaign_id"] for campaign in main.campaign_outbox.list_campaigns(status=CAMPAIGN_RUNNING)}
+        assert queued["campaign_id"] not in interrupted # the next start would send it again
+    assert not [address for address in BlockingSMTP.delivered if address.startswith("queued")]
+    usage = CampaignOutbox(main.OUTBOX_PATH).sender_usage(0)
+    assert sum(sends for _, sends in usage["smtp.x.com/a@x.com"]) == 10 # the daily quota holds across the restart
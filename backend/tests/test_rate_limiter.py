@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+import rate_limiter
+from campaign_outbox import CampaignOutbox
+from rate_limiter import RateLimiterRegistry, SenderRateLimiter, is_throttling_reply
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time() # wall-clock based, like the minutes the outbox stores
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+def _config(sender="a@x.com", host="smtp.x.com", **limits):
+    return {"senderEmail": sender, "smtpServer": host, **limits}
+
+def test_bucket_allows_a_burst_then_refills_at_the_configured_rate(clock):
+    limiter = SenderRateLimiter(max_per_minute=60)
+    assert [limiter.reserve() for _ in range(60)] == [0.0] * 60
+    assert limiter.reserve() == pytest.approx(1.0)
+    assert limiter.reserve() == pytest.approx(2.0)
+
+    clock.now += 30 # refills 30 tokens, 2 of which pay back the reservations above
+    assert [limiter.reserve() for _ in range(28)] == [0.0] * 28
+    assert limiter.reserve() == pytest.approx(1.0)
+
+def test_unlimited_sender_never_waits():
+    limiter = SenderRateLimiter()
+    assert all(limiter.reserve() == 0.0 for _ in range(1000))
+
+def test_daily_quota_refuses_reservations_until_the_window_moves_on(clock):
+    limiter = SenderRateLimiter(max_per_day=3)
+    assert limiter.reserve(2) == 0.0
+    assert limiter.reserve(2) is None
+    assert limiter.reserve(1) == 0.0
+    assert limiter.reserve() is None
+    assert not limiter.acquire()
+
+    clock.now += 24 * 60 * 60
+    assert limiter.reserve(3) == 0.0
+
+@pytest.mark.parametrize("smtp_code, throttling", [(421, True), (451, True), (452, True), (450, False), (550, False), (None, False)])
+def test_throttling_replies(smtp_code, throttling):
+    assert is_throttling_reply(smtp_code) is throttling
+
+def test_throttling_halves_the_rate_and_successes_win_it_back(clock):
+    limiter = SenderRateLimiter(max_per_minute=60)
+    limiter.on_throttled()
+    assert limiter.rate_per_minute == 30
+    limiter.on_throttled()
+    assert limiter.rate_per_minute == 15
+    assert limiter.reserve() > 0 # the bucket is emptied too, so the backoff applies at once
+
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate_per_minute == pytest.approx(15 + 10 * 0.05 * 60)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate_per_minute == 60 # never above the configured rate
+
+def test_backoff_never_goes_below_the_floor(clock):
+    limiter = SenderRateLimiter(max_per_minute=4)
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.rate_per_minute == rate_limiter.MIN_RATE_PER_MINUTE
+
+def test_unlimited_sender_is_limited_to_half_its_rate_once_throttled(clock):
+    limiter = SenderRateLimiter()
+    for _ in range(40):
+        limiter.reserve()
+    limiter.on_throttled()
+    assert limiter.rate_per_minute == 20
+
+def test_campaigns_share_one_limiter_per_host_and_account(clock):
+    registry = RateLimiterRegistry()
+    limiter = registry.get(_config("A@x.com ", "SMTP.x.com", maxPerDay=2))
+    assert registry.get(_config("a@x.com", "smtp.x.com", maxPerDay=2)) is limiter
+    assert registry.get(_config("a@x.com", "smtp.other.com")) is not limiter
+
+    assert limiter.reserve(2) == 0.0
+    # A second campaign through the same account gets no fresh quota.
+    assert registry.get(_config(maxPerDay=2)).reserve() is None
+
+def test_edited_limits_apply_to_the_shared_limiter(clock):
+    registry = RateLimiterRegistry()
+    limiter = registry.get(_config(maxPerMinute=60))
+    registry.get(_config(maxPerMinute=10, maxPerDay=5))
+    assert limiter.rate_per_minute == 10
+    assert limiter.max_per_day == 5
+
+def test_refunded_reservations_do_not_count_against_the_daily_quota(tmp_path, clock):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = CampaignOutbox(path)
+    limiter = RateLimiterRegistry(outbox).get(_config(maxPerDay=3))
+    assert limiter.reserve(3) == 0.0
+    limiter.refund(2) # e.g. the login failed
+    assert limiter.reserve(2) == 0.0
+    assert limiter.reserve() is None
+    outbox.close()
+
+    assert RateLimiterRegistry(CampaignOutbox(path)).get(_config(maxPerDay=3)).reserve() is None
+
+def test_daily_counts_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = CampaignOutbox(path)
+    limiter = RateLimiterRegistry(outbox).get(_config(maxPerDay=5))
+    assert limiter.reserve(3) == 0.0
+    clock.now += 60
+    assert limiter.reserve(1) == 0.0
+    outbox.close()
+
+    restarted = RateLimiterRegistry(CampaignOutbox(path)).get(_config(maxPerDay=5))
+    assert restarted.reserve(2) is None
+    assert restarted.reserve(1) == 0.0
+    assert RateLimiterRegistry(CampaignOutbox(path)).get(_config("b@x.com", maxPerDay=5)).reserve(5) == 0.0
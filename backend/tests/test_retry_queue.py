@@ -0,0 +1,128 @@
+import smtplib
+import socket
+
+import pytest
+
+import retry_queue
+from retry_queue import RetryQueue, is_transient_failure, retry_delay
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry_queue, "time", clock)
+    return clock
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # Every delay is the top of its jitter range.
+    monkeypatch.setattr(retry_queue.random, "uniform", lambda low, high: high)
+
+def _item(*indexes):
+    return [(index, f"u{index}@x.com", ()) for index in indexes]
+
+@pytest.mark.parametrize("error, transient", [
+    (smtplib.SMTPResponseException(421, b"try again later"), True),
+    (smtplib.SMTPResponseException(451, b"local error"), True),
+    (smtplib.SMTPResponseException(554, b"rejected"), False),
+    (smtplib.SMTPRecipientsRefused({"a@x.com": (450, b"mailbox busy")}), True),
+    (smtplib.SMTPRecipientsRefused({"a@x.com": (450, b"busy"), "b@x.com": (550, b"no such user")}), False),
+    (smtplib.SMTPRecipientsRefused({}), False),
+    (smtplib.SMTPAuthenticationError(535, b"bad credentials"), True),
+    (smtplib.SMTPSenderRefused(553, b"sender refused", "s@x.com"), True),
+    (smtplib.SMTPServerDisconnected("gone"), True),
+    (smtplib.SMTPConnectError(421, b"busy"), True),
+    (smtplib.SMTPDataError(552, b"message too large"), False),
+    (smtplib.SMTPNotSupportedError("no STARTTLS"), False),
+    (ConnectionRefusedError(), True),
+    (socket.timeout(), True),
+    (ValueError("bad template"), False),
+])
+def test_transient_failure_classification(error, transient):
+    assert is_transient_failure(error) is transient
+
+def test_retry_delay_doubles_up_to_the_cap(no_jitter):
+    assert [retry_delay(attempt, base_delay=2.0, max_delay=10.0) for attempt in range(2, 7)] == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+def test_retry_delay_is_jittered_within_its_range():
+    delays = [retry_delay(3, base_delay=2.0) for _ in range(200)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+def test_items_are_due_after_their_backoff(clock, no_jitter):
+    retries = RetryQueue(senders=1, base_delay=2.0)
+    assert retries.schedule(_item(0), "a@x.com")
+    assert retries.take("a@x.com") is None
+    assert retries.next_due_in("a@x.com") == pytest.approx(2.0)
+
+    clock.now += 2.0
+    assert retries.next_due_in("a@x.com") == 0.0
+    assert retries.take("a@x.com") == (_item(0), "a@x.com")
+    assert retries.next_due_in("a@x.com") is None
+
+def test_attempts_run_out_after_max_attempts(clock, no_jitter):
+    retries = RetryQueue(senders=1, max_attempts=3, base_delay=2.0)
+    assert retries.schedule(_item(0), "a@x.com") # attempt 2, after 2 s
+    clock.now += 2.0
+    item, _ = retries.take()
+    assert retries.schedule(item, "a@x.com") # attempt 3, after 4 s
+    assert retries.next_due_in() == pytest.approx(4.0)
+    clock.now += 4.0
+    item, _ = retries.take()
+    assert not retries.schedule(item, "a@x.com")
+    assert len(retries) == 0
+
+def test_a_batch_counts_attempts_of_its_most_retried_recipient(clock, no_jitter):
+    retries = RetryQueue(senders=1, max_attempts=3)
+    retries.schedule(_item(0), "a@x.com")
+    clock.now += 10
+    retries.take()
+    retries.schedule(_item(0), "a@x.com") # recipient 0 is at attempt 3
+    clock.now += 10
+    retries.take()
+    assert not retries.schedule(_item(0, 1), "a@x.com")
+
+def test_due_item_goes_to_another_sender_first(clock, no_jitter):
+    retries = RetryQueue(senders=2, base_delay=2.0, handoff_wait=5.0)
+    retries.schedule(_item(0), "a@x.com")
+    clock.now += 2.0
+    assert retries.take("a@x.com") is None
+    assert retries.next_due_in("a@x.com") == pytest.approx(5.0)
+    assert retries.next_due_in("b@x.com") == 0.0
+    assert retries.take("b@x.com") == (_item(0), "a@x.com")
+
+def test_failed_sender_takes_its_item_back_after_the_handoff_wait(clock, no_jitter):
+    retries = RetryQueue(senders=2, base_delay=2.0, handoff_wait=5.0)
+    retries.schedule(_item(0), "a@x.com")
+    clock.now += 7.0
+    assert retries.take("a@x.com") == (_item(0), "a@x.com")
+
+def test_single_sender_campaign_does_not_wait_for_a_handoff(clock, no_jitter):
+    retries = RetryQueue(senders=1, base_delay=2.0, handoff_wait=5.0)
+    retries.schedule(_item(0), "a@x.com")
+    clock.now += 2.0
+    assert retries.take("a@x.com") == (_item(0), "a@x.com")
+
+def test_take_returns_the_earliest_due_item(clock, no_jitter):
+    retries = RetryQueue(senders=1, base_delay=2.0)
+    retries.schedule(_item(0), "a@x.com")
+    clock.now += 10
+    retries.take()
+    retries.schedule(_item(0), "a@x.com") # due in 4 s
+    retries.schedule(_item(1), "a@x.com") # due in 2 s
+    clock.now += 5
+    assert retries.take() == (_item(1), "a@x.com")
+    assert retries.take() == (_item(0), "a@x.com")
+
+def test_drain_returns_items_that_are_not_due_yet(clock, no_jitter):
+    retries = RetryQueue(senders=2)
+    retries.schedule(_item(0), "a@x.com")
+    retries.schedule(_item(1), "b@x.com")
+    assert retries.drain() == [_item(0), _item(1)]
+    assert len(retries) == 0 and retries.next_due_in() is None
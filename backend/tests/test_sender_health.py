@@ -0,0 +1,123 @@
+import smtplib
+import socket
+
+import pytest
+
+import sender_health
+from sender_health import (
+    SENDER_HEALTHY, SENDER_MAX_PACING_DELAY, SENDER_MAX_QUARANTINES, SENDER_QUARANTINE_BASE, SENDER_QUARANTINED,
+    SENDER_RETIRED, SenderHealth, is_sender_failure
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sender_health, "time", clock)
+    return clock
+
+@pytest.fixture
+def changes():
+    return []
+
+@pytest.fixture
+def health(clock, changes):
+    return SenderHealth(["a@x.com", "b@x.com"], on_change=lambda sender, state: changes.append((sender, state)))
+
+@pytest.mark.parametrize("error, sender_failure", [
+    (smtplib.SMTPAuthenticationError(535, b"bad credentials"), True),
+    (smtplib.SMTPConnectError(421, b"busy"), True),
+    (ConnectionRefusedError(), True),
+    (socket.gaierror(), True),
+    (smtplib.SMTPRecipientsRefused({"u@x.com": (550, b"no such user")}), False),
+    (smtplib.SMTPServerDisconnected("gone"), False),
+])
+def test_sender_failure_classification(error, sender_failure):
+    assert is_sender_failure(error) is sender_failure
+
+def test_quarantine_doubles_for_every_repeat(clock, health, changes):
+    health.record("a@x.com", False, 0.1, sender_failure=True)
+    assert health.quarantined_for("a@x.com") == SENDER_QUARANTINE_BASE
+    assert health.quarantined_for("b@x.com") == 0.0
+
+    clock.now += SENDER_QUARANTINE_BASE
+    assert health.quarantined_for("a@x.com") == 0.0
+    health.record("a@x.com", False, 0.1, sender_failure=True)
+    assert health.quarantined_for("a@x.com") == 2 * SENDER_QUARANTINE_BASE
+    assert changes == [("a@x.com", SENDER_QUARANTINED)] * 2
+
+def test_sender_is_retired_after_max_quarantines_in_a_row(clock, health, changes):
+    for _ in range(SENDER_MAX_QUARANTINES):
+        assert not health.retired("a@x.com")
+        health.record("a@x.com", False, 0.1, sender_failure=True)
+        clock.now += health.quarantined_for("a@x.com")
+    assert health.retired("a@x.com")
+    assert not health.all_retired()
+    assert changes[-1] == ("a@x.com", SENDER_RETIRED)
+
+    health.record("a@x.com", False, 0.1, sender_failure=True) # nothing changes for a retired sender
+    assert len(changes) == SENDER_MAX_QUARANTINES
+
+def test_successful_send_ends_the_streak(clock, health, changes):
+    for _ in range(SENDER_MAX_QUARANTINES - 1):
+        health.record("a@x.com", False, 0.1, sender_failure=True)
+        clock.now += health.quarantined_for("a@x.com")
+    health.record("a@x.com", True, 0.1)
+    assert changes[-1] == ("a@x.com", SENDER_HEALTHY)
+
+    health.record("a@x.com", False, 0.1, sender_failure=True)
+    assert not health.retired("a@x.com")
+    assert health.quarantined_for("a@x.com") == SENDER_QUARANTINE_BASE
+
+def test_failures_during_a_quarantine_are_ignored(clock, health, changes):
+    health.record("a@x.com", False, 0.1, sender_failure=True)
+    for _ in range(SENDER_MAX_QUARANTINES):
+        health.record("a@x.com", False, 0.1, sender_failure=True) # sends that were already in flight
+    assert not health.retired("a@x.com")
+    assert changes == [("a@x.com", SENDER_QUARANTINED)]
+
+def test_retire_takes_the_sender_out_once(health, changes):
+    health.retire("A@x.com", "login failed")
+    health.retire("a@x.com", "login failed")
+    assert health.retired("a@x.com")
+    assert changes == [("A@x.com", SENDER_RETIRED)]
+    health.retire("b@x.com", "login failed")
+    assert health.all_retired()
+
+def test_rank_shares_traffic_by_success_rate_per_second(health):
+    for _ in range(5):
+        health.record("a@x.com", True, 0.1)
+        health.record("b@x.com", True, 0.2)
+    firsts = [health.rank(["a@x.com", "b@x.com"])[0] for _ in range(30)]
+    assert firsts.count(0) == 20 and firsts.count(1) == 10
+
+def test_rank_puts_quarantined_senders_last_and_leaves_retired_out(clock):
+    senders = ["a@x.com", "b@x.com", "c@x.com"]
+    health = SenderHealth(senders)
+    health.record("a@x.com", False, 0.1, sender_failure=True)
+    health.retire("c@x.com", "login failed")
+    assert health.rank(senders) == [1, 0]
+    clock.now += SENDER_QUARANTINE_BASE
+    assert sorted(health.rank(senders)) == [0, 1]
+
+def test_pacing_slows_down_the_less_successful_sender(health):
+    for _ in range(10):
+        health.record("a@x.com", True, 0.5)
+        health.record("b@x.com", True, 0.5)
+    assert health.pacing_delay("a@x.com") == health.pacing_delay("b@x.com") == 0.0
+
+    for _ in range(5):
+        health.record("b@x.com", False, 0.5)
+    delay = health.pacing_delay("b@x.com")
+    assert 0.0 < delay <= SENDER_MAX_PACING_DELAY
+    assert health.pacing_delay("a@x.com") == 0.0
+
+    for _ in range(100):
+        health.record("b@x.com", False, 0.5)
+    assert health.pacing_delay("b@x.com") == SENDER_MAX_PACING_DELAY
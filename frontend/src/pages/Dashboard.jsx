@@ -10,11 +10,33 @@ import EmailConfig from '../components/EmailConfig';
 import VariableButtons from '../components/VariableButtons'; // This component appears to be used implicitly in EmailContentEditor based on props
 import UpdateStatus from '../components/UpdateStatus'; // This component appears to be a placeholder or for global status
 
+const CONTACT_LIST_EXTENSIONS = ['.csv', '.xlsx', '.parquet', '.jsonl', '.ndjson'];
+const RESULTS_LIST_LIMIT = 1000; // emails per status listed after a campaign, the largest page /campaigns/{id}/results serves
+
+// Resolves with the job's final state from its Server-Sent Events stream, calling onProgress on every update.
+// EventSource reconnects on its own after a dropped connection; it only gives up (CLOSED) when the server
+// refuses the stream, e.g. with a 404 for an unknown job.
+const followCampaignJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+    const events = new EventSource(`http://localhost:8000/jobs/${jobId}/events`);
+    events.addEventListener('progress', (event) => onProgress(JSON.parse(event.data)));
+    events.addEventListener('done', (event) => {
+        events.close();
+        resolve(JSON.parse(event.data));
+    });
+    events.onerror = () => {
+        if (events.readyState !== EventSource.CLOSED) {
+            return; // reconnecting
+        }
+        reject(new Error("Lost connection to the campaign progress stream."));
+    };
+});
+
 function Dashboard() {
     const [currentStep, setCurrentStep] = useState(1);
     const [subject, setSubject] = useState("");
     const [message, setMessage] = useState(""); // Corrected: was ("")
     const [csvFile, setCsvFile] = useState(null);
+    const [datasetId, setDatasetId] = useState(null); // Backend cache id of the uploaded CSV, so sending skips the re-upload
     const [csvData, setCsvData] = useState(null);
     const [csvColumns, setCsvColumns] = useState([]);
     const [totalRows, setTotalRows] = useState(0);
@@ -37,6 +59,7 @@ function Dashboard() {
     const [successfulSends, setSuccessfulSends] = useState(0); // Count
     const [failedSends, setFailedSends] = useState(0);     // Count
     const [lastCampaignResult, setLastCampaignResult] = useState(null); // Summary object
+    const [liveProgress, setLiveProgress] = useState(null); // Latest progress event of the running campaign
 
     // States for detailed results lists
     const [successfulEmailsList, setSuccessfulEmailsList] = useState([]);
@@ -209,15 +232,16 @@ function Dashboard() {
         setTotalRows(0);
         setShowPreview(false);
         setCsvFile(null);
+        setDatasetId(null);
 
         if (!file) {
             setIsLoading(false);
             return;
         }
 
-        if (!file.name.toLowerCase().endsWith('.csv')) {
-            setError("Please upload a CSV file (e.g., Emails.csv).");
-            showToast('error', "Please upload a CSV file.");
+        if (!CONTACT_LIST_EXTENSIONS.some(ext => file.name.toLowerCase().endsWith(ext))) {
+            setError("Please upload a CSV, Excel (.xlsx), Parquet or JSONL file (e.g., Emails.csv).");
+            showToast('error', "Please upload a CSV, Excel, Parquet or JSONL file.");
             setIsLoading(false);
             return;
         }
@@ -240,6 +264,7 @@ function Dashboard() {
             }
 
             const result = await response.json();
+            setDatasetId(result.dataset_id || null);
             setCsvData(result.preview);
             setCsvColumns(result.columns);
             setShowPreview(true);
@@ -260,6 +285,7 @@ function Dashboard() {
             setError("Error processing CSV: " + err.message);
             showToast('error', "Error processing CSV: " + err.message);
             setCsvFile(null);
+            setDatasetId(null);
             setCsvData(null);
             setCsvColumns([]);
             setShowPreview(false);
@@ -371,7 +397,11 @@ function Dashboard() {
         const formData = new FormData();
         formData.append("subject", subject);
         formData.append("message", message);
-        formData.append("csv_file", csvFile);
+        if (datasetId) {
+            formData.append("dataset_id", datasetId);
+        } else {
+            formData.append("csv_file", csvFile);
+        }
         formData.append("variables", JSON.stringify(selectedVariables));
         formData.append("email_configs", JSON.stringify(emailConfigs));
         formData.append("html_content", actualHtmlContent);
@@ -381,7 +411,18 @@ function Dashboard() {
             formData.append("media_file", mediaFile);
         }
 
+        const loadCampaignEmails = async (campaignId, state) => {
+            const response = await fetch(`http://localhost:8000/campaigns/${campaignId}/results?state=${state}&limit=${RESULTS_LIST_LIMIT}`);
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.detail || "Could not load the campaign results.");
+            }
+            const { results } = await response.json();
+            return results.map(result => result.email);
+        };
+
         try {
+            setLiveProgress(null);
             setStatus("Sending campaign... This may take a while. Please do not close this window.");
             const response = await fetch("http://localhost:8000/send-emails", {
                 method: "POST",
@@ -393,20 +434,51 @@ function Dashboard() {
                 throw new Error(data.detail || "Server responded with an error.");
             }
 
-            const result = await response.json();
-            setStatus(`✅ Campaign completed successfully! ${result.detail}`);
-            showToast('success', `Campaign completed! ${result.successful_emails.length} successful, ${result.failed_emails.length} failed.`);
-            setSuccessfulSends(result.successful_emails.length);
-            setFailedSends(result.failed_emails.length);
+            // The campaign runs as a background job; follow its progress stream until it has finished.
+            const { job_id: jobId } = await response.json();
+            const finishedJob = await followCampaignJob(jobId, (progress) => {
+                setLiveProgress(progress);
+                setSuccessfulSends(progress.sent);
+                setFailedSends(progress.failed);
+                setStatus(`Sending campaign... ${progress.processed} of ${progress.total_rows} processed (${progress.messages_per_second} emails/s). Please do not close this window.`);
+            });
+            if (finishedJob.status === 'failed') {
+                throw new Error(finishedJob.error || "The campaign failed.");
+            }
 
-            setSuccessfulEmailsList(result.successful_emails);
-            setFailedEmailsList(result.failed_emails);
+            const jobResponse = await fetch(`http://localhost:8000/jobs/${jobId}`);
+            if (!jobResponse.ok) {
+                const data = await jobResponse.json();
+                throw new Error(data.detail || "Could not load the campaign results.");
+            }
+            const job = await jobResponse.json();
+            const result = job.result;
+            if (!result) { // cancelled while still queued, nothing was sent
+                setStatus("Campaign cancelled before any emails were sent.");
+                showToast('error', "Campaign cancelled before any emails were sent.");
+                setSuccessfulSends(0);
+                setFailedSends(0);
+                return;
+            }
+            setStatus(`✅ Campaign ${job.status === 'cancelled' ? 'cancelled' : 'completed successfully'}! ${result.detail}`);
+            showToast('success', `Campaign completed! ${result.sent} successful, ${result.failed} failed.`);
+            setSuccessfulSends(result.sent);
+            setFailedSends(result.failed);
+
+            // Per-recipient results stay on the server; only the first page of each is listed here.
+            const [successfulEmails, failedEmails] = await Promise.all([
+                loadCampaignEmails(result.campaign_id, 'sent'),
+                loadCampaignEmails(result.campaign_id, 'failed'),
+            ]);
+            setSuccessfulEmailsList(successfulEmails);
+            setFailedEmailsList(failedEmails);
             setShowDetailedResults(true);
 
             setLastCampaignResult({
-                successful: result.successful_emails.length,
-                failed: result.failed_emails.length,
-                total: result.successful_emails.length + result.failed_emails.length,
+                campaignId: result.campaign_id,
+                successful: result.sent,
+                failed: result.failed,
+                total: result.sent + result.failed,
                 timestamp: new Date().toLocaleString()
             });
 
@@ -525,7 +597,7 @@ function Dashboard() {
                                     description="Upload your Emails. Must contain an 'email' column."
                                     icon={FileText}
                                     file={csvFile}
-                                    acceptedTypes=".csv"
+                                    acceptedTypes={CONTACT_LIST_EXTENSIONS.join(',')}
                                     onFileUpload={handleCsvUpload}
                                     isLoading={isLoading}
                                 />
@@ -546,7 +618,7 @@ function Dashboard() {
                                     </h4>
                                     <ul className="text-sm text-blue-800 dark:text-blue-200 space-y-2 list-disc pl-5">
                                         <li>CSV file must contain an 'email' column</li>
-                                        <li>Supported formats: .csv files only</li>
+                                        <li>Supported formats: .csv, .xlsx, .parquet and .jsonl files</li>
                                         <li>Media files: images, videos, PDFs, or documents</li>
                                         <li>Preview your Emails before proceeding</li>
                                     </ul>
@@ -565,6 +637,7 @@ function Dashboard() {
                                             setCsvColumns([]);
                                             setTotalRows(0);
                                             setCsvFile(null);
+                                            setDatasetId(null);
                                             setStatus("");
                                             setError("");
                                         }}
@@ -727,7 +800,7 @@ function Dashboard() {
                                                 : 'bg-white/70 backdrop-blur-sm border border-gray-200 dark:bg-[rgba(30,30,30,0.5)] dark:backdrop-blur-md dark:border-gray-800 text-gray-700 dark:text-gray-300 hover:bg-gray-100 dark:hover:bg-[rgba(40,40,40,0.5)]'
                                                 }`}
                                         >
-                                            All ({successfulEmailsList.length + failedEmailsList.length})
+                                            All ({lastCampaignResult.total})
                                         </button>
                                         <button
                                             onClick={() => setFilterStatus('successful')}
@@ -736,7 +809,7 @@ function Dashboard() {
                                                 : 'bg-white/70 backdrop-blur-sm border border-gray-200 dark:bg-[rgba(30,30,30,0.5)] dark:backdrop-blur-md dark:border-gray-800 text-gray-700 dark:text-gray-300 hover:bg-gray-100 dark:hover:bg-[rgba(40,40,40,0.5)]'
                                                 }`}
                                         >
-                                            Successful ({successfulEmailsList.length})
+                                            Successful ({lastCampaignResult.successful})
                                         </button>
                                         <button
                                             onClick={() => setFilterStatus('failed')}
@@ -745,10 +818,23 @@ function Dashboard() {
                                                 : 'bg-white/70 backdrop-blur-sm border border-gray-200 dark:bg-[rgba(30,30,30,0.5)] dark:backdrop-blur-md dark:border-gray-800 text-gray-700 dark:text-gray-300 hover:bg-gray-100 dark:hover:bg-[rgba(40,40,40,0.5)]'
                                                 }`}
                                         >
-                                            Failed ({failedEmailsList.length})
+                                            Failed ({lastCampaignResult.failed})
                                         </button>
                                     </div>
+                                    {lastCampaignResult.failed > 0 && (
+                                        <a
+                                            href={`http://localhost:8000/campaigns/${lastCampaignResult.campaignId}/failures.csv`}
+                                            className="px-4 py-2 rounded-lg text-sm font-medium bg-red-600 text-white shadow-md hover:bg-red-700 transition-colors whitespace-nowrap"
+                                        >
+                                            Download failed (CSV)
+                                        </a>
+                                    )}
                                 </div>
+                                {(lastCampaignResult.successful > successfulEmailsList.length || lastCampaignResult.failed > failedEmailsList.length) && (
+                                    <p className="text-xs text-gray-500 dark:text-gray-400 mb-2">
+                                        Showing the first {RESULTS_LIST_LIMIT} emails of each status. Download the failed ones as CSV to re-send them.
+                                    </p>
+                                )}
 
                                 {/* Displayed Emails List */}
                                 <div className="max-h-80 overflow-y-auto text-sm bg-white/70 backdrop-blur-sm border border-gray-200 dark:bg-[rgba(30,30,30,0.5)] dark:backdrop-blur-md dark:border dark:border-gray-800 rounded-lg p-4 shadow-md custom-scrollbar">
@@ -844,6 +930,20 @@ function Dashboard() {
                                     {error || status}
                                 </p>
                             </div>
+                            {isLoading && liveProgress && (
+                                <div className="mt-3 text-sm text-blue-800 dark:text-blue-200 space-y-1">
+                                    {liveProgress.senders.map(sender => (
+                                        <p key={sender.sender}>
+                                            {sender.sender}: {sender.sent} sent, {sender.failed} failed ({sender.messages_per_second} emails/s)
+                                        </p>
+                                    ))}
+                                    {liveProgress.recent_failures.slice(-5).map((failure, index) => (
+                                        <p key={index} className="text-red-700 dark:text-red-300">
+                                            {failure.recipient}: {failure.error}
+                                        </p>
+                                    ))}
+                                </div>
+                            )}
                         </div>
                     </div>
                 )}